@@ -0,0 +1,153 @@
+import sys
+import html
+import time
+import random
+from datetime import datetime
+from services.menu_html_generator import MenuHtmlGenerator
+from services.menu_templates import css_version
+
+def unescaped(value):
+    return value
+
+def legacy_item_html(item, escape=unescaped):
+    """
+    The previous string-concatenation renderer, kept here for comparison. It didn't escape
+    anything; pass escape=html.escape for the cost of the same work with escaping added.
+    """
+    price_html = ""
+    if "price" in item:
+        if item["price"] is None:
+            price_html = "Market Price"
+        else:
+            price_str = str(item["price"])
+            price_html = price_str if price_str.startswith('R') else f"R{price_str}"
+    elif "price_glass" in item and "price_bottle" in item:
+        price_html = f"R{item['price_glass']} (glass) / R{item['price_bottle']} (bottle)"
+
+    return f"""
+        <div class="item">
+            <div class="item-name">{escape(item.get("name", ""))}</div>
+            <div class="item-description">{escape(item.get("description", ""))}</div>
+            <div class="item-price">{price_html}</div>
+        </div>
+"""
+
+def legacy_section_html(section, escape=unescaped):
+    section_html = f"""
+    <div class="section">
+        <div class="section-title">{escape(section["name"])}</div>
+"""
+    for item in section.get("items", []):
+        if "items" in item:
+            section_html += f"""
+        <div class="subsection">
+            <div class="subsection-title">{escape(item["name"])}</div>
+"""
+            for subitem in item.get("items", []):
+                section_html += legacy_item_html(subitem, escape)
+            section_html += """
+        </div>
+"""
+        else:
+            section_html += legacy_item_html(item, escape)
+    section_html += """
+    </div>
+"""
+    return section_html
+
+def legacy_render(generator, restaurant_data, menu_file, escape=unescaped):
+    title = escape(generator.menu_titles.get(menu_file, "Menu"))
+    sections_html = ""
+    for section_name in generator.menu_sections.get(menu_file, []):
+        section = generator._find_section(restaurant_data, section_name)
+        if section:
+            sections_html += legacy_section_html(section, escape)
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <title>Zevenwacht Restaurant - {title}</title>
+    <link rel="stylesheet" href="menu.css?v={css_version()}">
+</head>
+<body>
+    <div class="header">
+        <div class="logo">ZEVENWACHT RESTAURANT</div>
+        <div class="subtitle">{title}</div>
+        <p>Zeevenwacht Wine Estate, Langverwacht Rd, Kuils River</p>
+        <p>Main Service Hours: Tuesday-Sunday, 12:00-22:00 (Last orders at 21:00)</p>
+    </div>
+
+{sections_html}
+
+    <div class="footer">
+        <p>All prices include VAT</p>
+        <p>Please inform your server of any dietary requirements or allergies</p>
+        <p>A 10% service charge will be added to tables of 8 or more</p>
+        <p>Contact: jolinesalesagent@gmail.com | Tel: +27 (21) 903 5123</p>
+        <p>Last updated: {datetime.now().strftime("%d %B %Y")}</p>
+    </div>
+</body>
+</html>"""
+
+def build_menu(item_count):
+    """A synthetic menu: plain items in MAINS and nested subsections in WINE SECTIONS."""
+    random.seed(42)
+    half = item_count // 2
+    mains = [
+        {"name": f"Dish {i}", "description": f"Slow cooked dish number {i} with seasonal vegetables", "price": random.randint(80, 400)}
+        for i in range(half)
+    ]
+    subsections = []
+    for s in range(50):
+        items = []
+        for i in range((item_count - half) // 50):
+            if i % 3 == 0:
+                items.append({"name": f"Wine {s}-{i}", "description": "Cape blend", "price_glass": 65, "price_bottle": 260})
+            else:
+                items.append({"name": f"Wine {s}-{i}", "description": "Estate cultivar", "price": f"R{random.randint(150, 900)}"})
+        subsections.append({"name": f"Cultivar {s}", "items": items})
+    return {
+        "menu_sections": [
+            {"name": "MAINS", "items": mains},
+            {"name": "WINE SECTIONS", "items": subsections}
+        ]
+    }
+
+def best_of(function, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    generator = MenuHtmlGenerator()
+    generator.menu_sections["benchmark.html"] = ["MAINS", "WINE SECTIONS"]
+    generator.menu_titles["benchmark.html"] = "Benchmark Menu"
+    restaurant_data = build_menu(item_count)
+
+    legacy_time, legacy_html = best_of(lambda: legacy_render(generator, restaurant_data, "benchmark.html"), 5)
+    escaped_time, escaped_html = best_of(lambda: legacy_render(generator, restaurant_data, "benchmark.html", html.escape), 5)
+    template_time, template_html = best_of(lambda: generator.render_menu(restaurant_data, "benchmark.html"), 5)
+
+    # The synthetic data has no characters that need escaping, so the output must be identical
+    assert legacy_html == escaped_html == template_html, "Template output differs from the legacy renderer"
+
+    print(f"Rendered {item_count} items ({len(template_html) / 1024:.0f} KB of HTML)")
+    print(f"Legacy string concatenation:    {legacy_time * 1000:.1f} ms")
+    print(f"Legacy with html.escape:        {escaped_time * 1000:.1f} ms")
+    print(f"Jinja2 template (escaped):      {template_time * 1000:.1f} ms")
+    print(f"Speedup: {legacy_time / template_time:.2f}x unescaped, {escaped_time / template_time:.2f}x escaped")
+
+    # What a data change actually costs: every page of the real menu
+    generator = MenuHtmlGenerator()
+    real_data = generator.load_restaurant_data()
+    if real_data:
+        real_time, _ = best_of(lambda: [generator.render_menu(real_data, menu_file) for menu_file in generator.menu_titles], 20)
+        print(f"All {len(generator.menu_titles)} menus in restaurant_data.json: {real_time * 1000:.2f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import re
+import sys
+import json
+import time
+import logging
+from services.reply_extractor import ReplyExtractor
+
+# check_emails.py logs at INFO; send the legacy trace to a handler that drops it,
+# so its cost is measured without flooding the terminal
+logger = logging.getLogger("legacy_reply_extraction")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+def legacy_extract_latest_reply(email_text, sender_email):
+    """The previous extractor from check_emails.py (one re.finditer per pattern), kept here for comparison."""
+    logger.info(f"EXTRACTION DEBUG - Original email text: {email_text[:200]}...")
+    
+    # If the email is very short, it's likely just a new message
+    if len(email_text) < 100:
+        logger.info(f"EXTRACTION DEBUG - Email is short (<100 chars), returning as is")
+        return email_text.strip()
+    
+    # First, try to extract content by looking for quoted lines (starting with >)
+    lines = email_text.split('\n')
+    logger.info(f"EXTRACTION DEBUG - Split into {len(lines)} lines")
+    
+    non_quoted_lines = []
+    found_quoted = False
+    
+    for i, line in enumerate(lines):
+        if line.strip().startswith('>'):
+            found_quoted = True
+            logger.info(f"EXTRACTION DEBUG - Found quoted line {i}: {line[:50]}...")
+            continue
+        # Skip empty lines right after quoted content
+        if found_quoted and not line.strip():
+            continue
+        found_quoted = False
+        non_quoted_lines.append(line)
+    
+    # If we found quoted content and extracted something meaningful
+    extracted_by_quotes = '\n'.join(non_quoted_lines).strip()
+    if found_quoted and len(extracted_by_quotes) > 20:
+        logger.info(f"EXTRACTION DEBUG - Extracted by quotes: {extracted_by_quotes[:100]}...")
+        return extracted_by_quotes
+    
+    # Common patterns that indicate the start of a quoted message
+    patterns = [
+        # Standard email client quote patterns
+        r'\nOn .*wrote:',
+        r'\n-----Original Message-----',
+        r'\n-+Forwarded message-+',
+        r'\nFrom:.*\nSent:.*\nTo:.*\nSubject:',
+        # Joline's signature pattern
+        r'\nWarm regards,\nJoline\n',
+        r'\n--\nJoline \| Restaurant Sales Assistant',
+        # Gmail's quote marker
+        r'\nOn .* at .*, .* <.*> wrote:',
+        # Outlook style
+        r'\n-+Original Message-+',
+        # Apple Mail style
+        r'\nOn .*, .* wrote:',
+        # Generic date-based patterns
+        r'\nOn \d{1,2}/\d{1,2}/\d{2,4}',
+        r'\nOn \w+, \w+ \d{1,2}, \d{4} at \d{1,2}:\d{2} [AP]M',
+        # Common delimiters
+        r'\n-{3,}',  # Three or more hyphens
+        r'\n_{3,}',  # Three or more underscores
+        r'\n\*{3,}', # Three or more asterisks
+        # Email client specific
+        r'\nSent from my iPhone',
+        r'\nSent from my Android',
+    ]
+    
+    # Find the earliest occurrence of any quote pattern
+    earliest_pos = len(email_text)
+    matching_pattern = None
+    
+    for pattern in patterns:
+        matches = list(re.finditer(pattern, email_text))
+        if matches:
+            pos = matches[0].start()
+            logger.info(f"EXTRACTION DEBUG - Found pattern '{pattern}' at position {pos}")
+            if pos < earliest_pos:
+                earliest_pos = pos
+                matching_pattern = pattern
+    
+    # Extract only the content before the quoted text
+    if earliest_pos < len(email_text):
+        logger.info(f"EXTRACTION DEBUG - Found quote pattern: {matching_pattern} at position {earliest_pos}")
+        new_content = email_text[:earliest_pos].strip()
+        
+        # If we have very little content, we might have been too aggressive
+        if len(new_content) < 10:
+            logger.info(f"EXTRACTION DEBUG - Extracted content too short (<10 chars): '{new_content}'")
+            # Try another approach - look for the first paragraph
+            paragraphs = re.split(r'\n\s*\n', email_text)
+            logger.info(f"EXTRACTION DEBUG - Split into {len(paragraphs)} paragraphs")
+            if paragraphs and len(paragraphs[0]) > 10:
+                logger.info(f"EXTRACTION DEBUG - Using first paragraph: {paragraphs[0][:100]}...")
+                return paragraphs[0].strip()
+        
+        logger.info(f"EXTRACTION DEBUG - Final extracted content: {new_content[:100]}...")
+        return new_content
+    
+    # If no quote patterns were found, check if we have multiple paragraphs
+    paragraphs = re.split(r'\n\s*\n', email_text)
+    logger.info(f"EXTRACTION DEBUG - No patterns found, split into {len(paragraphs)} paragraphs")
+    
+    # Check if we have HTML content in the email
+    html_content_index = -1
+    for i, para in enumerate(paragraphs):
+        if '[HTML_CONTENT]' in para:
+            html_content_index = i
+            logger.info(f"EXTRACTION DEBUG - Found HTML content in paragraph {i}")
+            break
+    
+    # If we found HTML content, only use paragraphs before it
+    if html_content_index > 0:
+        # Join all paragraphs before the HTML content
+        content_before_html = '\n\n'.join(paragraphs[:html_content_index]).strip()
+        logger.info(f"EXTRACTION DEBUG - Using content before HTML: {content_before_html[:100]}...")
+        return content_before_html
+    
+    # If we have multiple paragraphs but no HTML marker, join all non-signature paragraphs
+    # (Exclude common signature indicators like "Kind regards", "Thanks", etc.)
+    if len(paragraphs) > 1:
+        # Check for signature indicators
+        signature_indicators = ['kind regards', 'regards', 'thanks', 'thank you', 'cheers', 'sincerely', 'best wishes']
+        content_paragraphs = []
+        
+        for para in paragraphs:
+            para_lower = para.lower().strip()
+            # Skip if it's just a signature line
+            if any(indicator in para_lower for indicator in signature_indicators) and len(para_lower) < 30:
+                logger.info(f"EXTRACTION DEBUG - Skipping signature paragraph: {para}")
+                continue
+            content_paragraphs.append(para)
+        
+        # Join all content paragraphs
+        full_content = '\n\n'.join(content_paragraphs).strip()
+        logger.info(f"EXTRACTION DEBUG - Using full content: {full_content[:100]}...")
+        return full_content
+    
+    # If all else fails, return the original text
+    logger.info(f"EXTRACTION DEBUG - Returning original text")
+    return email_text.strip()
+
+def build_thread(rounds):
+    """A long back-and-forth thread in Gmail style, every earlier message quoted one level deeper."""
+    body = "Hi Joline,\n\nCould you confirm the booking for Saturday?\n\nThanks,\nSarah"
+    for round_number in range(rounds):
+        quoted = "\n".join("> " + line for line in body.split("\n"))
+        sender = "Joline <jolinesalesagent@gmail.com>" if round_number % 2 else "Sarah <sarah@example.com>"
+        body = (
+            f"Reply number {round_number}: adding a few more details about the dietary requirements "
+            f"and the arrival time for our group.\n\n"
+            f"On Mon, 3 Mar 2025 at 10:{round_number % 60:02d}, {sender} wrote:\n{quoted}"
+        )
+    return body
+
+def best_of(function, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    corpus_path = sys.argv[1] if len(sys.argv) > 1 else "reply_corpus.json"
+    with open(corpus_path, "r", encoding="utf-8") as file:
+        corpus = json.load(file)
+    extractor = ReplyExtractor()
+
+    legacy_correct = 0
+    failures = []
+    for case in corpus:
+        if legacy_extract_latest_reply(case["text"], "sender@example.com") == case["expected"]:
+            legacy_correct += 1
+        result = extractor.extract(case["text"])
+        if result != case["expected"]:
+            failures.append((case, result))
+
+    print(f"Corpus: {len(corpus)} emails")
+    print(f"Legacy extractor correct:   {legacy_correct}/{len(corpus)}")
+    print(f"Compiled extractor correct: {len(corpus) - len(failures)}/{len(corpus)}")
+    for case, result in failures:
+        print(f"  FAILED {case['name']} ({case['client']}): {result[:80]!r}")
+
+    texts = [case["text"] for case in corpus] * 200
+    thread = build_thread(200)
+    for label, inputs in ((f"corpus x200 ({len(texts)} emails)", texts), (f"long thread ({len(thread) / 1024:.0f} KB)", [thread] * 5)):
+        legacy_time = best_of(lambda: [legacy_extract_latest_reply(text, "sender@example.com") for text in inputs], 5)
+        compiled_time = best_of(lambda: [extractor.extract(text) for text in inputs], 5)
+        print(f"{label}: legacy {legacy_time * 1000:.1f} ms, compiled {compiled_time * 1000:.1f} ms, speedup {legacy_time / compiled_time:.1f}x")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
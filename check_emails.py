@@ -1,243 +1,215 @@
+import time
 import imaplib
+import threading
+import concurrent.futures
 import email
-import time
-import re
+from datetime import datetime
 from handlers.email_handler import EmailHandler
+from services.mailbox_watcher import MailboxWatcher
+from services.mailbox_checkpoint import MailboxCheckpoint
+from services.imap_fetch import MessageFetcher
+from services.inbound_pool import InboundPool
+from services.reply_extractor import extract_latest_reply
+from services.email_thread import EmailThread
 from config.config import Config
+from services.outbound_queue import get_outbound_queue
+from services.message_coalescer import MessageCoalescer
+from services.mailbox_status import MailboxStatus
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def extract_latest_reply(email_text, sender_email):
+def process_email(email_handler, headers, text, outbound_queue=None, reply_key=None, coalescer=None):
     """
-    Extract only the latest reply content from an email thread.
-    This function attempts to identify and remove quoted content from previous emails.
+    Extract the new content of one email and reply to it.
+    headers is an email.message.Message with at least the From, Subject and threading headers,
+    and text is the decoded message text (HTML-only emails already converted to text).
+    With an outbound queue, the reply is queued for sending under reply_key, so handling
+    the same email again (e.g. after a crash) never sends a second reply. With a coalescer
+    (and COALESCE_WINDOW_EMAIL set) the email is held instead, so that emails the sender
+    writes in quick succession are answered together by an email_turn job.
+    
+    An email whose In-Reply-To or References header points at a known message joins that
+    message's conversation, whoever sent it, and since the earlier turns are already stored
+    its quoted history is dropped more aggressively.
     """
-    logger.info(f"EXTRACTION DEBUG - Original email text: {email_text[:200]}...")
-    
-    # If the email is very short, it's likely just a new message
-    if len(email_text) < 100:
-        logger.info(f"EXTRACTION DEBUG - Email is short (<100 chars), returning as is")
-        return email_text.strip()
-    
-    # First, try to extract content by looking for quoted lines (starting with >)
-    lines = email_text.split('\n')
-    logger.info(f"EXTRACTION DEBUG - Split into {len(lines)} lines")
-    
-    non_quoted_lines = []
-    found_quoted = False
-    
-    for i, line in enumerate(lines):
-        if line.strip().startswith('>'):
-            found_quoted = True
-            logger.info(f"EXTRACTION DEBUG - Found quoted line {i}: {line[:50]}...")
-            continue
-        # Skip empty lines right after quoted content
-        if found_quoted and not line.strip():
-            continue
-        found_quoted = False
-        non_quoted_lines.append(line)
-    
-    # If we found quoted content and extracted something meaningful
-    extracted_by_quotes = '\n'.join(non_quoted_lines).strip()
-    if found_quoted and len(extracted_by_quotes) > 20:
-        logger.info(f"EXTRACTION DEBUG - Extracted by quotes: {extracted_by_quotes[:100]}...")
-        return extracted_by_quotes
-    
-    # Common patterns that indicate the start of a quoted message
-    patterns = [
-        # Standard email client quote patterns
-        r'\nOn .*wrote:',
-        r'\n-----Original Message-----',
-        r'\n-+Forwarded message-+',
-        r'\nFrom:.*\nSent:.*\nTo:.*\nSubject:',
-        # Joline's signature pattern
-        r'\nWarm regards,\nJoline\n',
-        r'\n--\nJoline \| Restaurant Sales Assistant',
-        # Gmail's quote marker
-        r'\nOn .* at .*, .* <.*> wrote:',
-        # Outlook style
-        r'\n-+Original Message-+',
-        # Apple Mail style
-        r'\nOn .*, .* wrote:',
-        # Generic date-based patterns
-        r'\nOn \d{1,2}/\d{1,2}/\d{2,4}',
-        r'\nOn \w+, \w+ \d{1,2}, \d{4} at \d{1,2}:\d{2} [AP]M',
-        # Common delimiters
-        r'\n-{3,}',  # Three or more hyphens
-        r'\n_{3,}',  # Three or more underscores
-        r'\n\*{3,}', # Three or more asterisks
-        # Email client specific
-        r'\nSent from my iPhone',
-        r'\nSent from my Android',
-    ]
-    
-    # Find the earliest occurrence of any quote pattern
-    earliest_pos = len(email_text)
-    matching_pattern = None
-    
-    for pattern in patterns:
-        matches = list(re.finditer(pattern, email_text))
-        if matches:
-            pos = matches[0].start()
-            logger.info(f"EXTRACTION DEBUG - Found pattern '{pattern}' at position {pos}")
-            if pos < earliest_pos:
-                earliest_pos = pos
-                matching_pattern = pattern
-    
-    # Extract only the content before the quoted text
-    if earliest_pos < len(email_text):
-        logger.info(f"EXTRACTION DEBUG - Found quote pattern: {matching_pattern} at position {earliest_pos}")
-        new_content = email_text[:earliest_pos].strip()
-        
-        # If we have very little content, we might have been too aggressive
-        if len(new_content) < 10:
-            logger.info(f"EXTRACTION DEBUG - Extracted content too short (<10 chars): '{new_content}'")
-            # Try another approach - look for the first paragraph
-            paragraphs = re.split(r'\n\s*\n', email_text)
-            logger.info(f"EXTRACTION DEBUG - Split into {len(paragraphs)} paragraphs")
-            if paragraphs and len(paragraphs[0]) > 10:
-                logger.info(f"EXTRACTION DEBUG - Using first paragraph: {paragraphs[0][:100]}...")
-                return paragraphs[0].strip()
-        
-        logger.info(f"EXTRACTION DEBUG - Final extracted content: {new_content[:100]}...")
-        return new_content
-    
-    # If no quote patterns were found, check if we have multiple paragraphs
-    paragraphs = re.split(r'\n\s*\n', email_text)
-    logger.info(f"EXTRACTION DEBUG - No patterns found, split into {len(paragraphs)} paragraphs")
-    
-    # Check if we have HTML content in the email
-    html_content_index = -1
-    for i, para in enumerate(paragraphs):
-        if '[HTML_CONTENT]' in para:
-            html_content_index = i
-            logger.info(f"EXTRACTION DEBUG - Found HTML content in paragraph {i}")
-            break
-    
-    # If we found HTML content, only use paragraphs before it
-    if html_content_index > 0:
-        # Join all paragraphs before the HTML content
-        content_before_html = '\n\n'.join(paragraphs[:html_content_index]).strip()
-        logger.info(f"EXTRACTION DEBUG - Using content before HTML: {content_before_html[:100]}...")
-        return content_before_html
-    
-    # If we have multiple paragraphs but no HTML marker, join all non-signature paragraphs
-    # (Exclude common signature indicators like "Kind regards", "Thanks", etc.)
-    if len(paragraphs) > 1:
-        # Check for signature indicators
-        signature_indicators = ['kind regards', 'regards', 'thanks', 'thank you', 'cheers', 'sincerely', 'best wishes']
-        content_paragraphs = []
-        
-        for para in paragraphs:
-            para_lower = para.lower().strip()
-            # Skip if it's just a signature line
-            if any(indicator in para_lower for indicator in signature_indicators) and len(para_lower) < 30:
-                logger.info(f"EXTRACTION DEBUG - Skipping signature paragraph: {para}")
-                continue
-            content_paragraphs.append(para)
-        
-        # Join all content paragraphs
-        full_content = '\n\n'.join(content_paragraphs).strip()
-        logger.info(f"EXTRACTION DEBUG - Using full content: {full_content[:100]}...")
-        return full_content
-    
-    # If all else fails, return the original text
-    logger.info(f"EXTRACTION DEBUG - Returning original text")
-    return email_text.strip()
+    # Get sender and subject
+    from_email = email.utils.parseaddr(headers["From"])[1]
+    subject = headers["Subject"] or ""
+    
+    # Check for reply headers
+    thread = EmailThread.from_headers(headers)
+    is_reply_by_headers = bool(thread.references) or bool(thread.in_reply_to)
+    conversation_key = email_handler.find_conversation(thread) if is_reply_by_headers else None
+    
+    logger.info(f"Processing email - From: {from_email}, Subject: {subject}")
+    if is_reply_by_headers:
+        logger.info(f"Email headers indicate this is a reply ({'conversation ' + conversation_key if conversation_key else 'unknown thread'})")
+    
+    # Extract only the new content from reply emails
+    logger.info(f"Original email content length: {len(text)} characters")
+    extracted_text = extract_latest_reply(text, known_thread=conversation_key is not None)
+    logger.info(f"Extracted message content ({len(extracted_text)} chars): {extracted_text[:100]}...")
+    
+    # Check if this is likely a reply
+    is_reply = is_reply_by_headers or "Re:" in subject or len(text) > 500
+    if is_reply:
+        logger.info("Detected as a reply email - extracting latest content only")
+    
+    # Handle the email
+    if not extracted_text:
+        return
+    if outbound_queue is None:
+        email_handler.handle_incoming_email(extracted_text, from_email, thread)
+        return
+    if coalescer is not None and coalescer.enabled('email'):
+        coalescer.add('email', from_email, extracted_text, message_key=reply_key, metadata=thread.to_dict())
+        return
+    reply = email_handler.compose_reply(extracted_text, from_email, thread, conversation_key)
+    outbound_queue.enqueue('email', 'email_send', reply, idempotency_key=reply_key)
 
-def check_emails():
-    """Check for new emails using IMAP"""
+def check_emails(name="inbox", address=None, password=None, folder="inbox", imap_server=None):
+    """
+    Watch one mailbox over a persistent IMAP connection and reply to new emails.
+    New mail is pushed with IMAP IDLE where the server supports it; otherwise the
+    same connection is polled at an adaptive interval.
+    
+    Progress is kept as a UID checkpoint on disk, so each pass only looks at unread
+    messages above the last handled UID and a restart carries on where it stopped.
+    Only headers and text parts are downloaded, never attachments, and the emails
+    found in one pass are answered by a pool of INBOUND_WORKERS threads.
+    Replies go through the outbound queue keyed by UIDVALIDITY and UID, which makes
+    processing exactly-once even if the checker dies between replying and saving
+    the checkpoint. An email whose handling fails stays unread and below the checkpoint
+    and is retried on the next pass; after IMAP_MAX_ATTEMPTS failures it is handed to
+    the outbound queue as an email_inbound job under the same key.
+    
+    With no arguments this serves the inbox of EMAIL_ADDRESS; email_supervisor.py runs
+    one call per configured mailbox, each in its own process. Health is reported under
+    MAILBOX_STATUS_DIR/<name>.json.
+    """
     email_handler = EmailHandler()
-    processed_ids = set()  # Keep track of processed message IDs
+    outbound_queue = get_outbound_queue()
+    email_handler.register_jobs(outbound_queue)
+    outbound_queue.start(['email'])
+    coalescer = MessageCoalescer(outbound_queue)
     
-    while True:
+    watcher = MailboxWatcher(host=imap_server, username=address, password=password, mailbox=folder)
+    checkpoint = MailboxCheckpoint(watcher.username, watcher.mailbox)
+    
+    # Different senders are answered in parallel, each sender's emails in order
+    pool = InboundPool(name=f"email-{name}")
+    
+    # Emails handed to the pool and not finished yet, with the time they were fetched
+    pending_since = {}
+    counts = {"processed": 0, "failed": 0}
+    counts_lock = threading.Lock()
+    
+    def snapshot():
+        oldest = min(pending_since.values(), default=None)
+        return {
+            "connected": watcher.mail is not None,
+            "mode": "idle" if watcher.supports_idle else "poll",
+            "uidvalidity": watcher.uidvalidity,
+            "last_uid": checkpoint.last_uid,
+            "in_flight": len(pending_since),
+            "queue_depth": pool.queue_depth(),
+            "lag_seconds": round(time.time() - oldest, 1) if oldest else 0,
+            "processed": counts["processed"],
+            "failed": counts["failed"],
+            "connection_failures": watcher.failures,
+            "last_error": watcher.last_error
+        }
+    
+    status = MailboxStatus(name)
+    status.update(account=watcher.username, folder=watcher.mailbox, state="starting")
+    status.start_heartbeat(snapshot)
+    
+    # Failed passes per UID; a failing email is retried on later passes before it is handed
+    # to the outbound queue, which retries with backoff and dead-letters it in the end
+    attempts = {}
+    
+    def hand_over(uid, headers, text, reply_key):
+        """Queue an email that keeps failing as an email_inbound job. Returns True if it was queued (or already was)."""
         try:
-            # Connect to Gmail IMAP
-            mail = imaplib.IMAP4_SSL("imap.gmail.com")
-            mail.login(Config.EMAIL_ADDRESS, Config.EMAIL_PASSWORD)
-            mail.select("inbox")
-            
-            # Search for unread emails
-            _, messages = mail.search(None, "UNSEEN")
-            
-            message_nums = messages[0].split()
-            logger.info(f"Found {len(message_nums)} unread messages")
-            
-            # Process each unread message
-            for num in message_nums:
-                try:
-                    # Get message ID
-                    _, msg_data = mail.fetch(num, "(BODY[HEADER.FIELDS (MESSAGE-ID)])")
-                    message_id = email.message_from_bytes(msg_data[0][1]).get("Message-ID", "")
-                    
-                    # Skip if already processed
-                    if message_id in processed_ids:
-                        logger.info(f"Skipping already processed message: {message_id}")
-                        continue
-                        
-                    processed_ids.add(message_id)
-                    
-                    # Get email content
-                    _, msg = mail.fetch(num, "(RFC822)")
-                    email_body = msg[0][1]
-                    email_message = email.message_from_bytes(email_body)
-                    
-                    # Get sender and subject
-                    from_email = email.utils.parseaddr(email_message["From"])[1]
-                    subject = email_message["Subject"]
-                    
-                    # Check for reply headers
-                    references = email_message.get("References", "")
-                    in_reply_to = email_message.get("In-Reply-To", "")
-                    is_reply_by_headers = bool(references) or bool(in_reply_to)
-                    
-                    logger.info(f"Processing email - From: {from_email}, Subject: {subject}")
-                    if is_reply_by_headers:
-                        logger.info("Email headers indicate this is a reply")
-                    
-                    # Get email content
-                    text = ""
-                    if email_message.is_multipart():
-                        for part in email_message.walk():
-                            if part.get_content_type() == "text/plain":
-                                text += part.get_payload(decode=True).decode() + "\n"
-                            elif part.get_content_type() == "text/html":
-                                # Keep HTML signatures
-                                text += f"\n[HTML_CONTENT]{part.get_payload(decode=True).decode()}[/HTML_CONTENT]\n"
-                    else:
-                        text = email_message.get_payload(decode=True).decode()
-                    
-                    # Extract only the new content from reply emails
-                    logger.info(f"Original email content length: {len(text)} characters")
-                    extracted_text = extract_latest_reply(text, from_email)
-                    logger.info(f"Extracted message content ({len(extracted_text)} chars): {extracted_text[:100]}...")
-                    
-                    # Check if this is likely a reply
-                    is_reply = is_reply_by_headers or "Re:" in subject or len(text) > 500
-                    if is_reply:
-                        logger.info("Detected as a reply email - extracting latest content only")
-                    
-                    # Handle the email
-                    if extracted_text:
-                        email_handler.handle_incoming_email(extracted_text, from_email)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing email: {str(e)}")
-            
-            # Clean up old message IDs (keep last 100)
-            if len(processed_ids) > 100:
-                processed_ids = set(list(processed_ids)[-100:])
-            
-            mail.close()
-            mail.logout()
-            
+            outbound_queue.enqueue(
+                'email',
+                'email_inbound',
+                {
+                    'email_content': extract_latest_reply(text),
+                    'from_email': email.utils.parseaddr(headers["From"])[1],
+                    'thread': EmailThread.from_headers(headers).to_dict()
+                },
+                idempotency_key=reply_key
+            )
+            return True
         except Exception as e:
-            logger.error(f"Error checking emails: {str(e)}")
+            logger.error(f"Could not queue email {uid} for retry: {str(e)}")
+            return False
+    
+    def handle_message(uid, headers, text, reply_key):
+        """Reply to one email. Returns True once it is handled and can be marked as read."""
+        try:
+            process_email(email_handler, headers, text, outbound_queue, reply_key, coalescer)
+            handled = True
+        except Exception as e:
+            with counts_lock:
+                attempts[uid] = attempts.get(uid, 0) + 1
+                failed_passes = attempts[uid]
+            logger.error(f"Error processing email {uid} (attempt {failed_passes}): {str(e)}")
+            handled = failed_passes >= Config.IMAP_MAX_ATTEMPTS and hand_over(uid, headers, text, reply_key)
+        with counts_lock:
+            counts["processed" if handled else "failed"] += 1
+            if handled:
+                attempts.pop(uid, None)
+        if handled:
+            checkpoint.complete(uid)
+        else:
+            # Stays unread and below the checkpoint, so the next pass tries it again
+            checkpoint.fail(uid)
+        pending_since.pop(uid, None)
+        return handled
+    
+    def process_new(mail):
+        checkpoint.validate(watcher.uidvalidity)
+        
+        # Unread messages above the checkpoint
+        _, data = mail.uid("SEARCH", None, checkpoint.search_criteria(), "UNSEEN")
+        uids = checkpoint.filter_new(int(uid) for uid in data[0].split())
+        logger.info(f"[{name}] Found {len(uids)} new messages")
         
-        # Wait before checking again
-        time.sleep(10)
+        # Headers and text parts only; attachments stay on the server
+        fetcher = MessageFetcher(mail)
+        futures = {}
+        try:
+            for message in fetcher.fetch(uids):
+                reply_key = f"imap:{checkpoint.account}:{watcher.mailbox}:{watcher.uidvalidity}:{message.uid}"
+                sender = email.utils.parseaddr(message.headers["From"])[1].lower()
+                checkpoint.begin(message.uid)
+                pending_since[message.uid] = time.time()
+                futures[message.uid] = pool.submit(
+                    sender, handle_message, message.uid, message.headers, message.text(), reply_key
+                )
+                logger.info(f"[{name}] Queued email {message.uid} from {sender} ({pool.queue_depth()} waiting)")
+        finally:
+            # The IMAP connection belongs to this thread, so wait for the workers before marking emails read
+            concurrent.futures.wait(futures.values())
+            handled = [uid for uid, future in futures.items() if not future.exception() and future.result()]
+            if handled and watcher.mail is mail:
+                try:
+                    fetcher.mark_seen(handled)
+                except (imaplib.IMAP4.error, OSError) as e:
+                    logger.error(f"Could not mark emails as read: {str(e)}")
+        status.update(state="running", last_pass_at=datetime.now().isoformat(timespec="seconds"), last_pass_found=len(uids))
+        return len(uids)
+    
+    try:
+        watcher.run(process_new)
+    finally:
+        watcher.disconnect()
+        status.stop()
+        status.update(state="stopped")
 
 if __name__ == "__main__":
     logger.info("Starting email checker...")
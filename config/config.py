@@ -10,8 +10,82 @@ class Config:
     TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
     TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER')
     TWILIO_VERIFY_SERVICE_SID = os.getenv('TWILIO_VERIFY_SERVICE_SID')
+    # Reject Twilio webhooks without a valid X-Twilio-Signature
+    TWILIO_VALIDATE_SIGNATURE = os.getenv('TWILIO_VALIDATE_SIGNATURE', 'true').lower() == 'true'
+    # SMS replies are steered toward SMS_TARGET_SEGMENTS segments and cut at a sentence
+    # boundary to at most SMS_MAX_SEGMENTS (153 GSM-7 or 67 UCS-2 characters each)
+    SMS_TARGET_SEGMENTS = int(os.getenv('SMS_TARGET_SEGMENTS', '2'))
+    SMS_MAX_SEGMENTS = int(os.getenv('SMS_MAX_SEGMENTS', '3'))
     SMTP_SERVER = os.getenv('SMTP_SERVER')
     SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
     EMAIL_ADDRESS = os.getenv('EMAIL_ADDRESS')
     EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
-    XAI_API_KEY = os.getenv('XAI_API_KEY')
\ No newline at end of file
+    IMAP_SERVER = os.getenv('IMAP_SERVER', 'imap.gmail.com')
+    IMAP_USE_IDLE = os.getenv('IMAP_USE_IDLE', 'true').lower() == 'true'
+    IMAP_IDLE_REFRESH = float(os.getenv('IMAP_IDLE_REFRESH', str(29 * 60)))
+    IMAP_POLL_MIN = float(os.getenv('IMAP_POLL_MIN', '10'))
+    IMAP_POLL_MAX = float(os.getenv('IMAP_POLL_MAX', '120'))
+    # New mail is fetched without attachments: at most this many bytes of each text part
+    IMAP_TEXT_MAX_BYTES = int(os.getenv('IMAP_TEXT_MAX_BYTES', str(64 * 1024)))
+    IMAP_FETCH_BATCH_SIZE = int(os.getenv('IMAP_FETCH_BATCH_SIZE', '50'))
+    # Passes an email may fail before it is handed to the outbound queue (which retries with backoff)
+    IMAP_MAX_ATTEMPTS = int(os.getenv('IMAP_MAX_ATTEMPTS', '3'))
+    # Failed passes after which an email that can't even be queued is skipped, so it doesn't hold the checkpoint back
+    IMAP_CHECKPOINT_MAX_FAILURES = int(os.getenv('IMAP_CHECKPOINT_MAX_FAILURES', '10'))
+    # Inbound email text (after HTML-to-text conversion) is capped before it reaches the prompt
+    INBOUND_TEXT_MAX_CHARS = int(os.getenv('INBOUND_TEXT_MAX_CHARS', '8000'))
+    # Mailboxes served by email_supervisor.py, as a JSON list of
+    # {"name", "address", "password" or "password_env", "folder", "imap_server"}.
+    # Empty means one mailbox: the inbox of EMAIL_ADDRESS.
+    EMAIL_MAILBOXES = os.getenv('EMAIL_MAILBOXES', '')
+    MAILBOX_STATUS_DIR = os.getenv('MAILBOX_STATUS_DIR', os.path.join('data', 'mailbox_status'))
+    MAILBOX_HEARTBEAT_INTERVAL = float(os.getenv('MAILBOX_HEARTBEAT_INTERVAL', '15'))
+    # Inbound emails are answered in parallel across senders (keep within the OpenAI rate limit)
+    INBOUND_WORKERS = int(os.getenv('INBOUND_WORKERS', '4'))
+    INBOUND_MAX_PENDING = int(os.getenv('INBOUND_MAX_PENDING', '100'))
+    SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '2'))
+    SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', '240'))
+    SMTP_NOOP_INTERVAL = float(os.getenv('SMTP_NOOP_INTERVAL', '15'))
+    ATTACHMENT_CACHE_BYTES = int(os.getenv('ATTACHMENT_CACHE_BYTES', str(32 * 1024 * 1024)))
+    XAI_API_KEY = os.getenv('XAI_API_KEY')
+
+    # PDF menu rendering (wkhtmltopdf is looked up on PATH when no path is set)
+    WKHTMLTOPDF_PATH = os.getenv('WKHTMLTOPDF_PATH')
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+
+    # Number of generated versions kept per menu in attachments/artifacts
+    ARTIFACT_KEEP_VERSIONS = int(os.getenv('ARTIFACT_KEEP_VERSIONS', '5'))
+
+    # Durable outbound queue for webhook replies
+    OUTBOUND_QUEUE_DB = os.getenv('OUTBOUND_QUEUE_DB', os.path.join('data', 'outbound_queue.db'))
+    OUTBOUND_WORKERS_PER_CHANNEL = int(os.getenv('OUTBOUND_WORKERS_PER_CHANNEL', '2'))
+    OUTBOUND_MAX_ATTEMPTS = int(os.getenv('OUTBOUND_MAX_ATTEMPTS', '5'))
+    OUTBOUND_BACKOFF_BASE = float(os.getenv('OUTBOUND_BACKOFF_BASE', '5'))
+    OUTBOUND_RETENTION_DAYS = int(os.getenv('OUTBOUND_RETENTION_DAYS', '7'))
+    OUTBOUND_LEASE_SECONDS = int(os.getenv('OUTBOUND_LEASE_SECONDS', '600'))
+
+    # Messages one sender sends within this many seconds of each other are answered as one
+    # turn; a burst is answered at the latest COALESCE_MAX_WAIT seconds in. Off (0) by default:
+    # a window delays every reply by at least its length, in exchange for one answer (and one
+    # AI call) per burst. Around 20 for email and 6 for SMS/WhatsApp suits split messages.
+    COALESCE_WINDOW_EMAIL = float(os.getenv('COALESCE_WINDOW_EMAIL', '0'))
+    COALESCE_WINDOW_SMS = float(os.getenv('COALESCE_WINDOW_SMS', '0'))
+    COALESCE_WINDOW_WHATSAPP = float(os.getenv('COALESCE_WINDOW_WHATSAPP', '0'))
+    COALESCE_MAX_WAIT = float(os.getenv('COALESCE_MAX_WAIT', '60'))
+
+    # Responses to webhook deliveries, replayed when a provider delivers the same message again
+    WEBHOOK_DEDUP_DB = os.getenv('WEBHOOK_DEDUP_DB', os.path.join('data', 'webhook_dedup.db'))
+    WEBHOOK_DEDUP_MEMORY = int(os.getenv('WEBHOOK_DEDUP_MEMORY', '10000'))
+    WEBHOOK_DEDUP_RETENTION_DAYS = int(os.getenv('WEBHOOK_DEDUP_RETENTION_DAYS', '3'))
+
+    # Conversation history shared by the web app and the mailbox workers
+    CONVERSATION_DB = os.getenv('CONVERSATION_DB', os.path.join('data', 'conversations.db'))
+    CONVERSATION_RETENTION_DAYS = int(os.getenv('CONVERSATION_RETENTION_DAYS', '90'))
+
+    # Menu delivery per channel: "attach" (PDF attachments), "link" (versioned URLs) or
+    # "auto" (attach unless the attachments add up to more than MENU_LINK_THRESHOLD_BYTES)
+    MENU_DELIVERY_EMAIL = os.getenv('MENU_DELIVERY_EMAIL', 'attach')
+    MENU_DELIVERY_SMS = os.getenv('MENU_DELIVERY_SMS', 'attach')
+    MENU_DELIVERY_WHATSAPP = os.getenv('MENU_DELIVERY_WHATSAPP', 'attach')
+    MENU_LINK_THRESHOLD_BYTES = int(os.getenv('MENU_LINK_THRESHOLD_BYTES', str(2 * 1024 * 1024)))
+    PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '')
\ No newline at end of file
@@ -1,13 +1,12 @@
-import os
-import pdfkit
+import sys
 import logging
+from services.pdf_builder import PdfBuilder
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def convert_menus():
-    """Convert all HTML menus to PDF"""
-    attachments_dir = 'attachments'
+def convert_menus(force=False):
+    """Convert the HTML menus whose PDFs are missing or out of date"""
     menu_files = [
         'breakfast_menu',
         'kiddies_menu',
@@ -16,23 +15,24 @@ def convert_menus():
         'drinks_menu'
     ]
 
-    config = pdfkit.configuration(wkhtmltopdf=r'wkhtmltopdf.exe')
-    options = {
-        'quiet': '',
-        'enable-local-file-access': None
-    }
+    builder = PdfBuilder()
+    if not builder.available:
+        logger.error("wkhtmltopdf not found; install it or set WKHTMLTOPDF_PATH")
+        return False
 
-    for menu in menu_files:
-        html_path = os.path.join(attachments_dir, f'{menu}.html')
-        pdf_path = os.path.join(attachments_dir, f'{menu}.pdf')
+    try:
+        results = builder.build(menu_files, wait=True, force=force)
+    finally:
+        builder.shutdown()
 
-        if os.path.exists(html_path) and not os.path.exists(pdf_path):
-            try:
-                logger.info(f"Converting {menu} to PDF...")
-                pdfkit.from_file(html_path, pdf_path, options=options, configuration=config)
-                logger.info(f"Successfully converted {menu} to PDF")
-            except Exception as e:
-                logger.error(f"Error converting {menu} to PDF: {str(e)}")
+    if not results:
+        logger.info("All PDF menus are up to date")
+    for pdf_name, success in results.items():
+        if success:
+            logger.info(f"Successfully converted {pdf_name}")
+        else:
+            logger.error(f"Error converting {pdf_name}")
+    return all(results.values())
 
 if __name__ == "__main__":
-    convert_menus()
\ No newline at end of file
+    sys.exit(0 if convert_menus(force="--force" in sys.argv[1:]) else 1)
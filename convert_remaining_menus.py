@@ -1,40 +1,18 @@
-import pdfkit
 import os
 import logging
+from services.pdf_builder import PdfBuilder
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def convert_menu(html_file, pdf_file):
+def convert_menu(html_file, pdf_file=None):
+    """Convert one HTML menu to PDF (the PDF is written next to the HTML file)"""
+    builder = PdfBuilder(attachments_dir=os.path.dirname(html_file) or '.')
     try:
-        # Configure pdfkit with absolute path to wkhtmltopdf
-        config = pdfkit.configuration(wkhtmltopdf='wkhtmltopdf.exe')
-        
-        # Set options for better conversion
-        options = {
-            'quiet': '',
-            'enable-local-file-access': '',
-            'disable-smart-shrinking': '',
-            'margin-top': '0',
-            'margin-right': '0',
-            'margin-bottom': '0',
-            'margin-left': '0',
-            'encoding': 'UTF-8',
-            'no-outline': None
-        }
-        
-        # Convert HTML to PDF
-        pdfkit.from_file(
-            html_file,
-            pdf_file,
-            options=options,
-            configuration=config
-        )
-        logger.info(f"Successfully converted {html_file} to PDF")
-        return True
-    except Exception as e:
-        logger.error(f"Error converting {html_file} to PDF: {str(e)}")
-        return False
+        results = builder.build([html_file], wait=True, force=True)
+        return all(results.values()) if results else False
+    finally:
+        builder.shutdown()
 
 def main():
     attachments_dir = 'attachments'
@@ -43,13 +21,17 @@ def main():
         'kiddies_menu'
     ]
     
-    for menu in menus_to_convert:
-        html_path = os.path.join(attachments_dir, f'{menu}.html')
-        pdf_path = os.path.join(attachments_dir, f'{menu}.pdf')
-        
-        if os.path.exists(html_path) and not os.path.exists(pdf_path):
+    builder = PdfBuilder(attachments_dir=attachments_dir)
+    try:
+        stale = builder.stale_menus(menus_to_convert)
+        for menu in stale:
             logger.info(f"Converting {menu}...")
-            convert_menu(html_path, pdf_path)
+        results = builder.build(stale, wait=True)
+    finally:
+        builder.shutdown()
+    
+    for pdf_name, success in results.items():
+        logger.info(f"{'Successfully converted' if success else 'Failed to convert'} {pdf_name}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
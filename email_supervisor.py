@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import multiprocessing
+from datetime import datetime
+from config.config import Config
+from services.mailbox_status import MailboxStatus
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def load_mailboxes():
+    """
+    The mailboxes to serve, from EMAIL_MAILBOXES (a JSON list) or, if that is empty, the
+    inbox of EMAIL_ADDRESS. Each entry needs a unique name and an address; the password can
+    be given directly or as the name of an environment variable in password_env.
+    """
+    if not Config.EMAIL_MAILBOXES.strip():
+        return [{"name": "general", "address": Config.EMAIL_ADDRESS, "password": Config.EMAIL_PASSWORD, "folder": "inbox"}]
+
+    mailboxes = []
+    for entry in json.loads(Config.EMAIL_MAILBOXES):
+        if not entry.get("name") or not entry.get("address"):
+            raise ValueError(f"Mailbox entries need a name and an address: {entry}")
+        password = entry.get("password")
+        if not password and entry.get("password_env"):
+            password = os.getenv(entry["password_env"])
+        mailboxes.append({
+            "name": entry["name"],
+            "address": entry["address"],
+            "password": password or Config.EMAIL_PASSWORD,
+            "folder": entry.get("folder", "inbox"),
+            "imap_server": entry.get("imap_server")
+        })
+    names = [mailbox["name"] for mailbox in mailboxes]
+    if len(set(names)) != len(names):
+        raise ValueError("Mailbox names in EMAIL_MAILBOXES must be unique")
+    return mailboxes
+
+def run_mailbox(mailbox):
+    """Entry point of a worker process: serve one mailbox until terminated."""
+    from check_emails import check_emails
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info(f"Mailbox worker {mailbox['name']} started (pid {os.getpid()})")
+    check_emails(**mailbox)
+
+class EmailSupervisor:
+    """
+    Runs one ingestion process per mailbox (or folder) and keeps them alive.
+
+    Every worker has its own IMAP connection, UID checkpoint and inbound pool, so ingestion
+    capacity grows with the number of mailboxes instead of sharing one polling loop. The
+    workers share the SQLite outbound queue and conversation store. A worker that exits, or
+    whose heartbeat goes stale, is restarted with exponential backoff, and health() combines
+    the process state with the status each worker reports.
+    """
+
+    def __init__(self, mailboxes, check_interval=5.0, restart_max=300.0):
+        self.mailboxes = {mailbox["name"]: mailbox for mailbox in mailboxes}
+        self.check_interval = check_interval
+        self.restart_max = restart_max
+        self.stale_after = Config.MAILBOX_HEARTBEAT_INTERVAL * 4
+        # Spawned rather than forked, so workers don't inherit the supervisor's threads and locks
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = {}
+        self._restarts = {name: 0 for name in self.mailboxes}
+        self._next_start = {name: 0.0 for name in self.mailboxes}
+        self._started_at = {}
+        self._stopping = False
+
+    def _start(self, name):
+        process = self._context.Process(target=run_mailbox, args=(self.mailboxes[name],), name=f"mailbox-{name}")
+        process.start()
+        self._processes[name] = process
+        self._started_at[name] = time.time()
+        logger.info(f"Started mailbox worker {name} (pid {process.pid})")
+
+    def _stop_process(self, name, timeout=10.0):
+        process = self._processes.get(name)
+        if process is None:
+            return
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def _heartbeat_stale(self, name):
+        report = MailboxStatus.read(name)
+        if not report or report.get("pid") != self._processes[name].pid:
+            # No report from this process yet; give it time to connect
+            return time.time() - self._started_at[name] > self.stale_after * 2
+        return time.time() - report.get("heartbeat", 0) > self.stale_after
+
+    def check(self):
+        """Restart workers that have exited or stopped reporting."""
+        now = time.time()
+        for name in self.mailboxes:
+            process = self._processes.get(name)
+            healthy = process is not None and process.is_alive()
+            if healthy and self._heartbeat_stale(name):
+                logger.error(f"Mailbox worker {name} stopped reporting; restarting it")
+                self._stop_process(name)
+                healthy = False
+            if healthy:
+                # A worker that has stayed up for a while is no longer crash-looping
+                if now - self._started_at[name] > self.restart_max:
+                    self._restarts[name] = 0
+                continue
+            if process is not None and self._next_start[name] <= self._started_at.get(name, 0):
+                delay = min(2 ** self._restarts[name], self.restart_max)
+                self._restarts[name] += 1
+                self._next_start[name] = now + delay
+                logger.error(f"Mailbox worker {name} exited (code {process.exitcode}); restarting in {delay:.0f}s")
+            if now >= self._next_start[name]:
+                self._start(name)
+
+    def health(self):
+        """One row per mailbox: process state plus the worker's last status report."""
+        rows = []
+        for name, mailbox in self.mailboxes.items():
+            process = self._processes.get(name)
+            report = MailboxStatus.read(name) or {}
+            alive = process is not None and process.is_alive()
+            heartbeat_age = time.time() - report["heartbeat"] if "heartbeat" in report else None
+            if not alive:
+                state = "down"
+            elif heartbeat_age is None or heartbeat_age > self.stale_after:
+                state = "stale"
+            elif not report.get("connected"):
+                state = "connecting"
+            else:
+                state = "ok"
+            rows.append({
+                "name": name,
+                "address": mailbox["address"],
+                "folder": mailbox["folder"],
+                "state": state,
+                "pid": process.pid if alive else None,
+                "restarts": self._restarts[name],
+                "heartbeat_age": round(heartbeat_age, 1) if heartbeat_age is not None else None,
+                **{key: report.get(key) for key in (
+                    "mode", "last_uid", "in_flight", "queue_depth", "lag_seconds",
+                    "processed", "failed", "last_pass_at", "last_error"
+                )}
+            })
+        return rows
+
+    def run(self, report_interval=60.0):
+        for name in self.mailboxes:
+            self._start(name)
+        last_report = time.time()
+        try:
+            while True:
+                time.sleep(self.check_interval)
+                if self._stopping:
+                    break
+                self.check()
+                if time.time() - last_report >= report_interval:
+                    logger.info("Mailbox health:\n" + format_health(self.health()))
+                    last_report = time.time()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stopping = True
+        for name in list(self._processes):
+            self._stop_process(name)
+
+def format_health(rows):
+    lines = [f"{'MAILBOX':<16} {'STATE':<11} {'MODE':<5} {'LAST UID':>9} {'QUEUE':>6} {'LAG':>7} {'DONE':>6} {'FAILED':>6}  LAST ERROR"]
+    for row in rows:
+        lag = f"{row['lag_seconds']:.0f}s" if row.get("lag_seconds") is not None else "-"
+        lines.append(
+            f"{row['name']:<16} {row['state']:<11} {row.get('mode') or '-':<5} {row.get('last_uid') or 0:>9} "
+            f"{(row.get('queue_depth') or 0) + (row.get('in_flight') or 0):>6} {lag:>7} "
+            f"{row.get('processed') or 0:>6} {row.get('failed') or 0:>6}  {row.get('last_error') or ''}"
+        )
+    return "\n".join(lines)
+
+def main():
+    """
+    Run one email ingestion worker per mailbox and keep them healthy.
+    Examples:
+        python email_supervisor.py
+        python email_supervisor.py --mailbox weddings --mailbox functions
+        python email_supervisor.py --status
+    """
+    parser = argparse.ArgumentParser(description="Supervise the email ingestion workers")
+    parser.add_argument("--mailbox", action="append", help="Only run this mailbox (may be repeated)")
+    parser.add_argument("--status", action="store_true", help="Show the last reported health of each mailbox and exit")
+    args = parser.parse_args()
+
+    mailboxes = load_mailboxes()
+    if args.mailbox:
+        unknown = set(args.mailbox) - {mailbox["name"] for mailbox in mailboxes}
+        if unknown:
+            print(f"Unknown mailbox: {', '.join(sorted(unknown))}")
+            return 1
+        mailboxes = [mailbox for mailbox in mailboxes if mailbox["name"] in args.mailbox]
+
+    supervisor = EmailSupervisor(mailboxes)
+    if args.status:
+        # Processes belong to the running supervisor, so judge them by their reports alone
+        rows = supervisor.health()
+        for row in rows:
+            report = MailboxStatus.read(row["name"]) or {}
+            if report.get("state") == "stopped":
+                row["state"] = "down"
+            elif row["heartbeat_age"] is not None and row["heartbeat_age"] <= supervisor.stale_after:
+                row["state"] = "ok" if report.get("connected") else "connecting"
+            else:
+                row["state"] = "stale"
+            row["pid"] = report.get("pid")
+        print(f"Mailbox health at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(format_health(rows))
+        return 0
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info(f"Supervising {len(mailboxes)} mailboxes: {', '.join(mailbox['name'] for mailbox in mailboxes)}")
+    supervisor.run()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
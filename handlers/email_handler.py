@@ -3,11 +3,15 @@ from services.knowledge_base import KnowledgeBase
 from services.chat_agent import ChatAgent
 import smtplib
 import os
-import pdfkit
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
 from config.config import Config
+from services.pdf_builder import get_pdf_builder
+from services.smtp_pool import get_smtp_pool, SmtpDeliveryUnknown
+from services.attachment_cache import get_attachment_cache
+from services.menu_delivery import MenuDelivery
+from services.message_coalescer import MessageCoalescer
+from services.email_thread import EmailThread, make_message_id
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -22,12 +26,23 @@ class EmailHandler:
         self.email_address = Config.EMAIL_ADDRESS
         self.email_password = Config.EMAIL_PASSWORD
         self.attachments_dir = 'attachments'
+        self.pdf_builder = get_pdf_builder()
+        self.smtp_pool = get_smtp_pool()
+        self.attachment_cache = get_attachment_cache()
+        self.menu_delivery = MenuDelivery()
 
-    def send_email(self, to_email, subject, message, attachments=None):
+    def _build_message(self, to_email, subject, message, attachments=None, message_id=None, in_reply_to=None, references=None):
         msg = MIMEMultipart()
         msg['From'] = self.email_address
         msg['To'] = to_email
         msg['Subject'] = subject
+        # Threading headers, so the reply shows up in the customer's conversation
+        if message_id:
+            msg['Message-ID'] = message_id
+        if in_reply_to:
+            msg['In-Reply-To'] = in_reply_to
+        if references:
+            msg['References'] = references
 
         msg.attach(MIMEText(message, 'plain'))
 
@@ -35,23 +50,51 @@ class EmailHandler:
         if attachments:
             for filename, filepath in attachments:
                 self._attach_file(msg, filepath, filename)
+        return msg
+
+    def send_email(self, to_email, subject, message, attachments=None, message_id=None, in_reply_to=None, references=None):
+        msg = self._build_message(to_email, subject, message, attachments, message_id, in_reply_to, references)
 
         try:
             logger.info(f"Attempting to send email to {to_email}")
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email_address, self.email_password)
-            server.send_message(msg)
-            server.quit()
+            # Sent on a pooled SMTP session, so most replies skip the connect/STARTTLS/login round-trips
+            self.smtp_pool.send(msg)
             logger.info(f"Successfully sent email to {to_email}")
             return True
         except smtplib.SMTPAuthenticationError:
             logger.error("SMTP Authentication failed. Please check your email credentials.")
             return False
+        except SmtpDeliveryUnknown as e:
+            # Sending again could give the customer the reply twice, so it isn't retried
+            logger.error(f"Email to {to_email} ({message_id}) may not have been delivered: {str(e)}")
+            return True
         except Exception as e:
             logger.error(f"Error sending email: {str(e)}")
             return False
 
+    def send_emails(self, emails):
+        """
+        Send a batch of emails back to back on one SMTP session.
+        emails is a list of dicts with to_email, subject, message and optional attachments
+        and threading headers (message_id, in_reply_to, references).
+        Returns a list of True/False per email, in order.
+        """
+        messages = [
+            self._build_message(
+                item['to_email'], item['subject'], item['message'], item.get('attachments'),
+                item.get('message_id'), item.get('in_reply_to'), item.get('references')
+            )
+            for item in emails
+        ]
+        results = self.smtp_pool.send_many(messages)
+        for item, result in zip(emails, results):
+            if result is True:
+                logger.info(f"Successfully sent email to {item['to_email']}")
+            else:
+                logger.error(f"Error sending email to {item['to_email']}: {str(result)}")
+        # A message that may have been delivered counts as sent, so it isn't sent twice
+        return [result is True or isinstance(result, SmtpDeliveryUnknown) for result in results]
+
     def _determine_subject(self, content):
         """Determine appropriate subject based on email content"""
         content_lower = content.lower()
@@ -65,39 +108,66 @@ class EmailHandler:
             return "Re: Location Information"
         return "Re: Zevenwacht Restaurant Inquiry"
 
-    def handle_incoming_email(self, email_content, from_email):
+    def find_conversation(self, thread):
+        """The conversation an email belongs to by its In-Reply-To/References headers, or None for a new thread."""
+        if thread is None:
+            return None
+        return self.chat_agent.conversation_store.resolve(thread.earlier_ids())
+
+    def compose_reply(self, email_content, from_email, thread=None, conversation_key=None):
+        """
+        Generate the reply to an incoming email. Returns the send_email arguments as a dict.
+        With the email's EmailThread, the reply continues the conversation of the thread it
+        answers (see find_conversation) and carries In-Reply-To and References headers.
+        """
+        if conversation_key is None:
+            conversation_key = self.find_conversation(thread) or self.chat_agent._get_conversation_key('email', from_email)
+        
+        # Use ChatAgent to handle the message and maintain conversation history
+        response = self.chat_agent.handle_message(
+            message=email_content,
+            channel='email',
+            user_id=from_email,
+            conversation_key=conversation_key
+        )
+        
+        # Only prepare attachments if the response mentions menus
+        attachments = []
+        if 'menu' in response.lower() or 'à la carte' in response.lower() or 'wine list' in response.lower():
+            content_lower = email_content.lower()
+            attachments = self._prepare_attachments(content_lower)
+            logger.info(f"Attaching menus based on AI response mentioning menus")
+        
+        # Depending on MENU_DELIVERY_EMAIL, menus may be sent as links instead of attachments
+        attachments, menu_links = self.menu_delivery.plan('email', attachments)
+        
+        # Format the response with attachment note and personalization
+        formatted_response = self.format_email_response(
+            response_text=response,
+            has_attachments=bool(attachments),
+            from_email=from_email,
+            menu_links=menu_links
+        )
+        
+        # Index both emails, so replies to either of them find this conversation
+        message_id = make_message_id(self.email_address)
+        self.chat_agent.conversation_store.link(conversation_key, thread.message_id if thread else None, message_id)
+        return {
+            'to_email': from_email,
+            'subject': (thread and thread.reply_subject()) or self._determine_subject(email_content),
+            'message': formatted_response,
+            'attachments': attachments,
+            'message_id': message_id,
+            **(thread.reply_headers() if thread else {})
+        }
+
+    def handle_incoming_email(self, email_content, from_email, thread=None):
         try:
             logger.info(f"Processing incoming email from {from_email}")
-            
-            # Use ChatAgent to handle the message and maintain conversation history
-            response = self.chat_agent.handle_message(
-                message=email_content,
-                channel='email',
-                user_id=from_email
-            )
-            
-            # Only prepare attachments if the response mentions menus
-            attachments = []
-            if 'menu' in response.lower() or 'à la carte' in response.lower() or 'wine list' in response.lower():
-                content_lower = email_content.lower()
-                attachments = self._prepare_attachments(content_lower)
-                logger.info(f"Attaching menus based on AI response mentioning menus")
-            
-            # Format the response with attachment note and personalization
-            formatted_response = self.format_email_response(
-                response_text=response,
-                has_attachments=bool(attachments),
-                from_email=from_email
-            )
-            subject = self._determine_subject(email_content)
+            reply = self.compose_reply(email_content, from_email, thread)
             
             # Send the response back via email with attachments
-            success = self.send_email(
-                to_email=from_email,
-                subject=subject,
-                message=formatted_response,
-                attachments=attachments
-            )
+            success = self.send_email(**reply)
 
             if success:
                 logger.info(f"Successfully processed and responded to email from {from_email}")
@@ -110,30 +180,60 @@ class EmailHandler:
             logger.error(f"Error handling incoming email: {str(e)}")
             return False
 
-    def _convert_html_to_pdf(self, html_file, pdf_file):
-        """Convert HTML file to PDF"""
+    def register_jobs(self, outbound_queue):
+        """
+        Register the email jobs: email_inbound composes a reply and queues it as email_send.
+        With a COALESCE_WINDOW_EMAIL, inbound emails are held for an email_turn job instead,
+        which answers everything the sender wrote within the window with one reply.
+        """
+        coalescer = MessageCoalescer(outbound_queue)
+
+        def process_inbound(payload, job):
+            if coalescer.enabled('email'):
+                coalescer.add(
+                    'email', payload['from_email'], payload['email_content'],
+                    job['idempotency_key'] or f"job:{job['id']}", metadata=payload.get('thread')
+                )
+                return
+            logger.info(f"Processing queued email from {payload['from_email']}")
+            reply = self.compose_reply(payload['email_content'], payload['from_email'], EmailThread.from_headers(payload.get('thread')))
+            # Keyed on the inbound job, so a retried send never composes (or sends) a second reply
+            outbound_queue.enqueue('email', 'email_send', reply, idempotency_key=f"reply:{job['idempotency_key'] or job['id']}")
+
+        def process_turn(payload, job):
+            emails = coalescer.take('email', payload['sender'], job['id'])
+            if not emails:
+                return
+            logger.info(f"Answering {len(emails)} email(s) from {payload['sender']}")
+            # The reply answers the newest email, in the conversation of the newest known thread
+            threads = [EmailThread.from_headers(item['metadata']) for item in emails if item['metadata']]
+            conversation_key = next(filter(None, (self.find_conversation(thread) for thread in reversed(threads))), None)
+            conversation_key = conversation_key or self.chat_agent._get_conversation_key('email', payload['sender'])
+            reply = self.compose_reply(coalescer.merge(emails), payload['sender'], threads[-1] if threads else None, conversation_key)
+            self.chat_agent.conversation_store.link(conversation_key, *(thread.message_id for thread in threads))
+            outbound_queue.enqueue('email', 'email_send', reply, idempotency_key=f"reply:turn:email:{emails[-1]['id']}")
+            coalescer.complete(job['id'])
+
+        def send(payload, job):
+            if not self.send_email(**payload):
+                raise RuntimeError(f"Failed to send email to {payload['to_email']}")
+
+        outbound_queue.register('email_inbound', process_inbound)
+        outbound_queue.register('email_turn', process_turn)
+        outbound_queue.register('email_send', send)
+
+    def _convert_html_to_pdf(self, html_file, pdf_file=None):
+        """Convert an HTML menu to PDF on the shared PDF worker pool (the PDF is written next to the HTML)"""
         try:
-            # Configure pdfkit with wkhtmltopdf path
-            config = pdfkit.configuration(wkhtmltopdf=r'wkhtmltopdf.exe')
-            options = {
-                'quiet': '',
-                'enable-local-file-access': None
-            }
-            
-            # Convert HTML to PDF
-            pdfkit.from_file(html_file, pdf_file, options=options, configuration=config)
-            return True
+            return self.pdf_builder.submit(html_file).result(timeout=60)
         except Exception as e:
             logger.error(f"Error converting HTML to PDF: {str(e)}")
             return False
 
     def _attach_file(self, msg, file_path, filename):
-        """Attach a file to the email message"""
+        """Attach a file to the email message (the encoded part is cached until the file changes)"""
         try:
-            with open(file_path, 'rb') as f:
-                part = MIMEApplication(f.read(), Name=filename)
-                part['Content-Disposition'] = f'attachment; filename="{filename}"'
-                msg.attach(part)
+            msg.attach(self.attachment_cache.get_part(file_path, filename))
             return True
         except Exception as e:
             logger.error(f"Error attaching file: {str(e)}")
@@ -148,11 +248,10 @@ class EmailHandler:
             if base_name in added_menus:
                 return
             
-            pdf_path = os.path.join(self.attachments_dir, f'{base_name}.pdf')
-            
-            # Only use existing PDFs
-            if os.path.exists(pdf_path):
-                logger.info(f"Adding existing PDF for {base_name}")
+            # Rebuilds the PDF first if its HTML changed since it was built
+            pdf_path = self.pdf_builder.ensure_pdf(base_name)
+            if pdf_path:
+                logger.info(f"Adding PDF for {base_name}")
                 attachments.append((f'{base_name}.pdf', pdf_path))
                 added_menus.add(base_name)
 
@@ -164,7 +263,7 @@ class EmailHandler:
 
         return attachments
 
-    def format_email_response(self, response_text, has_attachments=False, from_email=None):
+    def format_email_response(self, response_text, has_attachments=False, from_email=None, menu_links=None):
         """Format the AI response into a professional email format"""
         # Get first name from email
         name = "Schalk"
@@ -178,6 +277,9 @@ class EmailHandler:
                     # Use the first part of the name if it's split by dots
                     name = name_parts[0].capitalize()
         
+        if menu_links:
+            response_text = f"{response_text}\n\nYou can view our menus here:\n{self.menu_delivery.format_links(menu_links)}"
+        
         # Format the response
         formatted_response = f"""Dear {name},
 
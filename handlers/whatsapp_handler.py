@@ -1,12 +1,15 @@
 from services.twilio_service import TwilioService
 from services.openai_service import OpenAIService
 from services.knowledge_base import KnowledgeBase
+from services.menu_delivery import MenuDelivery
+from services.message_coalescer import register_text_jobs
 
 class WhatsAppHandler:
     def __init__(self):
         self.twilio_service = TwilioService()
         self.openai_service = OpenAIService()
         self.knowledge_base = KnowledgeBase()
+        self.menu_delivery = MenuDelivery()
 
     def handle_incoming_message(self, message_body, from_number):
         # Get product context and generate AI response
@@ -27,4 +30,24 @@ class WhatsAppHandler:
         return self.twilio_service.send_whatsapp(
             to_number=to_number,
             message=message
-        )
\ No newline at end of file
+        )
+
+    def register_jobs(self, outbound_queue):
+        """
+        Register the whatsapp jobs (whatsapp_inbound, whatsapp_turn and whatsapp_send, see
+        register_text_jobs). Replies that mention the menus carry links to them.
+        """
+        def compose_reply(message_body):
+            context = self.knowledge_base.get_product_context()
+            response = self.openai_service.generate_response(
+                message_body,
+                context,
+                'whatsapp'
+            )
+            if 'menu' in response.lower():
+                links = self.menu_delivery.links_for('whatsapp', ['a_la_carte_menu', 'wine_list', 'drinks_menu'])
+                if links:
+                    response = f"{response}\n\n{self.menu_delivery.format_links(links)}"
+            return response
+
+        register_text_jobs(outbound_queue, 'whatsapp', compose_reply, self.send_message)
@@ -0,0 +1,38 @@
+import sys
+import os
+from services.train_chat import TrainingChat
+
+def main():
+    """
+    Bulk import menu changes from a CSV, JSON or text file.
+    Usage: python import_menu.py <file> [--no-export]
+    All rows are validated first and applied in a single transaction,
+    followed by one save and (unless --no-export is given) one export.
+    """
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if not args:
+        print("Usage: python import_menu.py <file.csv|file.json|file.txt> [--no-export]")
+        return 1
+
+    file_path = args[0]
+    if not os.path.exists(file_path):
+        print(f"File not found: {file_path}")
+        return 1
+
+    extension = os.path.splitext(file_path)[1].lower().lstrip(".")
+    content_format = extension if extension in ("csv", "json") else "message"
+
+    with open(file_path, "r", encoding="utf-8-sig") as file:
+        content = file.read()
+
+    training_chat = TrainingChat()
+    summary = training_chat.bulk_import_summary(
+        content,
+        content_format=content_format,
+        export="--no-export" not in sys.argv
+    )
+    print(training_chat.bulk_importer.format_report(summary))
+    return 0 if summary["applied"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
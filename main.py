@@ -1,9 +1,19 @@
-from flask import Flask, request, render_template, jsonify, redirect, url_for
+import time
+import functools
+from flask import Flask, request, render_template, jsonify, redirect, url_for, Response, abort
+from twilio.twiml.messaging_response import MessagingResponse
 from handlers.call_handler import CallHandler
 from handlers.whatsapp_handler import WhatsAppHandler
 from handlers.sms_handler import SMSHandler
 from handlers.email_handler import EmailHandler
 from services.train_chat import TrainingChat
+from services.outbound_queue import get_outbound_queue
+from services.artifact_store import get_artifact_store
+from services.mail_text import inbound_text
+from services.email_thread import EmailThread
+from services.twilio_signature import TwilioSignature
+from services.webhook_dedup import get_webhook_dedup
+from services.menu_templates import CSS_PATH, css_version
 
 app = Flask(__name__)
 call_handler = CallHandler()
@@ -12,7 +22,69 @@ sms_handler = SMSHandler()
 email_handler = EmailHandler()
 training_chat = TrainingChat()
 
+# Replies are generated and delivered by background workers, so webhooks return immediately
+outbound_queue = get_outbound_queue()
+email_handler.register_jobs(outbound_queue)
+sms_handler.register_jobs(outbound_queue)
+whatsapp_handler.register_jobs(outbound_queue)
+outbound_queue.start(['email', 'sms', 'whatsapp'])
+twilio_signature = TwilioSignature()
+webhook_dedup = get_webhook_dedup()
+
+def twilio_webhook(view):
+    """Reject requests to a Twilio webhook that don't carry a valid Twilio signature."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not twilio_signature.is_valid(request.url, request.full_path.rstrip('?'), request.form.to_dict(), request.headers.get('X-Twilio-Signature')):
+            app.logger.warning(f"Rejected {request.path} request with an invalid Twilio signature")
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+def deduplicated(delivery_key):
+    """
+    Answer a repeated webhook delivery with the response stored for the first one. delivery_key()
+    returns the provider's id for the delivery, or None for requests that shouldn't be deduplicated.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = delivery_key() if request.method == 'POST' else None
+            if not key:
+                return view(*args, **kwargs)
+            key = f"{request.path}:{key}"
+            cached = webhook_dedup.lookup(key)
+            if cached is None and not webhook_dedup.claim(key):
+                # Another request is handling this delivery right now
+                cached = webhook_dedup.wait(key)
+                if cached is None:
+                    # Still unanswered: have the provider retry rather than handle it a second time
+                    app.logger.warning(f"Delivery {key} is still being handled; asking the provider to retry")
+                    return Response("Delivery is being processed, retry later", status=503, headers={'Retry-After': '30'}, content_type='text/plain')
+            if cached is not None:
+                app.logger.info(f"Replaying the stored response to duplicate delivery {key}")
+                status, body, content_type = cached
+                return Response(body, status=status, content_type=content_type)
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except Exception:
+                webhook_dedup.release(key)
+                raise
+            if response.status_code >= 500:
+                # Let the provider's retry be handled afresh
+                webhook_dedup.release(key)
+            else:
+                webhook_dedup.store(key, response.status_code, response.get_data(), response.content_type)
+            return response
+        return wrapper
+    return decorator
+
+artifact_store = get_artifact_store()
+MENU_CONTENT_TYPES = {'html': 'text/html; charset=utf-8', 'pdf': 'application/pdf'}
+
 @app.route('/webhook/voice', methods=['POST'])
+@twilio_webhook
+@deduplicated(lambda: request.values.get('RecordingSid') or request.values.get('CallSid'))
 def handle_call():
     if request.values.get('RecordingUrl'):
         recording_url = request.values.get('RecordingUrl')
@@ -20,18 +92,36 @@ def handle_call():
     return call_handler.handle_incoming_call()
 
 @app.route('/webhook/whatsapp', methods=['POST'])
+@twilio_webhook
+@deduplicated(lambda: request.values.get('MessageSid'))
 def handle_whatsapp():
     message_body = request.values.get('Body', '')
     from_number = request.values.get('From', '').replace('whatsapp:', '')
-    return whatsapp_handler.handle_incoming_message(message_body, from_number)
+    outbound_queue.enqueue(
+        'whatsapp',
+        'whatsapp_inbound',
+        {'message_body': message_body, 'from_number': from_number, 'received_at': time.time()},
+        idempotency_key=request.values.get('MessageSid')
+    )
+    # Empty TwiML: the reply is generated and sent through the REST API by the workers
+    return str(MessagingResponse())
 
 @app.route('/webhook/sms', methods=['POST'])
+@twilio_webhook
+@deduplicated(lambda: request.values.get('MessageSid'))
 def handle_sms():
     message_body = request.values.get('Body', '')
     from_number = request.values.get('From', '')
-    return sms_handler.handle_incoming_message(message_body, from_number)
+    outbound_queue.enqueue(
+        'sms',
+        'sms_inbound',
+        {'message_body': message_body, 'from_number': from_number, 'received_at': time.time()},
+        idempotency_key=request.values.get('MessageSid')
+    )
+    return str(MessagingResponse())
 
 @app.route('/webhook/email', methods=['GET', 'POST'])
+@deduplicated(lambda: request.form.get('message_id') or request.form.get('Message-ID'))
 def handle_email():
     if request.method == 'GET':
         # Handle Gmail's verification request
@@ -47,6 +137,8 @@ def handle_email():
         email_content = request.form.get('text', '')
         if not email_content:
             email_content = request.form.get('body', '')  # Alternative field name
+        # HTML bodies become text, and oversized bodies are capped before they reach the prompt
+        email_content = inbound_text(email_content)
         
         from_email = request.form.get('from', '')
         if not from_email:
@@ -58,21 +150,97 @@ def handle_email():
         # Log parsed email details
         app.logger.info(f"Parsed email - From: {from_email}, Subject: {subject}")
         
-        # Handle the email
-        success = email_handler.handle_incoming_email(
-            email_content=email_content,
-            from_email=from_email
+        # Queue the email; the reply is composed and sent by the email workers
+        job_id = outbound_queue.enqueue(
+            'email',
+            'email_inbound',
+            {'email_content': email_content, 'from_email': from_email, 'thread': EmailThread.from_headers(request.form).to_dict()},
+            idempotency_key=request.form.get('message_id') or request.form.get('Message-ID') or None
         )
         
-        if success:
-            return {"status": "success", "message": "Email processed successfully"}, 200
-        else:
-            return {"status": "error", "message": "Failed to process email"}, 500
+        if job_id is None:
+            return {"status": "success", "message": "Email already received"}, 200
+        return {"status": "queued", "message": "Email queued for processing", "job_id": job_id}, 202
             
     except Exception as e:
         app.logger.error(f"Error processing email: {str(e)}")
         return {"status": "error", "message": str(e)}, 500
 
+@app.route('/queue/stats', methods=['GET'])
+def queue_stats():
+    """Outbound job counts per channel and status, dead letters and receipt-to-reply latency."""
+    return jsonify(outbound_queue.stats())
+
+@app.route('/menus/<version>/menu.css', methods=['GET', 'HEAD'])
+def serve_menu_css(version):
+    """
+    The stylesheet every menu links (as menu.css?v=<hash>). A request for the current hash
+    is cached like the menus themselves; any other is served uncached.
+    """
+    with open(CSS_PATH, 'rb') as file:
+        body = file.read()
+    if request.args.get('v') == css_version():
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = 'no-cache'
+    return Response(body, status=200, headers={'Cache-Control': cache_control}, content_type='text/css; charset=utf-8')
+
+@app.route('/menus/<version>/<filename>', methods=['GET', 'HEAD'])
+def serve_menu(version, filename):
+    """
+    Serve a stored menu version. The URL never changes content, so responses carry a strong
+    ETag and an immutable one-year cache lifetime, and precompressed variants are served
+    when the client accepts them.
+    """
+    base_name, _, variant = filename.rpartition('.')
+    if variant not in MENU_CONTENT_TYPES or not base_name:
+        abort(404)
+    info = artifact_store.get_file_info(base_name, version, variant)
+    if info is None:
+        abort(404)
+    
+    accepted = request.headers.get('Accept-Encoding', '').lower()
+    path, encoding = None, None
+    for candidate in ('br', 'gzip'):
+        if candidate in accepted:
+            path = artifact_store.path(base_name, version, variant, compressed=candidate)
+            if path:
+                encoding = candidate
+                break
+    if path is None:
+        path = artifact_store.path(base_name, version, variant)
+    if path is None:
+        abort(404)
+    
+    # Each encoding is a different representation, so it gets its own strong validator
+    etag = f'"{info["sha256"][:32]}{"-" + encoding if encoding else ""}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'public, max-age=31536000, immutable',
+        'Vary': 'Accept-Encoding'
+    }
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        return Response(status=304, headers=headers)
+    
+    with open(path, 'rb') as file:
+        body = file.read()
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    if variant == 'pdf':
+        headers['Content-Disposition'] = f'inline; filename="{filename}"'
+    return Response(body, status=200, headers=headers, content_type=MENU_CONTENT_TYPES[variant])
+
+@app.route('/menus/current/<filename>', methods=['GET'])
+def serve_current_menu(filename):
+    """Stable link that redirects to the versioned URL of the current menu."""
+    base_name = filename.rpartition('.')[0]
+    version = artifact_store.current(base_name)
+    if not version:
+        abort(404)
+    response = redirect(url_for('serve_menu', version=version, filename=filename))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/', methods=['GET'])
 def index():
     """Redirect to the training interface"""
@@ -120,5 +288,61 @@ def training_interface():
             "requires_confirmation": False
         }), 500
 
+@app.route('/training/import', methods=['POST'])
+def training_import():
+    """
+    Bulk menu import for the training interface.
+    Accepts an uploaded CSV/JSON file ("file") or a JSON body with "content" and optional "format".
+    All rows are validated and applied in one transaction; returns per-row results.
+    """
+    try:
+        if 'file' in request.files:
+            upload = request.files['file']
+            content = upload.read().decode('utf-8-sig')
+            content_format = request.form.get('format')
+            if not content_format and upload.filename:
+                extension = upload.filename.rsplit('.', 1)[-1].lower()
+                content_format = extension if extension in ('csv', 'json') else None
+        else:
+            data = request.get_json() or {}
+            content = data.get('content', '')
+            content_format = data.get('format')
+
+        summary = training_chat.bulk_import_summary(content, content_format)
+        summary["report"] = training_chat.bulk_importer.format_report(summary)
+        status = 200 if summary["applied"] else 400
+        return jsonify(summary), status
+
+    except Exception as e:
+        app.logger.error(f"Error processing bulk import: {str(e)}")
+        return jsonify({"report": f"Error: {str(e)}", "applied": 0}), 500
+
+@app.route('/training/history', methods=['GET'])
+def training_history():
+    """List recorded versions of the restaurant data, newest first."""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({"versions": training_chat.history.list_versions(limit)})
+
+@app.route('/training/history/diff', methods=['GET'])
+def training_history_diff():
+    """Show the changes between two versions (?from=3&to=5; "to" defaults to the latest)."""
+    latest = training_chat.history.latest_version()
+    from_version = request.args.get('from', type=int)
+    to_version = request.args.get('to', latest["version"] if latest else 0, type=int)
+    try:
+        changes = training_chat.history.diff(from_version, to_version)
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify({"from": from_version, "to": to_version, "changes": changes})
+
+@app.route('/training/history/rollback', methods=['POST'])
+def training_history_rollback():
+    """Roll the restaurant data back to a version and republish it."""
+    data = request.get_json() or {}
+    version = data.get('version')
+    if not isinstance(version, int):
+        return jsonify({"response": "Please provide a version number."}), 400
+    return jsonify({"response": training_chat.rollback_to_version(version)})
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
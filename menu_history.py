@@ -0,0 +1,56 @@
+import sys
+from services.restaurant_history import RestaurantDataHistory
+
+USAGE = """Usage:
+    python menu_history.py list [limit]
+    python menu_history.py diff <from_version> [to_version]
+    python menu_history.py show <version>
+    python menu_history.py rollback <version>"""
+
+def main():
+    """
+    Command line access to the versioned restaurant data history.
+    Rollback restores the version into restaurant_data.json and republishes
+    the knowledge base and HTML menus through the training chat.
+    """
+    if len(sys.argv) < 2:
+        print(USAGE)
+        return 1
+
+    command = sys.argv[1].lower()
+    history = RestaurantDataHistory()
+
+    try:
+        if command == "list":
+            limit = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+            print(RestaurantDataHistory.format_versions(history.list_versions(limit)))
+
+        elif command == "diff" and len(sys.argv) > 2:
+            latest = history.latest_version()
+            from_version = int(sys.argv[2])
+            to_version = int(sys.argv[3]) if len(sys.argv) > 3 else (latest["version"] if latest else 0)
+            print(f"Changes from v{from_version} to v{to_version}:")
+            print(RestaurantDataHistory.format_diff(history.diff(from_version, to_version)))
+
+        elif command == "show" and len(sys.argv) > 2:
+            import json
+            print(json.dumps(history.get_version(int(sys.argv[2])), indent=4, ensure_ascii=False))
+
+        elif command == "rollback" and len(sys.argv) > 2:
+            # Imported here so listing and diffing don't need the OpenAI/knowledge base setup
+            from services.train_chat import TrainingChat
+            training_chat = TrainingChat()
+            print(training_chat.rollback_to_version(int(sys.argv[2])))
+
+        else:
+            print(USAGE)
+            return 1
+
+    except (KeyError, ValueError) as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
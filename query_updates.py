@@ -0,0 +1,50 @@
+import sys
+import argparse
+from services.update_log import get_update_log
+
+def main():
+    """
+    Query the structured restaurant update log.
+    Examples:
+        python query_updates.py kingklip --event price_changed
+        python query_updates.py --since 2025-03-01 --until 2025-03-31
+        python query_updates.py --import-legacy restaurant_updates.log
+    """
+    parser = argparse.ArgumentParser(description="Query the restaurant update log")
+    parser.add_argument("item", nargs="?", help="Item or special name (partial matches allowed)")
+    parser.add_argument("--event", help="Event type, e.g. price_changed, item_added, item_removed")
+    parser.add_argument("--since", help="Start date or datetime (ISO format)")
+    parser.add_argument("--until", help="End date or datetime (ISO format)")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum number of events to show")
+    parser.add_argument("--import-legacy", metavar="PATH", help="Import a free-text restaurant_updates.log first")
+    args = parser.parse_args()
+
+    update_log = get_update_log()
+
+    if args.import_legacy:
+        count = update_log.import_legacy(args.import_legacy)
+        print(f"Imported {count} events from {args.import_legacy}")
+        if not (args.item or args.event or args.since or args.until):
+            return 0
+
+    events = update_log.query(
+        item=args.item,
+        event=args.event,
+        since=args.since,
+        until=args.until,
+        limit=args.limit
+    )
+
+    if not events:
+        print("No matching events.")
+        return 0
+
+    for event in events:
+        line = f"{event['ts']}  {event['event']:<16} {event['message']}"
+        if "old_price" in event:
+            line += f"  (was {event['old_price']})"
+        print(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 import os
 import PyPDF2
 from io import BytesIO
+from services.restaurant_history import RestaurantDataHistory
 
 load_dotenv()
 
@@ -285,6 +286,11 @@ class AIMenuScraper:
             with open('restaurant_data.json', 'w', encoding='utf-8') as f:
                 json.dump(restaurant_data, f, indent=4, ensure_ascii=False)
 
+            # Record a version so a bad scrape can be rolled back
+            version = RestaurantDataHistory().snapshot(restaurant_data, f"Nightly menu scrape from {pdf_url}", source="scraper")
+            if version:
+                self.logger.info(f"Recorded restaurant data version {version}")
+
             self.logger.info("Restaurant data successfully updated")
             return True
 
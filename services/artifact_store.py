@@ -0,0 +1,264 @@
+import os
+import json
+import gzip
+import shutil
+import hashlib
+import logging
+import threading
+import contextlib
+from datetime import datetime
+from config.config import Config
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it only gzip variants are stored
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+class ArtifactStore:
+    """
+    Content-addressed store for generated menus.
+
+    Each version of a menu lives under artifacts/<menu>/<key>/, where the key is the
+    menu hash from MenuHtmlGenerator (source sections plus template version), and holds
+    the HTML, the PDF and gzip-compressed copies of both. The fixed names customers and
+    email attachments use (attachments/wine_list.html, ...) are aliases of the current
+    version, swapped in atomically. Identical inputs map to the same key, so a version
+    that already exists is promoted instead of re-rendered. index.json records every
+    version with its file hashes, and collect_garbage keeps only the newest N per menu.
+    Brotli (.br) copies are stored too when the brotli package is installed.
+
+    Other processes (convert_menus.py, one email checker per mailbox) store menus too, so
+    every change to the index re-reads it and writes it back under index.lock.
+    """
+
+    COMPRESSED_VARIANTS = ("html", "pdf")
+
+    def __init__(self, root=os.path.join("attachments", "artifacts"), aliases_dir="attachments", keep_versions=None):
+        self.root = root
+        self.aliases_dir = aliases_dir
+        self.keep_versions = keep_versions or Config.ARTIFACT_KEEP_VERSIONS
+        self.index_path = os.path.join(root, "index.json")
+        self.lock_path = os.path.join(root, "index.lock")
+        self._lock = threading.RLock()
+        self._index = None
+        self._index_mtime = None
+
+    @staticmethod
+    def menu_name(menu_file):
+        """"wine_list", "wine_list.html" and "wine_list.pdf" all name the same menu."""
+        return os.path.splitext(os.path.basename(menu_file))[0]
+
+    def _index_file_mtime(self):
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared with the other processes writing the index."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lock_path, "a+b") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load_index(self, reload=False):
+        """
+        The index, reloaded if another process (e.g. convert_menus.py) has written it since.
+        With reload it is always re-read; changes do that under _file_lock.
+        """
+        mtime = self._index_file_mtime()
+        if reload or self._index is None or mtime != self._index_mtime:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as file:
+                    self._index = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._index = {}
+            self._index_mtime = mtime
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self._index, file, indent=4)
+        os.replace(temp_path, self.index_path)
+        self._index_mtime = self._index_file_mtime()
+
+    def _menu_entry(self, menu_file):
+        return self._load_index().setdefault(self.menu_name(menu_file), {"current": None, "versions": {}})
+
+    def version_dir(self, menu_file, key):
+        return os.path.join(self.root, self.menu_name(menu_file), key)
+
+    def file_name(self, menu_file, variant):
+        return f"{self.menu_name(menu_file)}.{variant}"
+
+    def path(self, menu_file, key, variant="html", compressed=False):
+        """
+        Path of a stored file (None if this version has no such variant).
+        compressed can be True or "gzip" for the .gz copy, or "br" for the brotli copy.
+        """
+        with self._lock:
+            version = self._menu_entry(menu_file)["versions"].get(key)
+            if not version or self.file_name(menu_file, variant) not in version["files"]:
+                return None
+        path = os.path.join(self.version_dir(menu_file, key), self.file_name(menu_file, variant))
+        if compressed == "br":
+            path += ".br"
+        elif compressed:
+            path += ".gz"
+        return path if os.path.exists(path) else None
+
+    def has(self, menu_file, key, variant="html"):
+        return self.path(menu_file, key, variant) is not None
+
+    def get_file_info(self, menu_file, key, variant="html"):
+        """The recorded sha256 and size of a stored file, or None."""
+        with self._lock:
+            version = self._menu_entry(menu_file)["versions"].get(key)
+            info = version["files"].get(self.file_name(menu_file, variant)) if version else None
+            return dict(info) if info else None
+
+    def find_version(self, menu_file, variant, sha256):
+        """The key of the version whose variant has this content hash (e.g. the version an HTML alias came from)."""
+        with self._lock:
+            for key, version in self._menu_entry(menu_file)["versions"].items():
+                info = version["files"].get(self.file_name(menu_file, variant))
+                if info and info["sha256"] == sha256:
+                    return key
+        return None
+
+    @staticmethod
+    def _write_atomic(path, content):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(content)
+        os.replace(temp_path, path)
+
+    def put(self, menu_file, key, content, variant="html"):
+        """Store one variant of a version (bytes or str) with its gzip copy. Returns the stored path."""
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        directory = self.version_dir(menu_file, key)
+        path = os.path.join(directory, self.file_name(menu_file, variant))
+        # mtime=0 keeps the compressed bytes identical for identical content
+        gzipped = gzip.compress(content, compresslevel=9, mtime=0) if variant in self.COMPRESSED_VARIANTS else None
+        brotlied = brotli.compress(content, quality=11) if gzipped is not None and brotli is not None else None
+
+        # The files are written under the lock too, so collect_garbage can't remove the directory in between
+        with self._lock, self._file_lock():
+            self._load_index(reload=True)
+            os.makedirs(directory, exist_ok=True)
+            self._write_atomic(path, content)
+            if gzipped is not None:
+                self._write_atomic(f"{path}.gz", gzipped)
+            if brotlied is not None:
+                self._write_atomic(f"{path}.br", brotlied)
+            versions = self._menu_entry(menu_file)["versions"]
+            version = versions.setdefault(key, {"created_at": datetime.now().isoformat(timespec="seconds"), "files": {}})
+            version["files"][self.file_name(menu_file, variant)] = {
+                "sha256": hashlib.sha256(content).hexdigest(),
+                "size": len(content)
+            }
+            self._save_index()
+        return path
+
+    def put_file(self, menu_file, key, source_path, variant="pdf"):
+        with open(source_path, "rb") as file:
+            return self.put(menu_file, key, file.read(), variant)
+
+    def current(self, menu_file):
+        """Key of the version the aliases currently point at."""
+        with self._lock:
+            return self._menu_entry(menu_file)["current"]
+
+    @staticmethod
+    def _ordered_versions(entry):
+        """Version keys, current first and then by when they were last made current or created."""
+        versions = entry["versions"]
+        return sorted(
+            versions,
+            key=lambda key: (key == entry["current"], versions[key].get("promoted_at") or versions[key]["created_at"]),
+            reverse=True
+        )
+
+    def versions(self, menu_file):
+        """Version keys of a menu, newest first."""
+        with self._lock:
+            return self._ordered_versions(self._menu_entry(menu_file))
+
+    def update_alias(self, menu_file, key, variant):
+        """Point attachments/<menu>.<variant> at a stored version. Readers see the old or new file, never a partial one."""
+        source = self.path(menu_file, key, variant)
+        if source is None:
+            return None
+        alias_path = os.path.join(self.aliases_dir, self.file_name(menu_file, variant))
+        temp_path = f"{alias_path}.{os.getpid()}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, alias_path)
+        return alias_path
+
+    def promote(self, menu_file, key):
+        """Make a stored version current and swap the HTML alias to it."""
+        with self._lock, self._file_lock():
+            self._load_index(reload=True)
+            entry = self._menu_entry(menu_file)
+            if key not in entry["versions"]:
+                raise KeyError(f"Unknown version {key} of {self.menu_name(menu_file)}")
+            self.update_alias(menu_file, key, "html")
+            entry["current"] = key
+            entry["versions"][key]["promoted_at"] = datetime.now().isoformat(timespec="seconds")
+            self._save_index()
+
+    def collect_garbage(self, keep=None):
+        """Delete all but the newest keep versions of each menu (the current version is always kept). Returns the number removed."""
+        keep = keep or self.keep_versions
+        removed = 0
+        with self._lock, self._file_lock():
+            for name, entry in self._load_index(reload=True).items():
+                for key in self._ordered_versions(entry)[keep:]:
+                    shutil.rmtree(os.path.join(self.root, name, key), ignore_errors=True)
+                    del entry["versions"][key]
+                    removed += 1
+            if removed:
+                self._save_index()
+        if removed:
+            logger.info(f"Removed {removed} old menu versions")
+        return removed
+
+_shared_stores = {}
+_shared_lock = threading.Lock()
+
+def get_artifact_store(root=os.path.join("attachments", "artifacts"), aliases_dir="attachments"):
+    """The process-wide store for a directory, so the HTML generator and PDF builder share one index."""
+    with _shared_lock:
+        key = (os.path.abspath(root), os.path.abspath(aliases_dir))
+        if key not in _shared_stores:
+            _shared_stores[key] = ArtifactStore(root, aliases_dir)
+        return _shared_stores[key]
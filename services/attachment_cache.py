@@ -0,0 +1,106 @@
+import os
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from email.mime.application import MIMEApplication
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class AttachmentCache:
+    """
+    LRU cache of base64-encoded MIME attachment parts, bounded by the size of the encoded payloads.
+
+    Entries are keyed by path, modification time and size, so a regenerated menu is a new
+    key and the entry for its old version is dropped as soon as the new one is cached.
+    A hit returns a copy of the cached part that shares the encoded payload string, so
+    attaching a menu costs a stat() and a few header objects rather than reading the file
+    and base64-encoding it again.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else Config.ATTACHMENT_CACHE_BYTES
+        self._parts = OrderedDict()
+        self._keys_by_path = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _copy(part):
+        # Headers are per message (the caller may add to them); the encoded payload is an immutable str
+        part_copy = copy.copy(part)
+        part_copy._headers = list(part._headers)
+        return part_copy
+
+    def _build(self, path, filename):
+        with open(path, 'rb') as f:
+            part = MIMEApplication(f.read(), Name=filename)
+        part['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return part
+
+    def _evict(self, key):
+        part = self._parts.pop(key)
+        self._size -= len(part.get_payload())
+        if self._keys_by_path.get(key[0]) == key:
+            del self._keys_by_path[key[0]]
+
+    def get_part(self, path, filename=None):
+        """Return a MIME part for the file, from the cache when the file is unchanged."""
+        filename = filename or os.path.basename(path)
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, filename)
+
+        with self._lock:
+            part = self._parts.get(key)
+            if part is not None:
+                self._parts.move_to_end(key)
+                self.hits += 1
+                return self._copy(part)
+            self.misses += 1
+
+        part = self._build(path, filename)
+        size = len(part.get_payload())
+        if size > self.max_bytes:
+            return part
+
+        with self._lock:
+            # Forget the previous version of this file
+            old_key = self._keys_by_path.get(key[0])
+            if old_key is not None and old_key != key and old_key in self._parts:
+                self._evict(old_key)
+            if key not in self._parts:
+                self._parts[key] = part
+                self._keys_by_path[key[0]] = key
+                self._size += size
+            while self._size > self.max_bytes:
+                self._evict(next(iter(self._parts)))
+        return self._copy(part)
+
+    def invalidate(self, path=None):
+        """Drop the cached parts for a path, or everything."""
+        with self._lock:
+            if path is None:
+                self._parts.clear()
+                self._keys_by_path.clear()
+                self._size = 0
+                return
+            for key in [key for key in self._parts if key[0] == os.path.abspath(path)]:
+                self._evict(key)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._parts), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_attachment_cache():
+    """The process-wide attachment cache."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = AttachmentCache()
+        return _shared_cache
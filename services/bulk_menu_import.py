@@ -0,0 +1,306 @@
+import csv
+import io
+import json
+import re
+import copy
+import time
+import logging
+from services.menu_index import MenuItemIndex
+
+logger = logging.getLogger(__name__)
+
+class BulkMenuImporter:
+    """
+    Applies a batch of menu changes to the training chat's restaurant data in one go.
+    Rows can come from CSV, JSON or a multi-line training message. All rows are
+    validated up front and, if every row is valid, applied as a single transaction
+    followed by one save/regenerate/re-index export. Each row is validated against the
+    menu as the rows before it leave it, so an update after a remove or a rename of the
+    same item is reported as invalid rather than silently doing nothing.
+    """
+
+    FIELDS = ["action", "menu_type", "name", "price", "price_type", "description", "new_name"]
+    ACTIONS = ("add", "update", "remove")
+
+    # "[add|update|remove] [SECTION /] name [= | : | , | - | to | at] [R]price [glass|bottle]"
+    MESSAGE_LINE_PATTERN = re.compile(
+        r'^(?:(?P<action>add|update|remove)\s+)?'
+        r'(?:(?P<menu_type>[^/]+?)\s*/\s*)?'
+        r'(?P<name>.+?)'
+        r'(?:(?:(?:\s*(?:=|:|,)|\s+(?:-|to|at))\s*R?\s*|\s+R\s*)(?P<price>\d+(?:[.,]\d{1,2})?|market(?: price)?)'
+        r'(?:\s+(?:per\s+|a\s+)?(?P<price_type>glass|bottle))?)?\s*$',
+        re.IGNORECASE
+    )
+
+    def __init__(self, training_chat):
+        self.training_chat = training_chat
+
+    def parse(self, content, content_format=None):
+        """Parse CSV, JSON or message content into a list of row dictionaries."""
+        content = content.strip()
+        if content_format is None:
+            if content.startswith("[") or content.startswith("{"):
+                content_format = "json"
+            elif "," in content.split("\n", 1)[0] and "name" in content.split("\n", 1)[0].lower():
+                content_format = "csv"
+            else:
+                content_format = "message"
+
+        if content_format == "json":
+            return self.parse_json(content)
+        if content_format == "csv":
+            return self.parse_csv(content)
+        return self.parse_message(content)
+
+    def parse_csv(self, content):
+        """Parse CSV content with a header row using the FIELDS column names."""
+        reader = csv.DictReader(io.StringIO(content))
+        rows = []
+        for record in reader:
+            rows.append({
+                key.strip().lower(): (value.strip() if isinstance(value, str) else value)
+                for key, value in record.items() if key
+            })
+        return rows
+
+    def parse_json(self, content):
+        """
+        Parse a JSON list of rows, or an object holding the rows under "items". Anything
+        else (a bare string or number, or a row that isn't an object) becomes a row with
+        an error, so it is reported like any other invalid row.
+        """
+        data = json.loads(content)
+        if isinstance(data, dict):
+            data = data.get("items", data.get("rows", []))
+        if not isinstance(data, list):
+            return [{"_error": 'Expected a list of rows or an object with "items"'}]
+        return [row if isinstance(row, dict) else {"_error": "Row is not an object"} for row in data]
+
+    def parse_message(self, content):
+        """Parse a multi-line training message, one change per line."""
+        rows = []
+        for line in content.splitlines():
+            line = line.strip().lstrip("-*•").strip()
+            if not line:
+                continue
+            match = self.MESSAGE_LINE_PATTERN.match(line)
+            if not match:
+                rows.append({"name": line, "_error": "Could not understand this line"})
+                continue
+            row = {key: value.strip() for key, value in match.groupdict().items() if value}
+            rows.append(row)
+        return rows
+
+    def _parse_price(self, value):
+        """Convert a price cell to a number, None for market price, or raise ValueError."""
+        if value is None or value == "":
+            raise ValueError("missing price")
+        if isinstance(value, (int, float)):
+            return value
+        text = str(value).strip().lstrip("Rr").strip().replace(",", ".")
+        if text.lower() in ("market", "market price", "sq"):
+            return None
+        price = float(text)
+        if price < 0:
+            raise ValueError("price cannot be negative")
+        return int(price) if price.is_integer() else price
+
+    def _normalize_row(self, row):
+        """Return a cleaned copy of a row with defaults applied."""
+        normalized = {field: row.get(field) for field in self.FIELDS if row.get(field) not in (None, "")}
+        normalized["action"] = str(normalized.get("action", "update")).lower()
+        if "menu_type" in normalized:
+            normalized["menu_type"] = str(normalized["menu_type"]).upper()
+        if "price_type" in normalized:
+            normalized["price_type"] = str(normalized["price_type"]).lower()
+        if "price" in normalized:
+            normalized["price"] = self._parse_price(normalized["price"])
+        return normalized
+
+    def _follow(self, item_index, row):
+        """Make the change a valid row makes to the item names (add, remove, rename) in item_index."""
+        name, menu_type = row["name"], row.get("menu_type")
+        if row["action"] == "add":
+            section = item_index.get_section(menu_type) or item_index.add_section(menu_type)
+            item_index.add_item(section, {"name": name})
+            return
+        locations = (menu_type and item_index.find(name, menu_type)) or item_index.find(name)
+        if row["action"] == "remove":
+            # Like TrainingChat.update_menu_item: every copy in the first section holding it
+            section = locations[0].section
+            for location in sorted(locations, key=lambda location: location.position, reverse=True):
+                if location.section is section:
+                    item_index.remove_item(location)
+        elif "new_name" in row:
+            item_index.rename_item(locations[0], row["new_name"])
+
+    def validate_rows(self, rows):
+        """
+        Validate every row against the menu as the rows before it leave it.
+        Returns (normalized_rows, results).
+        """
+        # Names only: the valid rows' adds, removes and renames are followed on a copy
+        item_index = MenuItemIndex(copy.deepcopy(self.training_chat.item_index.menu_sections))
+        seen = set()
+        normalized_rows = []
+        results = []
+
+        for index, row in enumerate(rows, start=1):
+            result = {"row": index, "name": row.get("name", ""), "action": row.get("action", "update"), "status": "valid", "message": ""}
+            try:
+                if row.get("_error"):
+                    raise ValueError(row["_error"])
+                normalized = self._normalize_row(row)
+                name = normalized.get("name", "")
+                action = normalized["action"]
+                result["action"] = action
+                if not name:
+                    raise ValueError("Item name is required")
+                if action not in self.ACTIONS:
+                    raise ValueError(f"Unknown action '{action}'")
+
+                key = (action, name.lower(), normalized.get("price_type", ""))
+                if key in seen:
+                    raise ValueError("Duplicate row in this import")
+                seen.add(key)
+
+                menu_type = normalized.get("menu_type")
+                if action == "add":
+                    if not menu_type:
+                        raise ValueError("menu_type is required when adding an item")
+                    if item_index.get_subsection(menu_type) is not None and item_index.get_section(menu_type) is None:
+                        # apply_update only adds to top-level sections and would create a new one
+                        raise ValueError(f"{menu_type} is a subsection; adding items to subsections is not supported")
+                    if item_index.contains(name, menu_type):
+                        raise ValueError(f"'{name}' already exists in {menu_type}")
+                else:
+                    if not item_index.contains(name):
+                        if self.training_chat.item_index.contains(name):
+                            raise ValueError(f"'{name}' is removed or renamed by an earlier row")
+                        raise ValueError(f"'{name}' was not found on the menu")
+                    if menu_type and not item_index.contains(name, menu_type):
+                        raise ValueError(f"'{name}' was not found in {menu_type}")
+                if action == "update" and not any(field in normalized for field in ("price", "description", "new_name")):
+                    raise ValueError("Nothing to update (expected price, description or new_name)")
+                if action == "update" and "price" not in normalized and "price_type" in normalized:
+                    raise ValueError("price_type given without a price")
+
+                self._follow(item_index, normalized)
+                normalized_rows.append(normalized)
+            except ValueError as e:
+                result["status"] = "invalid"
+                result["message"] = str(e)
+                normalized_rows.append(None)
+            results.append(result)
+
+        return normalized_rows, results
+
+    def _row_to_analysis(self, row):
+        """Convert a normalized row into the intent structure used by TrainingChat.apply_update."""
+        details = {key: value for key, value in row.items() if key != "action"}
+        only_price = row["action"] == "update" and not ("description" in row or "new_name" in row)
+        return {
+            "intent": "price" if only_price else "menu_item",
+            "action": row["action"],
+            "details": details
+        }
+
+    def _apply_row(self, row):
+        """
+        Apply one row with TrainingChat.apply_update, which does nothing when the item isn't
+        there. Raises ValueError if the row had no effect, so the batch is rolled back.
+        """
+        item_index = self.training_chat.item_index
+        if row["action"] != "add" and not item_index.contains(row["name"]):
+            raise ValueError(f"'{row['name']}' is no longer on the menu")
+        self.training_chat.apply_update(self._row_to_analysis(row))
+        if row["action"] == "add" and not item_index.contains(row["name"], row["menu_type"]):
+            raise ValueError(f"'{row['name']}' was not added to {row['menu_type']}")
+
+    def import_rows(self, rows, export=True):
+        """
+        Validate and apply rows as one transaction.
+        Nothing is applied unless every row is valid. Returns a summary with per-row results.
+        """
+        start = time.perf_counter()
+        normalized_rows, results = self.validate_rows(rows)
+        invalid = [result for result in results if result["status"] == "invalid"]
+
+        summary = {
+            "total": len(rows),
+            "applied": 0,
+            "failed": len(invalid),
+            "exported": False,
+            "results": results
+        }
+
+        if not rows or invalid:
+            for result in results:
+                if result["status"] == "valid":
+                    result["status"] = "skipped"
+                    result["message"] = "Not applied because other rows are invalid"
+            summary["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            return summary
+
+        restaurant_data = self.training_chat.restaurant_data
+        snapshot = copy.deepcopy(restaurant_data)
+        current_row = None
+        try:
+            for current_row, (row, result) in enumerate(zip(normalized_rows, results)):
+                self._apply_row(row)
+                result["status"] = "applied"
+        except Exception as e:
+            # Roll back the whole batch
+            self.training_chat.restore_restaurant_data(snapshot)
+            logger.error(f"Bulk import failed on row {current_row + 1}: {str(e)}")
+            for result in results:
+                result["status"] = "rolled_back"
+            results[current_row]["status"] = "error"
+            results[current_row]["message"] = str(e)
+            summary["failed"] = 1
+            summary["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            return summary
+
+        summary["applied"] = len(results)
+        self.training_chat.log_update(f"Bulk import applied {len(results)} menu changes", event="bulk_import", rows=len(results))
+        summary["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        change_description = f"Bulk import of {len(results)} menu changes"
+        if export:
+            self.training_chat.export_restaurant_data(change_description)
+            summary["exported"] = True
+        else:
+            self.training_chat.save_restaurant_data(change_description)
+
+        return summary
+
+    def import_content(self, content, content_format=None, export=True):
+        """Parse content and import it. Returns the import summary."""
+        try:
+            rows = self.parse(content, content_format)
+        except (ValueError, csv.Error) as e:
+            return {
+                "total": 0,
+                "applied": 0,
+                "failed": 1,
+                "exported": False,
+                "elapsed_ms": 0,
+                "results": [{"row": 0, "name": "", "action": "", "status": "invalid", "message": f"Could not parse import: {str(e)}"}]
+            }
+        return self.import_rows(rows, export=export)
+
+    @staticmethod
+    def format_report(summary):
+        """Format an import summary as a short text report for the training chat."""
+        if summary["applied"]:
+            lines = [f"Applied {summary['applied']} of {summary['total']} changes in {summary['elapsed_ms']} ms."]
+            if summary["exported"]:
+                lines.append("Menus regenerated and knowledge base updated.")
+        else:
+            lines = [f"No changes were made: {summary['failed']} of {summary['total']} rows have problems."]
+        for result in summary["results"]:
+            line = f"Row {result['row']}: {result['action']} {result['name']} - {result['status']}"
+            if result["message"]:
+                line += f" ({result['message']})"
+            lines.append(line)
+        return "\n".join(lines)
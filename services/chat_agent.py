@@ -1,7 +1,7 @@
 from .openai_service import OpenAIService
 from .knowledge_base import KnowledgeBase
 from .menu_validator import MenuValidator
-from datetime import datetime
+from .conversation_store import get_conversation_store
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -12,20 +12,15 @@ class ChatAgent:
         self.openai_service = OpenAIService()
         self.knowledge_base = KnowledgeBase()
         self.menu_validator = MenuValidator()
-        self.conversation_history = {}
+        # Shared with the other processes (web app, mailbox workers) through SQLite
+        self.conversation_store = get_conversation_store()
         self.greeting_message = "Good day, I'm Joline from Zevenwacht Restaurant. How may I assist you today?"
 
     def _get_conversation_key(self, channel, user_id):
         return f"{channel}:{user_id}"
 
     def _get_conversation_context(self, conversation_key, channel):
-        if conversation_key not in self.conversation_history:
-            self.conversation_history[conversation_key] = [{
-                'role': 'assistant',
-                'content': self.greeting_message,
-                'timestamp': datetime.now().isoformat(),
-                'channel': channel
-            }]
+        self.conversation_store.start(conversation_key, self.greeting_message, channel)
         
         # Get menu and product context
         context = self.knowledge_base.get_product_context()
@@ -33,47 +28,39 @@ class ChatAgent:
         context = f"{context}\n\nCurrent Menu:\n{menu_context}"
         
         # Add conversation history context with channel awareness
-        history = self.conversation_history[conversation_key]
+        history = self.conversation_store.history(conversation_key, limit=5)
         if history:
             context += "\n\nRecent conversation history:\n"
-            for msg in history[-5:]:
+            for msg in history:
                 context += f"[{msg.get('channel', 'unknown')}] {msg['role']}: {msg['content']}\n"
         
         return context
 
-    def handle_message(self, message, channel, user_id):
-        """Handle incoming messages from any channel (SMS, WhatsApp, Voice, Email)"""
+    def handle_message(self, message, channel, user_id, conversation_key=None):
+        """
+        Handle incoming messages from any channel (SMS, WhatsApp, Voice, Email).
+        The conversation is channel:user_id unless a conversation_key is given (e.g. the
+        email thread the message replies to).
+        """
         try:
-            conversation_key = self._get_conversation_key(channel, user_id)
+            conversation_key = conversation_key or self._get_conversation_key(channel, user_id)
             logger.info(f"Handling {channel} message from {user_id}")
             
+            # Get context (this opens a new conversation with the greeting) and the earlier history;
+            # the message itself is passed to OpenAI separately
+            context = self._get_conversation_context(conversation_key, channel)
+            
             # Add user message to history with channel info
-            self.conversation_history.setdefault(conversation_key, [{
-                'role': 'assistant',
-                'content': self.greeting_message,
-                'timestamp': datetime.now().isoformat(),
-                'channel': channel
-            }]).append({
-                'role': 'user',
-                'content': message,
-                'timestamp': datetime.now().isoformat(),
-                'channel': channel
-            })
+            self.conversation_store.append(conversation_key, 'user', message, channel)
             
-            # Get context and generate response with OpenAI
-            context = self._get_conversation_context(conversation_key, channel)
+            # Generate response with OpenAI
             response = self.openai_service.generate_response(message, context, channel)
             
             # Validate response against menu items
             validated_response = self.menu_validator.validate_and_correct_response(response)
             
             # Add agent response to history
-            self.conversation_history[conversation_key].append({
-                'role': 'assistant',
-                'content': validated_response,
-                'timestamp': datetime.now().isoformat(),
-                'channel': channel
-            })
+            self.conversation_store.append(conversation_key, 'assistant', validated_response, channel)
             
             logger.info(f"Successfully processed {channel} message from {user_id}")
             return validated_response
@@ -85,10 +72,9 @@ class ChatAgent:
     def get_conversation_history(self, channel, user_id):
         """Retrieve the conversation history for a specific channel and user"""
         conversation_key = self._get_conversation_key(channel, user_id)
-        return self.conversation_history.get(conversation_key, [])
+        return self.conversation_store.history(conversation_key)
 
     def clear_conversation_history(self, channel, user_id):
         """Clear the conversation history for a specific channel and user"""
         conversation_key = self._get_conversation_key(channel, user_id)
-        if conversation_key in self.conversation_history:
-            del self.conversation_history[conversation_key]
\ No newline at end of file
+        self.conversation_store.clear(conversation_key)
\ No newline at end of file
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class ConversationStore:
+    """
+    SQLite-backed conversation history shared by every process that talks to customers.
+
+    The web app and each mailbox worker started by email_supervisor.py run in their own
+    process, so history kept in a dict would be split between them (and lost on restart).
+    Messages are stored one row each under a conversation key such as "email:guest@example.com";
+    WAL mode lets the processes read while one of them writes.
+
+    Emails are also indexed by Message-ID: every email received and every reply sent is
+    linked to its conversation, so a reply (even from a colleague the thread was forwarded
+    to) is resolved to the existing conversation through its In-Reply-To or References
+    header with a primary key lookup.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_key TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            channel TEXT,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages (conversation_key, id);
+        CREATE TABLE IF NOT EXISTS message_ids (
+            message_id TEXT PRIMARY KEY,
+            conversation_key TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Config.CONVERSATION_DB
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat()
+
+    def start(self, conversation_key, greeting, channel):
+        """Open a conversation with the greeting message unless it already has messages."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            exists = conn.execute("SELECT 1 FROM messages WHERE conversation_key = ? LIMIT 1", (conversation_key,)).fetchone()
+            if not exists:
+                conn.execute(
+                    "INSERT INTO messages (conversation_key, role, content, channel, timestamp) VALUES (?, 'assistant', ?, ?, ?)",
+                    (conversation_key, greeting, channel, self._now())
+                )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def append(self, conversation_key, role, content, channel):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO messages (conversation_key, role, content, channel, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (conversation_key, role, content, channel, self._now())
+            )
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def history(self, conversation_key, limit=None):
+        """The messages of a conversation, oldest first; with limit, only the last `limit` messages."""
+        conn = self._connect()
+        try:
+            if limit:
+                rows = conn.execute(
+                    "SELECT role, content, channel, timestamp FROM messages WHERE conversation_key = ? ORDER BY id DESC LIMIT ?",
+                    (conversation_key, limit)
+                ).fetchall()
+                rows.reverse()
+            else:
+                rows = conn.execute(
+                    "SELECT role, content, channel, timestamp FROM messages WHERE conversation_key = ? ORDER BY id",
+                    (conversation_key,)
+                ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def clear(self, conversation_key):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM messages WHERE conversation_key = ?", (conversation_key,))
+            conn.execute("DELETE FROM message_ids WHERE conversation_key = ?", (conversation_key,))
+        finally:
+            conn.close()
+
+    def link(self, conversation_key, *message_ids):
+        """Index email Message-IDs under a conversation. Ids that are already linked keep their conversation."""
+        rows = [(message_id, conversation_key, self._now()) for message_id in message_ids if message_id]
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany("INSERT OR IGNORE INTO message_ids (message_id, conversation_key, timestamp) VALUES (?, ?, ?)", rows)
+        finally:
+            conn.close()
+
+    def resolve(self, message_ids):
+        """The conversation of the first of message_ids that is linked to one, or None."""
+        message_ids = [message_id for message_id in message_ids if message_id]
+        if not message_ids:
+            return None
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT message_id, conversation_key FROM message_ids WHERE message_id IN ({', '.join('?' * len(message_ids))})",
+                message_ids
+            ).fetchall()
+        finally:
+            conn.close()
+        found = {row["message_id"]: row["conversation_key"] for row in rows}
+        return next((found[message_id] for message_id in message_ids if message_id in found), None)
+
+    def purge(self, older_than_days=None):
+        """Delete messages (and Message-ID links) older than the retention period. Returns the number of messages removed."""
+        days = older_than_days if older_than_days is not None else Config.CONVERSATION_RETENTION_DAYS
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM message_ids WHERE timestamp < ?", (cutoff,))
+            return conn.execute("DELETE FROM messages WHERE timestamp < ?", (cutoff,)).rowcount
+        finally:
+            conn.close()
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+def get_conversation_store():
+    """The process-wide conversation store."""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = ConversationStore()
+            removed = _shared_store.purge()
+            if removed:
+                logger.info(f"Purged {removed} conversation messages older than {Config.CONVERSATION_RETENTION_DAYS} days")
+        return _shared_store
@@ -0,0 +1,67 @@
+import re
+import email.utils
+from collections import namedtuple
+
+MESSAGE_ID = re.compile(r'<[^<>\s]+>')
+
+def message_ids(value):
+    """The message ids (with their angle brackets) in a Message-ID, In-Reply-To or References value."""
+    return MESSAGE_ID.findall(str(value or ""))
+
+def make_message_id(address=None):
+    """A new Message-ID for an outgoing email, in the domain of the sending address."""
+    domain = address.rpartition("@")[2] if address and "@" in address else None
+    return email.utils.make_msgid(domain=domain)
+
+class EmailThread(namedtuple("EmailThread", ["message_id", "in_reply_to", "references", "subject"])):
+    """
+    The threading headers of an inbound email: its own Message-ID, the ids it replies to
+    (In-Reply-To) and the ids of the thread before it (References, oldest first).
+    """
+
+    @classmethod
+    def from_headers(cls, headers):
+        """Build from an email.message.Message, or a dict such as a queued job's payload."""
+        if not headers:
+            return None
+        ids = message_ids(headers.get("Message-ID") or headers.get("message_id"))
+        return cls(
+            message_id=ids[0] if ids else None,
+            in_reply_to=message_ids(headers.get("In-Reply-To") or headers.get("in_reply_to")),
+            references=message_ids(headers.get("References") or headers.get("references")),
+            subject=str(headers.get("Subject") or headers.get("subject") or "")
+        )
+
+    def to_dict(self):
+        return {
+            "message_id": self.message_id,
+            "in_reply_to": " ".join(self.in_reply_to),
+            "references": " ".join(self.references),
+            "subject": self.subject
+        }
+
+    def earlier_ids(self):
+        """The ids of the earlier messages this email answers, most recent first."""
+        ids = list(self.in_reply_to)
+        ids.extend(message_id for message_id in reversed(self.references) if message_id not in ids)
+        return ids
+
+    def reply_headers(self):
+        """In-Reply-To and References for a reply to this email (RFC 5322 section 3.6.4)."""
+        if not self.message_id:
+            return {}
+        references = self.references or self.in_reply_to[:1]
+        if len(references) > 20:
+            # Long threads keep the first message and the most recent ones
+            references = references[:1] + references[-19:]
+        return {
+            "in_reply_to": self.message_id,
+            "references": " ".join(references + [self.message_id])
+        }
+
+    def reply_subject(self):
+        """The subject of a reply, so mail clients file it under the same conversation."""
+        subject = self.subject.strip()
+        if not subject:
+            return None
+        return subject if subject.lower().startswith("re:") else f"Re: {subject}"
@@ -0,0 +1,224 @@
+import re
+import email
+import quopri
+import logging
+import binascii
+import itertools
+from collections import namedtuple
+from config.config import Config
+from services.mail_text import decode_bytes, message_text
+
+logger = logging.getLogger(__name__)
+
+TextPart = namedtuple("TextPart", ["section", "subtype", "charset", "encoding", "size"])
+
+_OPEN = object()
+_CLOSE = object()
+_TOKEN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"\[]+(?:\[[^\]]*\][^\s()"]*)?))')
+_LITERAL_MARKER = re.compile(rb'\{\d+\}\s*$')
+_SECTION = re.compile(r'^BODY\[([^\]]*)\]')
+
+def _scan(text):
+    position = 0
+    while True:
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            return
+        position = match.end()
+        if match.group(1):
+            yield _OPEN
+        elif match.group(2):
+            yield _CLOSE
+        elif match.group(3) is not None:
+            yield re.sub(rb'\\(.)', rb'\1', match.group(3)).decode("utf-8", errors="replace")
+        else:
+            atom = match.group(4).decode("utf-8", errors="replace")
+            yield None if atom.upper() == "NIL" else atom
+
+def _tokens(data):
+    """Tokens of an imaplib FETCH response, where literals arrive as (prefix, bytes) tuples."""
+    for item in data:
+        if isinstance(item, tuple):
+            yield from _scan(_LITERAL_MARKER.sub(b"", item[0]))
+            yield item[1]
+        elif isinstance(item, bytes):
+            yield from _scan(item)
+
+def parse_fetch_response(data):
+    """
+    Parse the data of a FETCH response into {uid: {item name: value}}. Lists become Python
+    lists, NIL becomes None, literals stay bytes and other strings are decoded.
+    """
+    root = []
+    stack = [root]
+    for token in _tokens(data):
+        if token is _OPEN:
+            stack[-1].append([])
+            stack.append(stack[-1][-1])
+        elif token is _CLOSE:
+            if len(stack) > 1:
+                stack.pop()
+        else:
+            stack[-1].append(token)
+
+    messages = {}
+    for value in root:
+        if not isinstance(value, list):
+            continue
+        items = {str(key).upper(): item for key, item in zip(value[::2], value[1::2])}
+        if "UID" in items:
+            messages.setdefault(int(items.pop("UID")), {}).update(items)
+    return messages
+
+def _str(value):
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+def text_parts(structure, section="", is_body=True):
+    """
+    The text/plain and text/html parts of a parsed BODYSTRUCTURE with their part numbers,
+    in message order. Parts marked as attachments are skipped, and attached messages
+    (message/rfc822) are searched like the message itself.
+    """
+    if structure and isinstance(structure[0], list):
+        parts = []
+        children = itertools.takewhile(lambda child: isinstance(child, list), structure)
+        for number, child in enumerate(children, 1):
+            parts.extend(text_parts(child, f"{section}.{number}" if section else str(number), is_body=False))
+        return parts
+
+    if is_body:
+        section = f"{section}.1" if section else "1"
+    media_type = (_str(structure[0]) or "").lower()
+    subtype = (_str(structure[1]) or "").lower()
+
+    if media_type == "message" and subtype == "rfc822" and len(structure) > 8 and isinstance(structure[8], list):
+        return text_parts(structure[8], section, is_body=True)
+    if media_type != "text" or subtype not in ("plain", "html"):
+        return []
+
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and (_str(disposition[0]) or "").lower() == "attachment":
+        return []
+
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = None
+    for key, value in zip(params[::2], params[1::2]):
+        if (_str(key) or "").lower() == "charset":
+            charset = _str(value)
+    try:
+        size = int(structure[6])
+    except (TypeError, ValueError, IndexError):
+        size = 0
+    return [TextPart(section, subtype, charset, (_str(structure[5]) or "7bit").lower(), size)]
+
+class FetchedMessage:
+    """The headers and (possibly truncated) text parts of one message fetched by MessageFetcher."""
+
+    def __init__(self, uid, headers, parts):
+        self.uid = uid
+        self.headers = headers
+        self.parts = parts
+        self.bodies = {}
+
+    @property
+    def truncated(self):
+        return any(len(self.bodies.get(part.section, b"")) < part.size for part in self.parts)
+
+    def _decode(self, part):
+        body = self.bodies.get(part.section, b"")
+        if part.encoding == "base64":
+            # A capped fetch can end mid-quantum
+            body = re.sub(rb'[^A-Za-z0-9+/=]', b'', body)
+            body = body[:len(body) - len(body) % 4]
+            try:
+                body = binascii.a2b_base64(body)
+            except binascii.Error:
+                body = b""
+        elif part.encoding == "quoted-printable":
+            body = quopri.decodestring(body)
+        return decode_bytes(body, part.charset)
+
+    def text(self):
+        """
+        The message text: its text/plain parts, or its HTML converted to text when it has
+        none, capped at INBOUND_TEXT_MAX_CHARS.
+        """
+        plain = [self._decode(part) for part in self.parts if part.subtype == "plain"]
+        if any(text.strip() for text in plain):
+            return message_text(plain, [])
+        return message_text([], [self._decode(part) for part in self.parts if part.subtype == "html"])
+
+class MessageFetcher:
+    """
+    Fetches new messages without downloading their attachments.
+
+    For each batch of UIDs one UID FETCH asks for the reply-relevant headers and the
+    BODYSTRUCTURE of every message. The text/plain and text/html parts found in the
+    structures are then fetched with BODY.PEEK[part]<0.max_bytes>, one command per
+    distinct part layout (usually a single command for the whole batch, since most
+    messages share a layout). Traffic therefore grows with the text of a message,
+    capped at max_bytes per part, and not with the size of its attachments.
+
+    PEEK leaves the \\Seen flag alone, so callers mark handled messages with mark_seen().
+    """
+
+    HEADER_FIELDS = "FROM SUBJECT DATE MESSAGE-ID IN-REPLY-TO REFERENCES"
+
+    def __init__(self, mail, max_bytes=None, batch_size=None):
+        self.mail = mail
+        self.max_bytes = max_bytes or Config.IMAP_TEXT_MAX_BYTES
+        self.batch_size = batch_size or Config.IMAP_FETCH_BATCH_SIZE
+
+    def _uid_fetch(self, uids, items):
+        typ, data = self.mail.uid("FETCH", ",".join(str(uid) for uid in uids), items)
+        if typ != "OK":
+            raise RuntimeError(f"UID FETCH failed: {data}")
+        return parse_fetch_response(data)
+
+    def _fetch_structures(self, uids):
+        response = self._uid_fetch(uids, f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({self.HEADER_FIELDS})])")
+        messages = []
+        for uid in uids:
+            items = response.get(uid)
+            if items is None:
+                # Expunged since the search
+                continue
+            structure = items.get("BODYSTRUCTURE") or []
+            header_bytes = next((value for key, value in items.items() if key.startswith("BODY[HEADER")), b"")
+            headers = email.message_from_bytes(header_bytes if isinstance(header_bytes, bytes) else header_bytes.encode())
+            messages.append(FetchedMessage(uid, headers, text_parts(structure) if structure else []))
+        return messages
+
+    def _fetch_texts(self, messages):
+        layouts = {}
+        for message in messages:
+            sections = tuple(part.section for part in message.parts)
+            if sections:
+                layouts.setdefault(sections, []).append(message)
+
+        for sections, group in layouts.items():
+            items = " ".join(f"BODY.PEEK[{section}]<0.{self.max_bytes}>" for section in sections)
+            response = self._uid_fetch([message.uid for message in group], f"(UID {items})")
+            for message in group:
+                for key, value in response.get(message.uid, {}).items():
+                    match = _SECTION.match(key)
+                    if match:
+                        message.bodies[match.group(1)] = value if isinstance(value, bytes) else (value or "").encode()
+
+    def fetch(self, uids):
+        """Yield a FetchedMessage for each UID that still exists, in the given order."""
+        uids = list(uids)
+        for start in range(0, len(uids), self.batch_size):
+            messages = self._fetch_structures(uids[start:start + self.batch_size])
+            self._fetch_texts(messages)
+            for message in messages:
+                if message.truncated:
+                    logger.info(f"Message {message.uid}: text truncated to {self.max_bytes} bytes per part")
+                yield message
+
+    def mark_seen(self, uids):
+        uids = list(uids)
+        if uids:
+            self.mail.uid("STORE", ",".join(str(uid) for uid in uids), "+FLAGS.SILENT", "(\\Seen)")
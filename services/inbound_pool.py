@@ -0,0 +1,118 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class InboundPool:
+    """
+    Bounded worker pool for inbound messages that keeps each sender's messages in order.
+
+    Tasks are submitted under a key (the sender's address). Tasks with different keys run
+    in parallel on up to `workers` threads; tasks with the same key run one after another
+    in submission order, so a customer's second email is never answered before their first.
+    A worker takes one task from a key and then puts the key at the back of the ready queue,
+    so a sender with many queued messages can't hold a worker while other senders wait.
+
+    submit() blocks once max_pending tasks are waiting, which keeps a burst of mail from
+    piling up unbounded work (and LLM calls) in memory.
+    """
+
+    def __init__(self, workers=None, max_pending=None, name="inbound"):
+        self.workers = workers or Config.INBOUND_WORKERS
+        self.max_pending = max_pending or Config.INBOUND_MAX_PENDING
+        self.name = name
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._tasks = {}
+        self._ready = deque()
+        self._pending = 0
+        self._running = 0
+        self._threads = []
+        self._stopping = False
+
+    def _ensure_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"{self.name}-worker-{len(self._threads) + 1}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) behind any earlier tasks for key. Returns a Future."""
+        future = Future()
+        with self._changed:
+            if self._stopping:
+                raise RuntimeError("Inbound pool is shut down")
+            self._changed.wait_for(lambda: self._pending < self.max_pending or self._stopping)
+            self._ensure_workers()
+            queued = self._tasks.get(key)
+            if queued is None:
+                # No task for this key is queued or running, so the key becomes ready
+                queued = self._tasks[key] = deque()
+                self._ready.append(key)
+            queued.append((future, fn, args, kwargs))
+            self._pending += 1
+            self._changed.notify_all()
+        return future
+
+    def _worker_loop(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._ready or self._stopping)
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                future, fn, args, kwargs = self._tasks[key].popleft()
+                self._pending -= 1
+                self._running += 1
+                self._changed.notify_all()
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    logger.error(f"Inbound task for {key} failed: {str(e)}")
+                    future.set_exception(e)
+
+            with self._changed:
+                self._running -= 1
+                if self._tasks[key]:
+                    self._ready.append(key)
+                else:
+                    del self._tasks[key]
+                self._changed.notify_all()
+
+    def queue_depth(self):
+        """Number of tasks waiting for a worker."""
+        with self._lock:
+            return self._pending
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "running": self._running,
+                "senders": len(self._tasks)
+            }
+
+    def wait_idle(self, timeout=None):
+        """Block until no task is queued or running. Returns False on timeout."""
+        with self._changed:
+            return self._changed.wait_for(lambda: not self._pending and not self._running, timeout=timeout)
+
+    def shutdown(self, wait=True):
+        """Stop accepting tasks. Queued tasks still run; with wait=True, block until they have."""
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        if wait:
+            for thread in list(self._threads):
+                thread.join()
@@ -0,0 +1,174 @@
+import re
+import codecs
+import logging
+from html.parser import HTMLParser
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Charsets that mail clients declare for text that is really in a superset of them.
+# Outlook labels Windows-1252 text (curly quotes, euro sign) as ISO-8859-1 or US-ASCII.
+CHARSET_SUPERSETS = {
+    "us-ascii": "cp1252",
+    "ascii": "cp1252",
+    "iso-8859-1": "cp1252",
+    "latin-1": "cp1252",
+    "latin1": "cp1252",
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+}
+
+def _codec_name(charset):
+    """The Python codec for a declared charset, or None if it's missing or unknown."""
+    if not charset:
+        return None
+    charset = charset.strip().strip('"\'').lower()
+    charset = CHARSET_SUPERSETS.get(charset, charset)
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        logger.info(f"Unknown charset {charset!r}; detecting instead")
+        return None
+
+def decode_bytes(data, charset=None):
+    """
+    Decode a MIME part body with its declared charset. When none is declared, or the bytes
+    aren't valid in it, UTF-8 is tried, then Windows-1252, and Latin-1 (which accepts any
+    byte) is the last resort, so decoding never fails. UTF-8 can't go first: text in a 7-bit
+    charset such as ISO-2022-JP or UTF-7 is valid UTF-8 too, and would be left undecoded.
+    """
+    if isinstance(data, str):
+        return data
+    tried = []
+    for codec in (_codec_name(charset), "utf-8", "cp1252"):
+        if codec is None or codec in tried:
+            continue
+        tried.append(codec)
+        try:
+            return data.decode(codec)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+class HtmlTextExtractor(HTMLParser):
+    """
+    Streaming HTML-to-text conversion for email bodies.
+
+    The parser keeps only visible text: script, style and head content is dropped, block
+    elements and <br> become line breaks, list items get a "- " prefix and runs of
+    whitespace collapse to one space. Quoted history inside <blockquote> is skipped, since
+    only the newest reply matters. Text can be fed in chunks, and once max_chars characters
+    have been collected the rest of the document is ignored.
+    """
+
+    SKIPPED = {"script", "style", "head", "title", "blockquote"}
+    BLOCKS = {
+        "p", "div", "section", "article", "header", "footer", "table", "tr", "ul", "ol",
+        "h1", "h2", "h3", "h4", "h5", "h6", "pre", "hr"
+    }
+    WHITESPACE = re.compile(r'\s+')
+
+    def __init__(self, max_chars=None):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars or Config.INBOUND_TEXT_MAX_CHARS
+        self.truncated = False
+        self._lines = []
+        self._line = []
+        self._length = 0
+        self._skip_depth = 0
+
+    def _break(self, blank=True):
+        line = "".join(self._line).strip()
+        self._line = []
+        if line or (blank and self._lines and self._lines[-1]):
+            self._lines.append(line)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self._skip_depth += 1
+        elif self._skip_depth:
+            return
+        elif tag == "br" or tag in self.BLOCKS:
+            self._break()
+        elif tag == "li":
+            self._break(blank=False)
+            self._line.append("- ")
+        elif tag in ("td", "th") and self._line:
+            self._line.append(" ")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in ("br", "hr") and not self._skip_depth:
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif self._skip_depth:
+            return
+        elif tag in self.BLOCKS:
+            self._break()
+        elif tag == "li":
+            self._break(blank=False)
+
+    def handle_data(self, data):
+        if self._skip_depth or self.truncated:
+            return
+        text = self.WHITESPACE.sub(" ", data)
+        if not text.strip() and (not self._line or self._line[-1].endswith(" ")):
+            return
+        remaining = self.max_chars - self._length
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self._line.append(text)
+        self._length += len(text)
+
+    def feed(self, data):
+        if not self.truncated:
+            super().feed(data)
+
+    def text(self):
+        """The text collected so far."""
+        self._break()
+        return "\n".join(self._lines).strip()
+
+def html_to_text(html, max_chars=None, chunk_size=16 * 1024):
+    """Convert an HTML email body to compact plain text of at most max_chars characters."""
+    parser = HtmlTextExtractor(max_chars)
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        if parser.truncated:
+            break
+    else:
+        parser.close()
+    return parser.text()
+
+LOOKS_LIKE_HTML = re.compile(r'<(?:html|body|div|p|br|table|span|!doctype)\b', re.IGNORECASE)
+
+def cap_text(text, max_chars=None):
+    """Cut text to max_chars characters, preferring a line or word boundary."""
+    max_chars = max_chars or Config.INBOUND_TEXT_MAX_CHARS
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind("\n"), cut.rfind(" "))
+    if boundary > max_chars * 0.8:
+        cut = cut[:boundary]
+    logger.info(f"Inbound text truncated from {len(text)} to {len(cut)} characters")
+    return cut.rstrip()
+
+def message_text(plain_parts, html_parts, max_chars=None):
+    """
+    The text of a message for reply extraction and the prompt: the text/plain parts if there
+    are any, otherwise the text/html parts converted to text, capped at max_chars.
+    """
+    max_chars = max_chars or Config.INBOUND_TEXT_MAX_CHARS
+    if any(part.strip() for part in plain_parts):
+        return cap_text("\n".join(part.strip() for part in plain_parts), max_chars)
+    return cap_text("\n\n".join(html_to_text(part, max_chars) for part in html_parts), max_chars)
+
+def inbound_text(text, max_chars=None):
+    """Clean up a body received through a webhook: HTML is converted to text and the result capped."""
+    if LOOKS_LIKE_HTML.search(text or ""):
+        return html_to_text(text, max_chars)
+    return cap_text((text or "").strip(), max_chars)
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import logging
+import threading
+from datetime import datetime
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class MailboxCheckpoint:
+    """
+    Durable record of how far a mailbox has been processed: the mailbox's UIDVALIDITY and
+    the highest UID handled so far. Each sync only asks the server for UIDs above it, and
+    the file is rewritten atomically after every message, so a restart resumes where the
+    last run stopped. If the server reports a different UIDVALIDITY, the old UIDs no longer
+    identify the same messages and the checkpoint starts over.
+
+    A message whose handling keeps failing holds the checkpoint back, so after max_failures
+    failed passes it is given up on: it is logged, listed under "skipped" in the file and
+    counted as handled. A failed message that is no longer unread in the mailbox (read or
+    deleted elsewhere) won't be offered again, so it stops holding the checkpoint back too.
+    """
+
+    # Skipped UIDs kept in the file for inspection
+    SKIPPED_KEPT = 100
+
+    def __init__(self, account, mailbox="INBOX", directory=os.path.join("data", "checkpoints"), max_failures=None):
+        self.account = account
+        self.mailbox = mailbox
+        self.max_failures = max_failures or Config.IMAP_CHECKPOINT_MAX_FAILURES
+        safe_name = re.sub(r'[^\w.@-]+', '_', f"{account}-{mailbox}")
+        self.path = os.path.join(directory, f"{safe_name}.json")
+        self._lock = threading.Lock()
+        self._state = self._load()
+        self._in_flight = set()
+        self._failed = set()
+        self._failures = {}
+        self._done = set()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"uidvalidity": None, "last_uid": 0}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._state["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self._state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+
+    @property
+    def uidvalidity(self):
+        return self._state["uidvalidity"]
+
+    @property
+    def last_uid(self):
+        return self._state["last_uid"]
+
+    def validate(self, uidvalidity):
+        """Reset the checkpoint if the mailbox's UIDVALIDITY changed. Returns True if it was reset."""
+        with self._lock:
+            if self._state["uidvalidity"] == uidvalidity:
+                return False
+            if self._state["uidvalidity"] is not None:
+                logger.warning(f"UIDVALIDITY of {self.mailbox} changed from {self._state['uidvalidity']} to {uidvalidity}; resyncing")
+            self._state = {"uidvalidity": uidvalidity, "last_uid": 0}
+            self._in_flight.clear()
+            self._failed.clear()
+            self._failures.clear()
+            self._done.clear()
+            self._save()
+            return True
+
+    def advance(self, uid):
+        """Record that every message up to uid has been handled."""
+        with self._lock:
+            if uid > self._state["last_uid"]:
+                self._state["last_uid"] = uid
+                self._save()
+
+    def begin(self, uid):
+        """Record that uid was handed to a worker; the checkpoint can't move past it until it completes."""
+        with self._lock:
+            self._failed.discard(uid)
+            self._in_flight.add(uid)
+
+    def complete(self, uid):
+        """
+        Record that a message handed out with begin() has been handled. Messages can finish
+        out of order, so the checkpoint only advances to the highest handled UID below the
+        oldest one still in flight.
+        """
+        with self._lock:
+            self._in_flight.discard(uid)
+            self._failures.pop(uid, None)
+            self._done.add(uid)
+            self._advance_watermark()
+
+    def fail(self, uid):
+        """
+        Record that handling a message failed. The checkpoint stays below it and filter_new()
+        offers it again, so the next pass retries it, until it has failed max_failures times.
+        """
+        with self._lock:
+            self._in_flight.discard(uid)
+            self._failures[uid] = self._failures.get(uid, 0) + 1
+            if self._failures[uid] >= self.max_failures:
+                logger.error(f"Giving up on message {uid} in {self.mailbox} after {self._failures[uid]} failed attempts")
+                self._skip(uid)
+            else:
+                self._failed.add(uid)
+            self._advance_watermark()
+
+    def _skip(self, uid):
+        self._failed.discard(uid)
+        self._failures.pop(uid, None)
+        self._done.add(uid)
+        skipped = self._state.setdefault("skipped", [])
+        skipped.append(uid)
+        del skipped[:-self.SKIPPED_KEPT]
+        self._save()
+
+    def _advance_watermark(self):
+        blocking = self._in_flight | self._failed
+        oldest = min(blocking) if blocking else None
+        handled = {done for done in self._done if oldest is None or done < oldest}
+        self._done -= handled
+        if handled and max(handled) > self._state["last_uid"]:
+            self._state["last_uid"] = max(handled)
+            self._save()
+
+    def search_criteria(self):
+        """UID SEARCH criteria for messages after the checkpoint."""
+        return f"UID {self.last_uid + 1}:*"
+
+    def filter_new(self, uids):
+        """
+        Keep the UIDs above the checkpoint that aren't already being handled or done, in order.
+        UIDs whose handling failed are kept, so they are retried; a failed UID missing from uids
+        (the search results) has been read or deleted elsewhere and is no longer waited for.
+        Needed because "UID n:*" always matches the newest message, even when its UID is below n.
+        """
+        uids = set(uids)
+        with self._lock:
+            gone = self._failed - uids
+            if gone:
+                logger.info(f"Failed messages {sorted(gone)} in {self.mailbox} are no longer unread; not retrying them")
+                self._failed -= gone
+                for uid in gone:
+                    self._failures.pop(uid, None)
+                self._done |= gone
+                self._advance_watermark()
+            return sorted(uid for uid in uids if uid > self._state["last_uid"] and uid not in self._in_flight and uid not in self._done)
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class MailboxStatus:
+    """
+    Health report of one mailbox worker, written as a small JSON file that the supervisor
+    (in another process) reads. A heartbeat thread rewrites it every heartbeat_interval
+    seconds with a fresh snapshot, so a stale heartbeat means the worker is stuck or gone
+    even while its IMAP connection sits in IDLE.
+    """
+
+    def __init__(self, name, directory=None, heartbeat_interval=None):
+        self.name = name
+        self.directory = directory or Config.MAILBOX_STATUS_DIR
+        self.path = os.path.join(self.directory, f"{name}.json")
+        self.heartbeat_interval = heartbeat_interval or Config.MAILBOX_HEARTBEAT_INTERVAL
+        self._lock = threading.Lock()
+        self._fields = {"name": name, "pid": os.getpid(), "started_at": datetime.now().isoformat(timespec="seconds")}
+        self._snapshot = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def update(self, **fields):
+        """Merge fields into the report and write it."""
+        with self._lock:
+            self._fields.update(fields)
+            self._write()
+
+    def _write(self):
+        report = dict(self._fields)
+        if self._snapshot:
+            try:
+                report.update(self._snapshot())
+            except Exception as e:
+                logger.error(f"Could not collect status for mailbox {self.name}: {str(e)}")
+        report["heartbeat"] = time.time()
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(report, file)
+        os.replace(temp_path, self.path)
+
+    def start_heartbeat(self, snapshot=None):
+        """Rewrite the report every heartbeat_interval seconds, adding the fields returned by snapshot()."""
+        self._snapshot = snapshot
+        self._thread = threading.Thread(target=self._heartbeat_loop, name=f"status-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _heartbeat_loop(self):
+        while not self._stopping.wait(self.heartbeat_interval):
+            with self._lock:
+                try:
+                    self._write()
+                except OSError as e:
+                    logger.error(f"Could not write status for mailbox {self.name}: {str(e)}")
+
+    def stop(self):
+        self._stopping.set()
+
+    @staticmethod
+    def read(name, directory=None):
+        """The last report written for a mailbox, or None."""
+        path = os.path.join(directory or Config.MAILBOX_STATUS_DIR, f"{name}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
@@ -0,0 +1,201 @@
+import ssl
+import time
+import select
+import socket
+import imaplib
+import logging
+import itertools
+import threading
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class MailboxWatcher:
+    """
+    Keeps one authenticated IMAP connection open and waits for new mail on it.
+
+    When the server supports IDLE (RFC 2177) the watcher waits in IDLE and wakes as soon as
+    the server reports a change, re-issuing IDLE every idle_refresh seconds (29 minutes by
+    default, inside the RFC's 30-minute inactivity limit). Without IDLE it polls on the same
+    connection, starting at poll_min seconds and backing off to poll_max while the mailbox
+    is quiet. Dropped connections are reopened with exponential backoff.
+    """
+
+    def __init__(self, host=None, username=None, password=None, mailbox="INBOX",
+                 idle_refresh=None, poll_min=None, poll_max=None, use_idle=None):
+        self.host = host or Config.IMAP_SERVER
+        self.username = username or Config.EMAIL_ADDRESS
+        self.password = password or Config.EMAIL_PASSWORD
+        self.mailbox = mailbox
+        self.idle_refresh = idle_refresh or Config.IMAP_IDLE_REFRESH
+        self.poll_min = poll_min or Config.IMAP_POLL_MIN
+        self.poll_max = poll_max or Config.IMAP_POLL_MAX
+        self.use_idle = Config.IMAP_USE_IDLE if use_idle is None else use_idle
+        self.poll_interval = self.poll_min
+        self.reconnect_max = 300
+        self.mail = None
+        self.uidvalidity = None
+        self.supports_idle = False
+        self.failures = 0
+        self.last_error = None
+        self._idle_tags = itertools.count(1)
+        self._stopping = threading.Event()
+
+    def connect(self):
+        mail = imaplib.IMAP4_SSL(self.host)
+        mail.login(self.username, self.password)
+        # Capabilities can change after login, so ask again
+        _, data = mail.capability()
+        capabilities = data[0].decode().upper().split() if data and data[0] else []
+        mail.select(self.mailbox)
+        _, data = mail.response("UIDVALIDITY")
+        self.uidvalidity = int(data[0]) if data and data[0] else None
+        self.mail = mail
+        self.supports_idle = self.use_idle and "IDLE" in capabilities
+        logger.info(f"Connected to {self.host} ({'IDLE' if self.supports_idle else 'polling'})")
+        return mail
+
+    def _connect_with_backoff(self):
+        delay = 1
+        while not self._stopping.is_set():
+            try:
+                return self.connect()
+            except Exception as e:
+                logger.error(f"IMAP connection failed: {str(e)}; retrying in {delay}s")
+                self.last_error = f"IMAP connection failed: {str(e)}"
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self.reconnect_max)
+        return None
+
+    def disconnect(self):
+        if self.mail is None:
+            return
+        try:
+            self.mail.logout()
+        except Exception:
+            pass
+        self.mail = None
+
+    def _buffered(self):
+        """
+        Whether a response can be read without waiting. Lines imaplib has already read into
+        its buffered reader (mail.file), and decrypted bytes inside the SSL object, don't show
+        up in select(), so the reader is peeked with the socket briefly made non-blocking.
+        """
+        sock = self.mail.sock
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            return bool(self.mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def _readable(self, timeout):
+        if self._buffered():
+            return True
+        readable, _, _ = select.select([self.mail.sock], [], [], timeout)
+        return bool(readable)
+
+    def idle(self, timeout):
+        """
+        Wait in IDLE until the server reports a change or timeout passes. Returns True on a change.
+
+        imaplib has no IDLE support before Python 3.14, so the command is driven by hand, with
+        tags of its own (imaplib never sees its tagged response). The wait uses select() instead
+        of socket timeouts because imaplib's buffered reader can't be used again after a read
+        has timed out.
+        """
+        mail = self.mail
+        if self._has_notifications():
+            # Mail arrived while the last batch was being handled
+            return True
+        tag = f"IDLE{next(self._idle_tags)}".encode()
+        mail.send(tag + b" IDLE\r\n")
+        changed = False
+        line = mail.readline()
+        while line.startswith(b"* "):
+            # Untagged data sent before the continuation, e.g. a new EXISTS count
+            changed = True
+            line = mail.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.decode(errors='replace').strip()}")
+
+        deadline = time.monotonic() + timeout
+        try:
+            while not changed and not self._stopping.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if not self._readable(min(remaining, 1.0)):
+                    continue
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                if line.startswith(b"* BYE"):
+                    raise imaplib.IMAP4.abort(line.decode(errors="replace").strip())
+                if line.startswith(b"* "):
+                    changed = True
+                    break
+        finally:
+            if self.mail is mail:
+                mail.send(b"DONE\r\n")
+                while True:
+                    line = mail.readline()
+                    if not line:
+                        raise imaplib.IMAP4.abort("connection closed while ending IDLE")
+                    if line.startswith(tag):
+                        break
+        return changed
+
+    def _clear_notifications(self):
+        for name in ("EXISTS", "RECENT"):
+            self.mail.untagged_responses.pop(name, None)
+
+    def _has_notifications(self):
+        """Whether the server announced new mail in the responses to other commands since the last check."""
+        return any(self.mail.untagged_responses.get(name) for name in ("EXISTS", "RECENT"))
+
+    def wait(self):
+        """Block until there may be new mail: in IDLE if supported, otherwise for the current poll interval."""
+        if self.supports_idle:
+            self.idle(self.idle_refresh)
+        else:
+            self._stopping.wait(self.poll_interval)
+
+    def _adapt_poll_interval(self, found):
+        if found:
+            self.poll_interval = self.poll_min
+        else:
+            self.poll_interval = min(self.poll_interval * 2, self.poll_max)
+
+    def run(self, handler):
+        """
+        Call handler(mail) on connect and whenever there may be new mail, until stop() is called.
+        The handler returns the number of messages it processed, which drives the polling interval.
+        """
+        while not self._stopping.is_set():
+            try:
+                if self.mail is None and self._connect_with_backoff() is None:
+                    break
+                self._clear_notifications()
+                found = handler(self.mail)
+                self.failures = 0
+                self._adapt_poll_interval(found)
+                self.wait()
+                continue
+            except (imaplib.IMAP4.abort, imaplib.IMAP4.error, OSError, socket.error) as e:
+                logger.error(f"IMAP connection lost: {str(e)}")
+                self.last_error = f"IMAP connection lost: {str(e)}"
+            except Exception as e:
+                logger.error(f"Error checking emails: {str(e)}")
+                self.last_error = f"Error checking emails: {str(e)}"
+            # Back off before reconnecting, so a persistent error can't turn into a reconnect loop
+            self.disconnect()
+            self.failures += 1
+            self._stopping.wait(min(2 ** (self.failures - 1), self.reconnect_max))
+        self.disconnect()
+
+    def stop(self):
+        self._stopping.set()
@@ -0,0 +1,85 @@
+import os
+import logging
+from config.config import Config
+from services.artifact_store import get_artifact_store
+from services.menu_html_generator import MenuHtmlGenerator
+
+logger = logging.getLogger(__name__)
+
+class MenuDelivery:
+    """
+    Decides whether menus go out as attachments or as links, per channel.
+
+    Links point at the versioned /menus/<version>/<file> route, which serves the exact
+    stored version from the ArtifactStore with long-lived cache headers. Link mode needs
+    PUBLIC_BASE_URL; without it menus are attached as before.
+    """
+
+    MODES = ("attach", "link", "auto")
+
+    def __init__(self, artifact_store=None, base_url=None):
+        self.artifact_store = artifact_store or get_artifact_store()
+        self.base_url = (base_url if base_url is not None else Config.PUBLIC_BASE_URL).rstrip('/')
+        self.menu_titles = MenuHtmlGenerator().menu_titles
+
+    def mode_for(self, channel):
+        mode = (getattr(Config, f"MENU_DELIVERY_{channel.upper()}", None) or "attach").lower()
+        if mode not in self.MODES:
+            logger.warning(f"Unknown menu delivery mode {mode} for {channel}, attaching menus")
+            return "attach"
+        if mode != "attach" and not self.base_url:
+            logger.warning("PUBLIC_BASE_URL is not set, attaching menus instead of linking them")
+            return "attach"
+        return mode
+
+    def title(self, base_name):
+        return self.menu_titles.get(f"{base_name}.html", base_name.replace('_', ' ').title())
+
+    def menu_url(self, base_name):
+        """Versioned URL of the current menu (PDF if one is stored for this version, else HTML), or None."""
+        version = self.artifact_store.current(base_name)
+        if not version:
+            return None
+        for variant in ("pdf", "html"):
+            if self.artifact_store.has(base_name, version, variant):
+                return f"{self.base_url}/menus/{version}/{base_name}.{variant}"
+        return None
+
+    def plan(self, channel, attachments):
+        """
+        Given the (filename, path) attachments a reply would carry, return (attachments, links):
+        either the attachments unchanged and no links, or no attachments and [(title, url)] links.
+        """
+        if not attachments:
+            return attachments, []
+        mode = self.mode_for(channel)
+        if mode == "auto":
+            total = sum(os.path.getsize(path) for _, path in attachments if os.path.exists(path))
+            mode = "link" if total > Config.MENU_LINK_THRESHOLD_BYTES else "attach"
+        if mode == "attach":
+            return attachments, []
+
+        links = []
+        for filename, path in attachments:
+            base_name = os.path.splitext(filename)[0]
+            url = self.menu_url(base_name)
+            if url is None:
+                # Not in the store (e.g. generated before it existed); keep everything as attachments
+                return attachments, []
+            links.append((self.title(base_name), url))
+        return [], links
+
+    def links_for(self, channel, base_names):
+        """Links to menus for channels that can't carry attachments (SMS, WhatsApp); empty unless linking is enabled."""
+        if self.mode_for(channel) == "attach":
+            return []
+        links = []
+        for base_name in base_names:
+            url = self.menu_url(base_name)
+            if url:
+                links.append((self.title(base_name), url))
+        return links
+
+    @staticmethod
+    def format_links(links):
+        return "\n".join(f"{title}: {url}" for title, url in links)
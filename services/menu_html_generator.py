@@ -1,16 +1,34 @@
 import os
 import json
+import hashlib
 from datetime import datetime
+from services.menu_templates import menu_template, css_version, publish_css, escape_text, escape_texts
+from services.artifact_store import get_artifact_store
 
 class MenuHtmlGenerator:
     """
     A class to generate HTML menu files from the restaurant data.
     This is used to update the HTML menu files when the menu data is updated through the training interface.
+    
+    HTML is rendered with the Jinja2 template templates/menu.html. render_menu escapes the
+    menu entries itself and Jinja autoescapes the rest. Pages link the shared stylesheet,
+    which is copied from templates/menu.css to attachments/menu.css.
+    
+    A manifest (attachments/menu_manifest.json) records a content hash per section and per menu file,
+    so only menu files whose sections changed are re-rendered and rewritten. Rendered menus are
+    kept in the ArtifactStore under that hash, so returning to an earlier version (e.g. after a
+    rollback) swaps the stored file back in instead of rendering it again.
     """
     
+    # Bump when the generated HTML changes, so every menu is re-rendered once
+    TEMPLATE_VERSION = "3"
+    
     def __init__(self, restaurant_data_path="restaurant_data.json"):
         self.restaurant_data_path = restaurant_data_path
         self.attachments_dir = "attachments"
+        self.manifest_path = os.path.join(self.attachments_dir, "menu_manifest.json")
+        self.changed_menus = []
+        self.artifact_store = get_artifact_store(os.path.join(self.attachments_dir, "artifacts"), self.attachments_dir)
         self.menu_mapping = {
             "BREAKFAST MENU": "breakfast_menu.html",
             "MAINS": "a_la_carte_menu.html",
@@ -48,40 +66,131 @@ class MenuHtmlGenerator:
             print(f"Error loading restaurant data: {str(e)}")
             return None
     
-    def generate_all_menus(self):
-        """Generate all HTML menu files."""
-        restaurant_data = self.load_restaurant_data()
+    def load_manifest(self):
+        """Load the manifest of section and menu hashes from the last generation."""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+    
+    def _save_manifest(self, manifest):
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(temp_path, self.manifest_path)
+    
+    def _section_hash(self, section):
+        """Content hash of a section (None if the section is missing)."""
+        if section is None:
+            return None
+        return hashlib.sha256(json.dumps(section, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    
+    def get_menu_hashes(self, restaurant_data, menu_file):
+        """Return (menu_hash, {section_name: section_hash}) for a menu file."""
+        section_hashes = {
+            section_name: self._section_hash(self._find_section(restaurant_data, section_name))
+            for section_name in self.menu_sections.get(menu_file, [])
+        }
+        menu_key = json.dumps([self.TEMPLATE_VERSION, css_version(), self.menu_titles.get(menu_file), list(section_hashes.items())])
+        return hashlib.sha256(menu_key.encode('utf-8')).hexdigest(), section_hashes
+    
+    def get_menu_hash(self, menu_file):
+        """Hash of the currently generated version of a menu file, from the manifest (or None)."""
+        return self.load_manifest().get(menu_file, {}).get("hash")
+    
+    def generate_all_menus(self, restaurant_data=None, force=False):
+        """
+        Generate the HTML menu files whose content changed.
+        The changed files are available in self.changed_menus afterwards.
+        """
+        changed = self.regenerate_menus(restaurant_data, force)
+        return changed is not None
+    
+    def regenerate_menus(self, restaurant_data=None, force=False):
+        """
+        Re-render only the menu files whose sections changed since the last generation.
+        Pass restaurant_data to skip reloading the JSON file; force re-renders everything.
+        Returns the list of menu files that were rewritten, or None if the data couldn't be loaded.
+        """
+        if restaurant_data is None:
+            restaurant_data = self.load_restaurant_data()
         if not restaurant_data:
-            return False
+            return None
         
-        # Generate each menu file
+        publish_css(self.attachments_dir)
+        manifest = self.load_manifest()
+        changed = []
         for menu_file in self.menu_titles.keys():
-            self.generate_menu_file(restaurant_data, menu_file)
+            menu_hash, section_hashes = self.get_menu_hashes(restaurant_data, menu_file)
+            file_path = os.path.join(self.attachments_dir, menu_file)
+            previous = manifest.get(menu_file, {})
+            if not force and previous.get("hash") == menu_hash and os.path.exists(file_path):
+                continue
+            
+            if not force and self.artifact_store.has(menu_file, menu_hash):
+                self.artifact_store.promote(menu_file, menu_hash)
+                print(f"Reused stored {menu_file}")
+            else:
+                self.generate_menu_file(restaurant_data, menu_file, menu_hash)
+            manifest[menu_file] = {
+                "hash": menu_hash,
+                "sections": section_hashes,
+                "generated_at": datetime.now().isoformat(timespec="seconds")
+            }
+            changed.append(menu_file)
         
-        return True
+        if changed:
+            self._save_manifest(manifest)
+            self.artifact_store.collect_garbage()
+        self.changed_menus = changed
+        return changed
     
-    def generate_menu_file(self, restaurant_data, menu_file):
-        """Generate a specific HTML menu file."""
-        menu_title = self.menu_titles.get(menu_file, "Menu")
-        menu_sections_to_include = self.menu_sections.get(menu_file, [])
-        
-        # Get the sections for this menu
-        sections_html = ""
-        for section_name in menu_sections_to_include:
-            section = self._find_section(restaurant_data, section_name)
-            if section:
-                sections_html += self._generate_section_html(section)
+    def generate_menu_file(self, restaurant_data, menu_file, menu_hash=None):
+        """Generate a specific HTML menu file, store it under its content hash and make it current."""
+        if menu_hash is None:
+            menu_hash, _ = self.get_menu_hashes(restaurant_data, menu_file)
+        html = self.render_menu(restaurant_data, menu_file)
         
-        # Generate the full HTML
-        html = self._generate_menu_html(menu_title, sections_html)
-        
-        # Write the HTML to the file
-        file_path = os.path.join(self.attachments_dir, menu_file)
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(html)
+        # The alias in attachments/ is swapped in atomically, so readers never see a partial menu
+        self.artifact_store.put(menu_file, menu_hash, html, "html")
+        self.artifact_store.promote(menu_file, menu_hash)
         
         print(f"Generated {menu_file}")
     
+    def render_menu(self, restaurant_data, menu_file):
+        """Render the full HTML for a menu file and return it as a string."""
+        sections = [
+            (escape_text(section["name"]), [self._menu_entry(item) for item in section.get("items", [])])
+            for section in (
+                self._find_section(restaurant_data, section_name)
+                for section_name in self.menu_sections.get(menu_file, [])
+            )
+            if section
+        ]
+        return menu_template().render(
+            title=self.menu_titles.get(menu_file, "Menu"),
+            css_version=css_version(),
+            sections=sections,
+            last_updated=datetime.now().strftime("%d %B %Y")
+        )
+    
+    def _menu_entry(self, item):
+        """
+        (name, description, price, subitems) for the template, where subitems is None for a
+        regular item and a list of (name, description, price) for a subsection (like in wine
+        sections). Plain tuples are unpacked by the template's loops, which keeps rendering a
+        large wine list fast. The text is already HTML-escaped: the template doesn't autoescape
+        its entry loops.
+        """
+        if "items" in item:
+            return (escape_text(item["name"]), "", "", [self._entry_text(subitem) for subitem in item.get("items", [])])
+        return self._entry_text(item) + (None,)
+    
+    def _entry_text(self, item):
+        """An item's (name, description, price), HTML-escaped."""
+        return escape_texts((item.get("name", ""), item.get("description", ""), self._format_price(item)))
+    
     def _find_section(self, restaurant_data, section_name):
         """Find a section in the restaurant data by name."""
         for section in restaurant_data.get("menu_sections", []):
@@ -89,166 +198,16 @@ class MenuHtmlGenerator:
                 return section
         return None
     
-    def _generate_section_html(self, section):
-        """Generate HTML for a menu section."""
-        section_html = f"""
-    <div class="section">
-        <div class="section-title">{section["name"]}</div>
-"""
-        
-        # Handle regular items
-        for item in section.get("items", []):
-            if "items" in item:
-                # This is a subsection (like in wine sections)
-                section_html += f"""
-        <div class="subsection">
-            <div class="subsection-title">{item["name"]}</div>
-"""
-                for subitem in item.get("items", []):
-                    section_html += self._generate_item_html(subitem)
-                
-                section_html += """
-        </div>
-"""
-            else:
-                # This is a regular item
-                section_html += self._generate_item_html(item)
-        
-        section_html += """
-    </div>
-"""
-        return section_html
-    
-    def _generate_item_html(self, item):
-        """Generate HTML for a menu item."""
-        name = item.get("name", "")
-        description = item.get("description", "")
-        
-        # Handle different price formats
-        price_html = ""
+    def _format_price(self, item):
+        """Format an item's price for display."""
         if "price" in item:
             if item["price"] is None:
-                price_html = "Market Price"
-            else:
-                # Ensure we don't add an extra 'R' if the price already has one
-                price_str = str(item["price"])
-                if price_str.startswith('R'):
-                    price_html = price_str
-                else:
-                    price_html = f"R{price_str}"
+                return "Market Price"
+            # Ensure we don't add an extra 'R' if the price already has one
+            price_str = str(item["price"])
+            if price_str.startswith('R'):
+                return price_str
+            return f"R{price_str}"
         elif "price_glass" in item and "price_bottle" in item:
-            price_html = f"R{item['price_glass']} (glass) / R{item['price_bottle']} (bottle)"
-        
-        return f"""
-        <div class="item">
-            <div class="item-name">{name}</div>
-            <div class="item-description">{description}</div>
-            <div class="item-price">{price_html}</div>
-        </div>
-"""
-    
-    def _generate_menu_html(self, title, sections_html):
-        """Generate the full HTML for a menu."""
-        return f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>Zevenwacht Restaurant - {title}</title>
-    <style>
-        body {{
-            font-family: 'Arial', sans-serif;
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 20px;
-            color: #333;
-            background-color: #fff;
-        }}
-        .header {{
-            text-align: center;
-            margin-bottom: 30px;
-            border-bottom: 2px solid #722f37;
-            padding-bottom: 20px;
-        }}
-        .logo {{
-            font-size: 28px;
-            font-weight: bold;
-            color: #722f37;
-            margin-bottom: 10px;
-        }}
-        .subtitle {{
-            font-size: 20px;
-            color: #666;
-            font-style: italic;
-        }}
-        .section {{
-            margin-bottom: 40px;
-        }}
-        .section-title {{
-            background-color: #722f37;
-            color: white;
-            padding: 10px 15px;
-            margin-bottom: 20px;
-            font-size: 18px;
-            font-weight: bold;
-        }}
-        .subsection {{
-            margin-bottom: 30px;
-        }}
-        .subsection-title {{
-            color: #722f37;
-            font-weight: bold;
-            font-size: 16px;
-            margin-bottom: 15px;
-            border-bottom: 1px solid #722f37;
-            padding-bottom: 5px;
-        }}
-        .item {{
-            margin-bottom: 20px;
-            padding-bottom: 15px;
-            border-bottom: 1px solid #eee;
-        }}
-        .item-name {{
-            font-weight: bold;
-            color: #722f37;
-            font-size: 16px;
-            margin-bottom: 5px;
-        }}
-        .item-description {{
-            font-style: italic;
-            color: #666;
-            margin: 5px 0;
-            line-height: 1.4;
-        }}
-        .item-price {{
-            color: #722f37;
-            font-weight: bold;
-            margin-top: 5px;
-        }}
-        .footer {{
-            text-align: center;
-            margin-top: 40px;
-            padding-top: 20px;
-            border-top: 2px solid #722f37;
-            font-size: 14px;
-            color: #666;
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <div class="logo">ZEVENWACHT RESTAURANT</div>
-        <div class="subtitle">{title}</div>
-        <p>Zeevenwacht Wine Estate, Langverwacht Rd, Kuils River</p>
-        <p>Main Service Hours: Tuesday-Sunday, 12:00-22:00 (Last orders at 21:00)</p>
-    </div>
-
-{sections_html}
-
-    <div class="footer">
-        <p>All prices include VAT</p>
-        <p>Please inform your server of any dietary requirements or allergies</p>
-        <p>A 10% service charge will be added to tables of 8 or more</p>
-        <p>Contact: jolinesalesagent@gmail.com | Tel: +27 (21) 903 5123</p>
-        <p>Last updated: {datetime.now().strftime("%d %B %Y")}</p>
-    </div>
-</body>
-</html>"""
\ No newline at end of file
+            return f"R{item['price_glass']} (glass) / R{item['price_bottle']} (bottle)"
+        return ""
@@ -0,0 +1,139 @@
+import re
+
+class ItemLocation:
+    """Where a menu item lives: its section, the wine subsection (parent) if nested, and its position."""
+    __slots__ = ("section", "parent", "position")
+
+    def __init__(self, section, parent, position):
+        self.section = section
+        self.parent = parent
+        self.position = position
+
+    @property
+    def container(self):
+        """The list that holds the item."""
+        return self.parent["items"] if self.parent is not None else self.section["items"]
+
+    @property
+    def item(self):
+        return self.container[self.position]
+
+    @property
+    def section_name(self):
+        return self.section.get("name", "")
+
+    @property
+    def parent_name(self):
+        return self.parent.get("name", "") if self.parent is not None else ""
+
+    def __repr__(self):
+        return f"ItemLocation({self.section_name!r}, {self.parent_name!r}, {self.position})"
+
+class MenuItemIndex:
+    """
+    Index from normalized item name to its location in restaurant_data["menu_sections"].
+    Covers regular section items and items nested in subsections (like the wine list).
+    All menu mutations should go through add_item/remove_item/rename_item so the index
+    stays in step with the data.
+    """
+
+    def __init__(self, menu_sections=None):
+        self.rebuild(menu_sections or [])
+
+    @staticmethod
+    def normalize(name):
+        """Normalize an item or section name for lookups."""
+        return re.sub(r'\s+', ' ', str(name or "")).strip().lower()
+
+    def rebuild(self, menu_sections):
+        """Rebuild the index from scratch (after loading or replacing the restaurant data)."""
+        self.menu_sections = menu_sections
+        self._items = {}
+        self._sections = {}
+        for section in menu_sections:
+            self._sections[self.normalize(section.get("name"))] = section
+            for position, item in enumerate(section.get("items", [])):
+                if isinstance(item, dict) and "items" in item:
+                    for sub_position, subitem in enumerate(item["items"]):
+                        self._add_location(subitem, ItemLocation(section, item, sub_position))
+                elif isinstance(item, dict):
+                    self._add_location(item, ItemLocation(section, None, position))
+
+    def _add_location(self, item, location):
+        self._items.setdefault(self.normalize(item.get("name")), []).append(location)
+
+    def _drop_location(self, name, location):
+        key = self.normalize(name)
+        locations = self._items.get(key, [])
+        if location in locations:
+            locations.remove(location)
+        if not locations:
+            self._items.pop(key, None)
+
+    def get_section(self, name):
+        """Return the section with the given name, or None."""
+        return self._sections.get(self.normalize(name))
+
+    def get_subsection(self, name):
+        """Return the subsection (like a wine list group) with the given name, or None."""
+        wanted = self.normalize(name)
+        for section in self.menu_sections:
+            for item in section.get("items", []):
+                if isinstance(item, dict) and "items" in item and self.normalize(item.get("name")) == wanted:
+                    return item
+        return None
+
+    def add_section(self, name):
+        """Create and index a new, empty section."""
+        section = {"name": name, "items": []}
+        self.menu_sections.append(section)
+        self._sections[self.normalize(name)] = section
+        return section
+
+    def find(self, name, menu_type=None):
+        """
+        Return the locations of an item, regular items before nested ones.
+        When menu_type is given, only locations in that section (or wine subsection) are returned.
+        """
+        locations = self._items.get(self.normalize(name), [])
+        if menu_type:
+            wanted = self.normalize(menu_type)
+            locations = [
+                location for location in locations
+                if self.normalize(location.section_name) == wanted or self.normalize(location.parent_name) == wanted
+            ]
+        return sorted(locations, key=lambda location: location.parent is not None)
+
+    def contains(self, name, menu_type=None):
+        return bool(self.find(name, menu_type))
+
+    def names(self):
+        """All indexed item names (normalized)."""
+        return self._items.keys()
+
+    def add_item(self, section, item, parent=None):
+        """Append an item to a section (or wine subsection) and index it."""
+        container = parent["items"] if parent is not None else section["items"]
+        container.append(item)
+        location = ItemLocation(section, parent, len(container) - 1)
+        self._add_location(item, location)
+        return location
+
+    def remove_item(self, location):
+        """Remove the item at a location and shift the positions of the items after it."""
+        container = location.container
+        item = container.pop(location.position)
+        self._drop_location(item.get("name"), location)
+        later_names = {self.normalize(later.get("name")) for later in container[location.position:]}
+        for key in later_names:
+            for other in self._items.get(key, []):
+                if other.container is container and other.position > location.position:
+                    other.position -= 1
+        return item
+
+    def rename_item(self, location, new_name):
+        """Rename the item at a location and move its index entry."""
+        item = location.item
+        self._drop_location(item.get("name"), location)
+        item["name"] = new_name
+        self._add_location(item, location)
@@ -0,0 +1,81 @@
+import os
+import shutil
+import hashlib
+from jinja2 import Environment, FileSystemLoader
+
+TEMPLATES_DIR = "templates"
+MENU_TEMPLATE = "menu.html"
+CSS_NAME = "menu.css"
+CSS_PATH = os.path.join(TEMPLATES_DIR, CSS_NAME)
+
+# Built once per process: Jinja compiles each template on first use and keeps it. Menus
+# are only regenerated on a data change, so templates aren't checked for edits on disk.
+environment = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=True,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=False
+)
+
+_css_version = None
+
+def escape_text(value):
+    """
+    HTML-escape a value exactly like Jinja's autoescape (MarkupSafe), as a plain str.
+    Autoescape wraps every value in a Markup object, which costs more than rendering the
+    rest of a large menu; most menu text needs no escaping and is returned as it is.
+    """
+    if not isinstance(value, str):
+        value = str(value)
+    # Five substring tests are several times faster than a regex search
+    if "&" in value or "<" in value or ">" in value or '"' in value or "'" in value:
+        return (
+            value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            .replace('"', "&#34;").replace("'", "&#39;")
+        )
+    return value
+
+def escape_texts(values):
+    """
+    escape_text for a tuple of values, such as one menu entry. The text is checked once as a
+    whole, and the values are only escaped one by one if something in it needs escaping.
+    """
+    try:
+        text = "".join(values)
+    except TypeError:
+        return tuple(escape_text(value) for value in values)
+    if "&" in text or "<" in text or ">" in text or '"' in text or "'" in text:
+        return tuple(escape_text(value) for value in values)
+    return values
+
+def menu_template():
+    """The compiled page template for the generated HTML menus (templates/menu.html)."""
+    return environment.get_template(MENU_TEMPLATE)
+
+def css_version():
+    """
+    Short content hash of templates/menu.css. Menus link the stylesheet as menu.css?v=<hash>,
+    so a stylesheet change changes the HTML too, which re-renders the menus, rebuilds their
+    PDFs and moves browsers off a cached copy.
+    """
+    global _css_version
+    if _css_version is None:
+        with open(CSS_PATH, "rb") as file:
+            _css_version = hashlib.sha256(file.read()).hexdigest()[:12]
+    return _css_version
+
+def publish_css(directory):
+    """Copy the stylesheet next to the generated menus (e.g. attachments/) if it isn't there or differs."""
+    target = os.path.join(directory, CSS_NAME)
+    try:
+        with open(target, "rb") as file:
+            if hashlib.sha256(file.read()).hexdigest()[:12] == css_version():
+                return target
+    except FileNotFoundError:
+        pass
+    os.makedirs(directory, exist_ok=True)
+    temp_path = f"{target}.tmp"
+    shutil.copyfile(CSS_PATH, temp_path)
+    os.replace(temp_path, target)
+    return target
@@ -0,0 +1,212 @@
+import time
+import json
+import sqlite3
+import logging
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class MessageCoalescer:
+    """
+    Merges messages that one sender sends in quick succession into a single turn.
+
+    People often split a question over two or three messages ("Hi", "table for 6 on
+    Saturday?", "also do you have vegan options"). Instead of answering each one, the
+    inbound job stores the message with add() and schedules a "<channel>_turn" job for
+    the sender on the outbound queue, delayed by the channel's debounce window. Every
+    new message schedules another turn job, and a turn job only takes the messages once
+    the window has passed since the sender's last message (or COALESCE_MAX_WAIT since
+    the first), so a burst is answered with one AI call and one reply.
+
+    Pending messages live in the outbound queue's database, so a restart loses none of
+    them. take() claims the messages for the turn job that answers them; they are
+    deleted by complete() once the reply is queued, and a claim left behind by a crash
+    can be taken over after OUTBOUND_LEASE_SECONDS.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pending_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            sender TEXT NOT NULL,
+            content TEXT NOT NULL,
+            message_key TEXT UNIQUE,
+            metadata TEXT,
+            received_at REAL NOT NULL,
+            claimed_by INTEGER,
+            claimed_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS pending_by_sender ON pending_messages (channel, sender, id);
+    """
+
+    SEPARATOR = "\n\n"
+
+    def __init__(self, outbound_queue, db_path=None):
+        self.outbound_queue = outbound_queue
+        self.db_path = db_path or outbound_queue.db_path
+        conn = self._connect()
+        try:
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def window(channel):
+        """The debounce window of a channel in seconds; 0 turns coalescing off."""
+        return {
+            'email': Config.COALESCE_WINDOW_EMAIL,
+            'sms': Config.COALESCE_WINDOW_SMS,
+            'whatsapp': Config.COALESCE_WINDOW_WHATSAPP
+        }.get(channel, 0)
+
+    def enabled(self, channel):
+        return self.window(channel) > 0
+
+    def add(self, channel, sender, content, message_key=None, metadata=None):
+        """
+        Store a message and schedule a turn for its sender. message_key identifies the
+        message (e.g. the inbound job's idempotency key), so adding it twice is harmless.
+        metadata (JSON-serialisable, e.g. email threading headers) is handed back by take().
+        Returns False if the message was already added.
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO pending_messages (channel, sender, content, message_key, metadata, received_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (channel, sender, content, message_key, json.dumps(metadata) if metadata is not None else None, time.time())
+            )
+            message_id = cursor.lastrowid if cursor.rowcount else None
+        finally:
+            conn.close()
+        if message_id is None:
+            logger.info(f"Skipped duplicate {channel} message from {sender} ({message_key})")
+            return False
+        self._schedule(channel, sender, f"turn:{channel}:{message_id}", self.window(channel))
+        return True
+
+    def _schedule(self, channel, sender, idempotency_key, delay):
+        self.outbound_queue.enqueue(channel, f"{channel}_turn", {'sender': sender}, idempotency_key=idempotency_key, delay=delay)
+
+    def take(self, channel, sender, job_id):
+        """
+        Claim the sender's pending messages for turn job job_id once their window has closed.
+        Returns the claimed messages (dicts with id, content and metadata, oldest first), or an empty
+        list when there is nothing to answer yet: a later turn job covers newer messages.
+        """
+        now = time.time()
+        window = self.window(channel)
+        lease_cutoff = now - Config.OUTBOUND_LEASE_SECONDS
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, content, metadata, received_at, claimed_by, claimed_at FROM pending_messages "
+                "WHERE channel = ? AND sender = ? ORDER BY id",
+                (channel, sender)
+            ).fetchall()
+            owned = [row for row in rows if row["claimed_by"] == job_id]
+            if owned:
+                # A retry of this job answers the same messages as before
+                conn.execute("COMMIT")
+                return [self._message(row) for row in owned]
+            busy = any(row["claimed_by"] is not None and row["claimed_at"] >= lease_cutoff for row in rows)
+            rows = [row for row in rows if row["claimed_by"] is None or row["claimed_at"] < lease_cutoff]
+            newest = max((row["received_at"] for row in rows), default=None)
+            oldest = min((row["received_at"] for row in rows), default=None)
+            if busy or not rows or (now - newest < window and now - oldest < Config.COALESCE_MAX_WAIT):
+                conn.execute("COMMIT")
+                if busy and rows:
+                    # The previous turn is still being answered; come back so the replies stay in order
+                    self._schedule(channel, sender, None, window)
+                return []
+            conn.executemany(
+                "UPDATE pending_messages SET claimed_by = ?, claimed_at = ? WHERE id = ?",
+                [(job_id, now, row["id"]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        if len(rows) > 1:
+            logger.info(f"Coalesced {len(rows)} {channel} messages from {sender} into one turn")
+        return [self._message(row) for row in rows]
+
+    @staticmethod
+    def _message(row):
+        return {'id': row["id"], 'content': row["content"], 'metadata': json.loads(row["metadata"]) if row["metadata"] else None}
+
+    def merge(self, messages):
+        return self.SEPARATOR.join(message['content'].strip() for message in messages if message['content'].strip())
+
+    def complete(self, job_id):
+        """Delete the messages answered by turn job job_id."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM pending_messages WHERE claimed_by = ?", (job_id,))
+        finally:
+            conn.close()
+
+    def pending(self, channel=None):
+        """Number of messages waiting for their turn, optionally for one channel."""
+        conn = self._connect()
+        try:
+            if channel:
+                return conn.execute("SELECT COUNT(*) FROM pending_messages WHERE channel = ?", (channel,)).fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM pending_messages").fetchone()[0]
+        finally:
+            conn.close()
+
+def register_text_jobs(outbound_queue, channel, compose_reply, deliver):
+    """
+    Register the jobs of a text channel such as "sms" or "whatsapp" on the outbound queue.
+    <channel>_inbound answers a message, or with a coalescing window holds it for a
+    <channel>_turn job that answers the sender's burst with one reply. Replies are queued as
+    <channel>_send. compose_reply(message_body) returns the reply text and
+    deliver(to_number, message) sends it.
+    """
+    coalescer = MessageCoalescer(outbound_queue)
+
+    def reply(message_body, to_number, idempotency_key, received_at=None):
+        outbound_queue.enqueue(
+            channel,
+            f"{channel}_send",
+            {'to_number': to_number, 'message': compose_reply(message_body), 'received_at': received_at},
+            idempotency_key=idempotency_key
+        )
+
+    def process_inbound(payload, job):
+        if coalescer.enabled(channel):
+            coalescer.add(
+                channel, payload['from_number'], payload['message_body'],
+                job['idempotency_key'] or f"job:{job['id']}", metadata={'received_at': payload.get('received_at')}
+            )
+            return
+        reply(payload['message_body'], payload['from_number'], f"reply:{job['idempotency_key'] or job['id']}", payload.get('received_at'))
+
+    def process_turn(payload, job):
+        messages = coalescer.take(channel, payload['sender'], job['id'])
+        if not messages:
+            return
+        # Latency is counted from the first message of the burst
+        received_at = min((message['metadata'] or {}).get('received_at') or time.time() for message in messages)
+        # Keyed on the last message answered, so a retried turn never sends a second reply
+        reply(coalescer.merge(messages), payload['sender'], f"reply:turn:{channel}:{messages[-1]['id']}", received_at)
+        coalescer.complete(job['id'])
+
+    def send(payload, job):
+        deliver(payload['to_number'], payload['message'])
+        outbound_queue.record_latency(channel, payload.get('received_at'))
+
+    outbound_queue.register(f"{channel}_inbound", process_inbound)
+    outbound_queue.register(f"{channel}_turn", process_turn)
+    outbound_queue.register(f"{channel}_send", send)
@@ -3,6 +3,7 @@ import json
 import os
 import openai
 from typing import Dict, Optional, List, Any
+from services.sms_composer import SmsComposer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,6 +20,8 @@ class OpenAIService:
             'voice': "You are Joline, a natural-sounding restaurant voice assistant from Zevenwacht Restaurant. Use conversational language and clear pronunciation.",
             'chat': "You are Joline, an engaging online chat assistant from Zevenwacht Restaurant. Keep responses friendly, helpful, and conversational."
         }
+        self.sms_composer = SmsComposer()
+        self.channel_prompts['sms'] += " " + self.sms_composer.budget_prompt()
         self.menu_data = self._load_menu_data()
 
     def _load_menu_data(self) -> Dict:
@@ -195,7 +198,7 @@ When customers ask about menus or specials, provide relevant information and men
     def _format_response_for_channel(self, response: str, channel: str) -> str:
         """Format the response appropriately for the specific channel"""
         if channel == 'sms':
-            return self._truncate_response(response, 160)
+            return self.sms_composer.compose(response)
         elif channel == 'whatsapp':
             return response
         elif channel == 'email':
@@ -205,17 +208,6 @@ When customers ask about menus or specials, provide relevant information and men
         else:
             return response
 
-    def _truncate_response(self, response: str, max_length: int) -> str:
-        """Truncate response to specified length while maintaining coherence"""
-        if len(response) <= max_length:
-            return response
-        
-        truncated = response[:max_length-3]
-        last_period = truncated.rfind('.')
-        if last_period > 0:
-            return truncated[:last_period + 1]
-        return truncated + '...'
-        
     def chat_completion(self, system_prompt: str, user_message: str, response_format: Optional[Dict[str, Any]] = None) -> str:
         """
         Generate a response using OpenAI's ChatCompletion API with a specific system prompt.
@@ -0,0 +1,403 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class OutboundQueue:
+    """
+    Durable, SQLite-backed job queue for replies that shouldn't run inside a webhook request.
+
+    Webhooks enqueue a job (e.g. "email_inbound" with the customer's message) and return
+    immediately; worker threads for each channel run the registered handler for the job's
+    kind. A handler that raises or returns False is retried with exponential backoff, and
+    after max_attempts the job is moved to the dead_letters table. Jobs carry an optional
+    idempotency key (e.g. the Twilio MessageSid), so a webhook delivered twice only
+    produces one job; finished jobs are kept for OUTBOUND_RETENTION_DAYS for that reason.
+    Several processes can share one database, since claiming a job is a single transaction.
+    Jobs left in progress by a crash are picked up again once their lease expires.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            idempotency_key TEXT UNIQUE,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (channel, status, next_attempt_at);
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL,
+            channel TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            idempotency_key TEXT,
+            attempts INTEGER NOT NULL,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            failed_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS reply_latency (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            received_at REAL NOT NULL,
+            delivered_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS reply_latency_by_channel ON reply_latency (channel, delivered_at);
+    """
+
+    def __init__(self, db_path=None, max_attempts=None, backoff_base=None, backoff_max=300.0, workers_per_channel=None):
+        self.db_path = db_path or Config.OUTBOUND_QUEUE_DB
+        self.max_attempts = max_attempts or Config.OUTBOUND_MAX_ATTEMPTS
+        self.backoff_base = backoff_base or Config.OUTBOUND_BACKOFF_BASE
+        self.backoff_max = backoff_max
+        self.workers_per_channel = workers_per_channel or Config.OUTBOUND_WORKERS_PER_CHANNEL
+        self._handlers = {}
+        self._wakeups = {}
+        self._workers = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat(timespec="seconds")
+
+    def register(self, kind, handler):
+        """Register handler(payload, job) for a job kind. It should raise or return False on failure."""
+        self._handlers[kind] = handler
+
+    def enqueue(self, channel, kind, payload, idempotency_key=None, delay=0):
+        """
+        Add a job. Returns the job id, or None if a job with this idempotency key already exists.
+        """
+        now = self._now()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (channel, kind, payload, idempotency_key, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (channel, kind, json.dumps(payload, ensure_ascii=False), idempotency_key, time.time() + delay, now, now)
+            )
+            job_id = cursor.lastrowid if cursor.rowcount else None
+        finally:
+            conn.close()
+        if job_id is None:
+            logger.info(f"Skipped duplicate {kind} job ({idempotency_key})")
+            return None
+        self._wake(channel)
+        return job_id
+
+    def _wake(self, channel):
+        with self._lock:
+            event = self._wakeups.get(channel)
+        if event is not None:
+            event.set()
+
+    def _claim(self, conn, channel):
+        """Atomically mark the next ready job of a channel as in progress and return it."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE channel = ? AND status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT 1",
+                (channel, time.time())
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'in_progress', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (self._now(), row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _next_due(self, conn, channel):
+        row = conn.execute(
+            "SELECT MIN(next_attempt_at) FROM jobs WHERE channel = ? AND status = 'pending'",
+            (channel,)
+        ).fetchone()
+        return row[0]
+
+    def _complete(self, conn, job):
+        # Finished jobs are kept for a while so their idempotency keys still reject duplicates
+        conn.execute("UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?", (self._now(), job["id"]))
+
+    def _fail(self, conn, job, error):
+        if job["attempts"] >= self.max_attempts:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO dead_letters (job_id, channel, kind, payload, idempotency_key, attempts, error, created_at, failed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job["id"], job["channel"], job["kind"], json.dumps(job["payload"], ensure_ascii=False),
+                     job["idempotency_key"], job["attempts"], error, job["created_at"], self._now())
+                )
+                # Keep the idempotency key reserved so a redelivered webhook doesn't requeue a dead job
+                conn.execute("UPDATE jobs SET status = 'dead', last_error = ?, updated_at = ? WHERE id = ?", (error, self._now(), job["id"]))
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            logger.error(f"Job {job['id']} ({job['kind']}) moved to dead letters after {job['attempts']} attempts: {error}")
+            return
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (job["attempts"] - 1))
+        delay *= random.uniform(0.8, 1.2)
+        conn.execute(
+            "UPDATE jobs SET status = 'pending', next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            (time.time() + delay, error, self._now(), job["id"])
+        )
+        logger.warning(f"Job {job['id']} ({job['kind']}) failed, retrying in {delay:.1f}s: {error}")
+
+    def run_job(self, conn, job):
+        handler = self._handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for {job['kind']}")
+            if handler(job["payload"], job) is False:
+                raise RuntimeError("Handler reported failure")
+        except Exception as e:
+            self._fail(conn, job, str(e) or type(e).__name__)
+            return False
+        self._complete(conn, job)
+        return True
+
+    def _worker_loop(self, channel, wakeup):
+        conn = None
+        last_recovery = time.monotonic()
+        errors = 0
+        while not self._stopping.is_set():
+            try:
+                if conn is None:
+                    conn = self._connect()
+                if time.monotonic() - last_recovery > Config.OUTBOUND_LEASE_SECONDS / 2:
+                    last_recovery = time.monotonic()
+                    self.recover()
+                job = self._claim(conn, channel)
+                if job is not None:
+                    self.run_job(conn, job)
+                    errors = 0
+                    continue
+                next_due = self._next_due(conn, channel)
+                errors = 0
+            except Exception as e:
+                # A locked or unavailable database (or a bug) must not kill the worker. A job whose
+                # outcome couldn't be saved stays in progress and is recovered when its lease expires.
+                errors += 1
+                delay = min(60.0, self.backoff_base * 2 ** min(errors - 1, 10))
+                if isinstance(e, sqlite3.Error):
+                    logger.error(f"Outbound queue error on {channel}, retrying in {delay:.1f}s: {str(e)}")
+                else:
+                    logger.exception(f"Outbound worker error on {channel}, retrying in {delay:.1f}s")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except sqlite3.Error:
+                        pass
+                    conn = None
+                self._stopping.wait(delay)
+                continue
+            timeout = 5.0 if next_due is None else max(0.0, min(5.0, next_due - time.time()))
+            wakeup.wait(timeout)
+            wakeup.clear()
+        if conn is not None:
+            conn.close()
+
+    def recover(self):
+        """
+        Return jobs left in progress by a crash to the pending state. Only jobs claimed more than
+        OUTBOUND_LEASE_SECONDS ago are reset, so jobs being run by another process sharing the
+        database (e.g. check_emails.py next to the web app) are left alone.
+        """
+        cutoff = datetime.fromtimestamp(time.time() - Config.OUTBOUND_LEASE_SECONDS).isoformat(timespec="seconds")
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', next_attempt_at = ?, updated_at = ? WHERE status = 'in_progress' AND updated_at < ?",
+                (time.time(), self._now(), cutoff)
+            )
+            if cursor.rowcount:
+                logger.info(f"Recovered {cursor.rowcount} interrupted outbound jobs")
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def purge(self, older_than_days=None):
+        """Delete finished jobs (and latency records) older than the retention period."""
+        days = older_than_days if older_than_days is not None else Config.OUTBOUND_RETENTION_DAYS
+        cutoff = datetime.fromtimestamp(time.time() - days * 86400).isoformat(timespec="seconds")
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM reply_latency WHERE delivered_at < ?", (time.time() - days * 86400,))
+            return conn.execute("DELETE FROM jobs WHERE status = 'done' AND updated_at < ?", (cutoff,)).rowcount
+        finally:
+            conn.close()
+
+    def record_latency(self, channel, received_at):
+        """
+        Record that a reply to a message received at received_at (a timestamp) was delivered now.
+        It is called after the reply has gone out, from the job that sent it, so it never raises:
+        a failed job would be retried and send the reply again.
+        """
+        if not received_at:
+            return
+        delivered_at = time.time()
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT INTO reply_latency (channel, received_at, delivered_at) VALUES (?, ?, ?)",
+                    (channel, received_at, delivered_at)
+                )
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"Could not record {channel} reply latency: {str(e)}")
+            return
+        logger.info(f"{channel} reply delivered {delivered_at - received_at:.1f}s after the message was received")
+
+    def latency(self, since_seconds=86400):
+        """Receipt-to-reply latency per channel over the last since_seconds: count, median, p95 and max in seconds."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT channel, delivered_at - received_at FROM reply_latency WHERE delivered_at >= ? ORDER BY 1, 2",
+                (time.time() - since_seconds,)
+            ).fetchall()
+        finally:
+            conn.close()
+        by_channel = {}
+        for channel, seconds in rows:
+            by_channel.setdefault(channel, []).append(seconds)
+        return {
+            channel: {
+                "count": len(values),
+                "p50": round(values[len(values) // 2], 2),
+                "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+                "max": round(values[-1], 2)
+            }
+            for channel, values in by_channel.items()
+        }
+
+    def start(self, channels):
+        """Start the worker threads for the given channels (e.g. ["email", "sms", "whatsapp"])."""
+        self.recover()
+        self.purge()
+        self._stopping.clear()
+        for channel in channels:
+            with self._lock:
+                if channel in self._wakeups:
+                    continue
+                wakeup = self._wakeups[channel] = threading.Event()
+            for number in range(self.workers_per_channel):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    args=(channel, wakeup),
+                    name=f"outbound-{channel}-{number + 1}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        with self._lock:
+            events = list(self._wakeups.values())
+            self._wakeups.clear()
+        for event in events:
+            event.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def stats(self):
+        """Job counts by channel and status, the number of dead letters and the reply latency of the last day."""
+        conn = self._connect()
+        try:
+            counts = {}
+            for row in conn.execute("SELECT channel, status, COUNT(*) FROM jobs GROUP BY channel, status"):
+                counts.setdefault(row[0], {})[row[1]] = row[2]
+            dead = conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        finally:
+            conn.close()
+        return {"jobs": counts, "dead_letters": dead, "latency": self.latency()}
+
+    def dead_letters(self, limit=50):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM dead_letters ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            return [dict(row, payload=json.loads(row["payload"])) for row in rows]
+        finally:
+            conn.close()
+
+    def retry_dead_letter(self, dead_letter_id):
+        """Put a dead-lettered job back in the queue with a fresh attempt count. Returns True if it was found."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM dead_letters WHERE id = ?", (dead_letter_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                (time.time(), self._now(), row["job_id"])
+            )
+            conn.execute("DELETE FROM dead_letters WHERE id = ?", (dead_letter_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        self._wake(row["channel"])
+        return True
+
+_shared_queue = None
+_shared_lock = threading.Lock()
+
+def get_outbound_queue():
+    """The process-wide outbound queue."""
+    global _shared_queue
+    with _shared_lock:
+        if _shared_queue is None:
+            _shared_queue = OutboundQueue()
+        return _shared_queue
@@ -0,0 +1,215 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pdfkit
+from config.config import Config
+from services.artifact_store import get_artifact_store
+
+logger = logging.getLogger(__name__)
+
+class PdfBuilder:
+    """
+    Builds PDF versions of the HTML menus with a persistent, bounded pool of render workers.
+
+    Each worker runs wkhtmltopdf for one menu at a time, so at most max_workers conversions
+    run in parallel. A PDF is stale when the hash of its HTML source differs from the hash
+    recorded in attachments/pdf_manifest.json when it was built. Finished PDFs are written
+    to a temporary file and swapped in with os.replace, so readers never see a partial file.
+
+    Built PDFs are also kept in the ArtifactStore next to the HTML version they came from,
+    so a PDF for HTML that was converted before is copied from the store instead of re-rendered.
+    """
+
+    OPTIONS = {
+        'quiet': '',
+        'enable-local-file-access': None,
+        'encoding': 'UTF-8'
+    }
+
+    def __init__(self, attachments_dir="attachments", max_workers=None, wkhtmltopdf_path=None):
+        self.attachments_dir = attachments_dir
+        self.manifest_path = os.path.join(attachments_dir, "pdf_manifest.json")
+        self.max_workers = max_workers or Config.PDF_WORKERS
+        self.wkhtmltopdf_path = wkhtmltopdf_path or self.find_wkhtmltopdf()
+        self._configuration = None
+        self._executor = None
+        self._lock = threading.RLock()
+        self._in_flight = {}
+        self.artifact_store = get_artifact_store(os.path.join(attachments_dir, "artifacts"), attachments_dir)
+
+    @staticmethod
+    def find_wkhtmltopdf():
+        """Return the wkhtmltopdf executable from WKHTMLTOPDF_PATH or the PATH (None if not found)."""
+        if Config.WKHTMLTOPDF_PATH:
+            return Config.WKHTMLTOPDF_PATH
+        return shutil.which("wkhtmltopdf") or shutil.which("wkhtmltopdf.exe")
+
+    @property
+    def available(self):
+        return bool(self.wkhtmltopdf_path)
+
+    @property
+    def configuration(self):
+        if self._configuration is None:
+            if not self.wkhtmltopdf_path:
+                raise RuntimeError("wkhtmltopdf not found; install it or set WKHTMLTOPDF_PATH")
+            self._configuration = pdfkit.configuration(wkhtmltopdf=self.wkhtmltopdf_path)
+        return self._configuration
+
+    @property
+    def executor(self):
+        """The worker pool, started on first use and kept for the life of the process."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pdf-render")
+        return self._executor
+
+    def load_manifest(self):
+        """Load the source hashes of the PDFs built so far."""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(temp_path, self.manifest_path)
+
+    def _record_build(self, pdf_name, source_hash):
+        with self._lock:
+            manifest = self.load_manifest()
+            manifest[pdf_name] = {
+                "source_hash": source_hash,
+                "built_at": datetime.now().isoformat(timespec="seconds")
+            }
+            self._save_manifest(manifest)
+
+    @staticmethod
+    def _file_hash(path):
+        with open(path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+
+    def _paths(self, menu_file):
+        """Return (html_path, pdf_path, pdf_name) for a menu given as "wine_list", "wine_list.html" or "wine_list.pdf"."""
+        base_name = os.path.splitext(os.path.basename(menu_file))[0]
+        return (
+            os.path.join(self.attachments_dir, f"{base_name}.html"),
+            os.path.join(self.attachments_dir, f"{base_name}.pdf"),
+            f"{base_name}.pdf"
+        )
+
+    def is_stale(self, menu_file, manifest=None):
+        """True if the menu's PDF is missing or was built from different HTML than the current file."""
+        html_path, pdf_path, pdf_name = self._paths(menu_file)
+        if not os.path.exists(html_path):
+            return False
+        if not os.path.exists(pdf_path):
+            return True
+        manifest = self.load_manifest() if manifest is None else manifest
+        return manifest.get(pdf_name, {}).get("source_hash") != self._file_hash(html_path)
+
+    def html_menus(self):
+        """All HTML menu files in the attachments directory."""
+        if not os.path.isdir(self.attachments_dir):
+            return []
+        return sorted(name for name in os.listdir(self.attachments_dir) if name.endswith(".html"))
+
+    def stale_menus(self, menu_files=None):
+        """The menu files (from attachments/*.html by default) whose PDFs need rebuilding."""
+        if menu_files is None:
+            menu_files = self.html_menus()
+        manifest = self.load_manifest()
+        return [menu_file for menu_file in menu_files if self.is_stale(menu_file, manifest)]
+
+    def _render(self, html_path, pdf_path, pdf_name, force=False):
+        """Convert one menu. Runs on a pool worker."""
+        try:
+            source_hash = self._file_hash(html_path)
+            version = self.artifact_store.find_version(pdf_name, "html", source_hash)
+            if not force and version and self.artifact_store.has(pdf_name, version, "pdf"):
+                self.artifact_store.update_alias(pdf_name, version, "pdf")
+                self._record_build(pdf_name, source_hash)
+                logger.info(f"Reused stored {pdf_name}")
+                return True
+
+            temp_path = f"{pdf_path}.tmp"
+            pdfkit.from_file(html_path, temp_path, options=self.OPTIONS, configuration=self.configuration)
+            if version:
+                self.artifact_store.put_file(pdf_name, version, temp_path, "pdf")
+            os.replace(temp_path, pdf_path)
+            self._record_build(pdf_name, source_hash)
+            logger.info(f"Built {pdf_name}")
+            return True
+        except Exception as e:
+            logger.error(f"Error converting {html_path} to PDF: {str(e)}")
+            if os.path.exists(f"{pdf_path}.tmp"):
+                os.remove(f"{pdf_path}.tmp")
+            return False
+        finally:
+            with self._lock:
+                self._in_flight.pop(pdf_name, None)
+
+    def submit(self, menu_file, force=False):
+        """Queue a conversion, reusing the pending one if this menu is already being built."""
+        html_path, pdf_path, pdf_name = self._paths(menu_file)
+        with self._lock:
+            future = self._in_flight.get(pdf_name)
+            if future is None:
+                future = self.executor.submit(self._render, html_path, pdf_path, pdf_name, force)
+                self._in_flight[pdf_name] = future
+        return future
+
+    def build(self, menu_files=None, wait=False, timeout=None, force=False):
+        """
+        Convert the stale menus (all of attachments/*.html by default) in parallel; force rebuilds them all.
+        Returns {pdf_name: future}, or {pdf_name: success} when wait is True.
+        """
+        if force:
+            menu_files = [
+                menu_file for menu_file in (self.html_menus() if menu_files is None else menu_files)
+                if os.path.exists(self._paths(menu_file)[0])
+            ]
+        else:
+            menu_files = self.stale_menus(menu_files)
+        futures = {self._paths(menu_file)[2]: self.submit(menu_file, force) for menu_file in menu_files}
+        if not wait:
+            return futures
+        return {pdf_name: future.result(timeout=timeout) for pdf_name, future in futures.items()}
+
+    def ensure_pdf(self, menu_file, timeout=60):
+        """
+        Return the path of an up-to-date PDF for a menu, building it first if it is stale.
+        Falls back to the existing (stale) PDF if the build fails, or None if there is no PDF.
+        """
+        html_path, pdf_path, _ = self._paths(menu_file)
+        if self.available and self.is_stale(menu_file):
+            try:
+                self.submit(menu_file).result(timeout=timeout)
+            except Exception as e:
+                logger.error(f"Error building PDF for {menu_file}: {str(e)}")
+        return pdf_path if os.path.exists(pdf_path) else None
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+_shared_pdf_builder = None
+_shared_lock = threading.Lock()
+
+def get_pdf_builder():
+    """The process-wide PDF builder, so exports and email replies share one worker pool."""
+    global _shared_pdf_builder
+    with _shared_lock:
+        if _shared_pdf_builder is None:
+            _shared_pdf_builder = PdfBuilder()
+        return _shared_pdf_builder
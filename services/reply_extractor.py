@@ -0,0 +1,151 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ReplyExtractor:
+    """
+    Extracts the newest reply from an email body, dropping quoted history, attribution
+    lines ("On ... wrote:"), forwarded headers and mobile client footers.
+
+    All boundary rules are compiled into one alternation behind a shared "\\n" prefix, so a
+    single scan finds the earliest boundary of any kind: the leftmost match of an alternation
+    is the earliest position at which any of its rules matches, and the regex engine only
+    tries the rules at line starts. Quoted ("> ") lines are only walked line by line when a
+    quick scan shows there are any. Tracing goes to DEBUG and is skipped entirely unless
+    debug logging is enabled.
+
+    For an email that answers a thread whose earlier messages are already in the
+    conversation store (known_thread=True), the quoted history adds nothing, so extraction
+    is more aggressive: quoted lines are always dropped and the earliest boundary is trusted
+    even when little text is left above it.
+    """
+
+    # (name, pattern) pairs; every pattern matches from the newline that starts the boundary
+    BOUNDARY_RULES = [
+        # Standard email client quote patterns
+        ("attribution", r'On .*wrote:'),
+        ("wrapped_attribution", r'On .*\n.*wrote:'),
+        ("original_message", r'-+Original Message-+'),
+        ("forwarded", r'-+Forwarded message-+'),
+        ("outlook_headers", r'From:.*\nSent:.*\nTo:.*\nSubject:'),
+        # Joline's own signature, i.e. the start of her quoted previous reply
+        ("joline_signature", r'Warm regards,\nJoline\n'),
+        ("joline_footer", r'--\nJoline \| Restaurant Sales Assistant'),
+        # Date-based attribution lines without "wrote:"
+        ("numeric_date", r'On \d{1,2}/\d{1,2}/\d{2,4}'),
+        ("long_date", r'On \w+, \w+ \d{1,2}, \d{4} at \d{1,2}:\d{2} [AP]M'),
+        # Common delimiters
+        ("hyphens", r'-{3,}'),
+        ("underscores", r'_{3,}'),
+        ("asterisks", r'\*{3,}'),
+        # Mobile client footers
+        ("iphone", r'Sent from my iPhone'),
+        ("android", r'Sent from my Android'),
+    ]
+
+    BOUNDARY = re.compile(r'\n(?:' + "|".join(f"(?P<{name}>{pattern})" for name, pattern in BOUNDARY_RULES) + ")")
+    QUOTED_LINE = re.compile(r'^\s*>', re.MULTILINE)
+    PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+    SIGNATURE_INDICATORS = ('kind regards', 'regards', 'thanks', 'thank you', 'cheers', 'sincerely', 'best wishes')
+
+    def _trace(self, message, *args):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(message, *args)
+
+    def find_boundary(self, text):
+        """The earliest quote boundary in text as (position, rule name), or None."""
+        match = self.BOUNDARY.search(text)
+        return (match.start(), match.lastgroup) if match else None
+
+    def _strip_quoted_lines(self, email_text):
+        """Drop "> " lines and the blank lines that follow them. Returns (text, ended_in_quote)."""
+        non_quoted_lines = []
+        found_quoted = False
+        for line in email_text.split('\n'):
+            if line.strip().startswith('>'):
+                found_quoted = True
+                continue
+            # Skip empty lines right after quoted content
+            if found_quoted and not line.strip():
+                continue
+            found_quoted = False
+            non_quoted_lines.append(line)
+        return '\n'.join(non_quoted_lines).strip(), found_quoted
+
+    def extract(self, email_text, known_thread=False):
+        """Return only the latest reply content of an email thread."""
+        # If the email is very short, it's likely just a new message
+        if len(email_text) < 100:
+            return email_text.strip()
+
+        if known_thread:
+            extracted = self._extract_known_thread(email_text)
+            if extracted:
+                return extracted
+
+        # Quoted lines (starting with >) mark the previous messages in most clients
+        if self.QUOTED_LINE.search(email_text):
+            extracted, found_quoted = self._strip_quoted_lines(email_text)
+            if found_quoted and len(extracted) > 20:
+                # The attribution line above the quote isn't quoted itself
+                boundary = self.find_boundary(extracted)
+                if boundary and len(extracted[:boundary[0]].strip()) >= 10:
+                    extracted = extracted[:boundary[0]].strip()
+                self._trace("Extracted reply by quoted lines (%d chars)", len(extracted))
+                return extracted
+
+        boundary = self.find_boundary(email_text)
+        if boundary:
+            position, rule = boundary
+            new_content = email_text[:position].strip()
+            self._trace("Found quote boundary %s at position %d", rule, position)
+            # If we have very little content, we might have been too aggressive
+            if len(new_content) < 10:
+                paragraphs = self.PARAGRAPH_BREAK.split(email_text)
+                if paragraphs and len(paragraphs[0]) > 10:
+                    self._trace("Boundary left too little text; using the first paragraph")
+                    return paragraphs[0].strip()
+            return new_content
+
+        # No boundary: keep the paragraphs before any HTML part, or all non-signature paragraphs
+        paragraphs = self.PARAGRAPH_BREAK.split(email_text)
+        html_content_index = -1
+        for i, para in enumerate(paragraphs):
+            if '[HTML_CONTENT]' in para:
+                html_content_index = i
+                break
+
+        if html_content_index > 0:
+            self._trace("Using the %d paragraphs before the HTML part", html_content_index)
+            return '\n\n'.join(paragraphs[:html_content_index]).strip()
+
+        if len(paragraphs) > 1:
+            content_paragraphs = []
+            for para in paragraphs:
+                para_lower = para.lower().strip()
+                # Skip if it's just a signature line
+                if len(para_lower) < 30 and any(indicator in para_lower for indicator in self.SIGNATURE_INDICATORS):
+                    continue
+                content_paragraphs.append(para)
+            return '\n\n'.join(content_paragraphs).strip()
+
+        return email_text.strip()
+
+    def _extract_known_thread(self, email_text):
+        """The reply above any quoted history, or None if there is none (so the usual rules apply)."""
+        quoted = self.QUOTED_LINE.search(email_text)
+        extracted = self._strip_quoted_lines(email_text)[0] if quoted else email_text.strip()
+        boundary = self.find_boundary(extracted)
+        if boundary:
+            self._trace("Known thread: cutting at %s", boundary[1])
+            extracted = extracted[:boundary[0]].strip()
+        elif not quoted:
+            return None
+        return extracted
+
+_shared_extractor = ReplyExtractor()
+
+def extract_latest_reply(email_text, known_thread=False):
+    """Extract the latest reply from an email body with the shared extractor."""
+    return _shared_extractor.extract(email_text, known_thread)
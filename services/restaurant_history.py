@@ -0,0 +1,301 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import contextlib
+from datetime import datetime
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+class RestaurantDataHistory:
+    """
+    Versioned history of restaurant_data.json.
+
+    Every version is a small tree of content hashes: one object per menu section plus
+    the specials, restaurant info and remaining top-level fields. Objects are stored once
+    under history/objects/ and shared by every version that contains them, so a version
+    that changes one price only adds that section's object and one line to versions.jsonl.
+    The training history is an audit trail rather than menu data and is not versioned.
+
+    The web app and the nightly scraper both record versions, so versions.jsonl is re-read
+    whenever its size or modification time changes, and a new version number is allocated
+    from the file's tail under an exclusive lock on history/versions.lock. Recently used
+    objects are kept in an LRU of object_cache_size entries.
+    """
+
+    UNVERSIONED_KEYS = ("training_history", "last_updated")
+
+    def __init__(self, history_dir="history", object_cache_size=256):
+        self.history_dir = history_dir
+        self.objects_dir = os.path.join(history_dir, "objects")
+        self.versions_path = os.path.join(history_dir, "versions.jsonl")
+        self.lock_path = os.path.join(history_dir, "versions.lock")
+        self.object_cache_size = object_cache_size
+        self._object_cache = OrderedDict()
+        self._versions = []
+        self._by_number = {}
+        self._versions_stat = None
+        self._lock = threading.RLock()
+
+    def _ensure_dirs(self):
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared with the other processes recording versions."""
+        os.makedirs(self.history_dir, exist_ok=True)
+        with open(self.lock_path, "a+b") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @property
+    def versions(self):
+        """All version records, oldest first (re-read when versions.jsonl changes on disk)."""
+        return self._load_versions()
+
+    def _load_versions(self):
+        with self._lock:
+            try:
+                stat = os.stat(self.versions_path)
+                current = (stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                current = None
+            if current != self._versions_stat:
+                versions = []
+                if current is not None:
+                    with open(self.versions_path, "r", encoding="utf-8") as file:
+                        for line in file:
+                            line = line.strip()
+                            if line:
+                                try:
+                                    versions.append(json.loads(line))
+                                except json.JSONDecodeError:
+                                    # A line still being appended by another process
+                                    logger.warning(f"Skipped unreadable line in {self.versions_path}")
+                self._versions = versions
+                self._by_number = {record["version"]: record for record in versions}
+                self._versions_stat = current
+            return self._versions
+
+    def _put_object(self, obj):
+        """Store an object by content hash and return the hash."""
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        object_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = object_hash in self._object_cache
+            if cached:
+                self._object_cache.move_to_end(object_hash)
+        if not cached:
+            path = os.path.join(self.objects_dir, f"{object_hash}.json")
+            if not os.path.exists(path):
+                self._ensure_dirs()
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    file.write(text)
+                os.replace(temp_path, path)
+            # Cache a private copy so later in-place edits of the live data can't change it
+            self._cache_object(object_hash, json.loads(text))
+        return object_hash
+
+    def _cache_object(self, object_hash, obj):
+        with self._lock:
+            self._object_cache[object_hash] = obj
+            self._object_cache.move_to_end(object_hash)
+            while len(self._object_cache) > self.object_cache_size:
+                self._object_cache.popitem(last=False)
+
+    def _get_object(self, object_hash):
+        """Load an object by hash (recently used objects are cached)."""
+        with self._lock:
+            obj = self._object_cache.get(object_hash)
+            if obj is not None:
+                self._object_cache.move_to_end(object_hash)
+                return obj
+        with open(os.path.join(self.objects_dir, f"{object_hash}.json"), "r", encoding="utf-8") as file:
+            obj = json.load(file)
+        self._cache_object(object_hash, obj)
+        return obj
+
+    def _build_tree(self, restaurant_data):
+        """Split restaurant data into content-addressed parts."""
+        meta = {
+            key: value for key, value in restaurant_data.items()
+            if key not in self.UNVERSIONED_KEYS and key not in ("menu_sections", "specials", "restaurant_info")
+        }
+        return {
+            "sections": [self._put_object(section) for section in restaurant_data.get("menu_sections", [])],
+            "specials": self._put_object(restaurant_data.get("specials", [])),
+            "restaurant_info": self._put_object(restaurant_data.get("restaurant_info", {})),
+            "meta": self._put_object(meta)
+        }
+
+    def latest_version(self):
+        """The newest version record, or None if there is no history yet."""
+        return self.versions[-1] if self.versions else None
+
+    def snapshot(self, restaurant_data, message="", source="training"):
+        """
+        Record a new version if the data differs from the latest version.
+        Returns the new version number, or None if nothing changed.
+        """
+        try:
+            with self._lock:
+                tree = self._build_tree(restaurant_data)
+                with self._file_lock():
+                    # Another process may have recorded versions since they were last read
+                    latest = self.latest_version()
+                    if latest and latest["tree"] == tree:
+                        return None
+
+                    record = {
+                        "version": latest["version"] + 1 if latest else 1,
+                        "timestamp": datetime.now().isoformat(timespec="seconds"),
+                        "source": source,
+                        "message": message,
+                        "tree": tree
+                    }
+                    self._ensure_dirs()
+                    with open(self.versions_path, "a", encoding="utf-8") as file:
+                        file.write(json.dumps(record) + "\n")
+                return record["version"]
+        except Exception as e:
+            logger.error(f"Failed to record restaurant data version: {str(e)}")
+            return None
+
+    def get_record(self, version):
+        """Return the record for a version number."""
+        with self._lock:
+            self._load_versions()
+            record = self._by_number.get(version) if isinstance(version, int) else None
+        if record is None:
+            raise KeyError(f"Unknown version: {version}")
+        return record
+
+    def get_version(self, version):
+        """Materialize the restaurant data (without training history) stored in a version."""
+        tree = self.get_record(version)["tree"]
+        data = json.loads(json.dumps(self._get_object(tree["meta"])))
+        data["menu_sections"] = [json.loads(json.dumps(self._get_object(object_hash))) for object_hash in tree["sections"]]
+        data["specials"] = json.loads(json.dumps(self._get_object(tree["specials"])))
+        data["restaurant_info"] = json.loads(json.dumps(self._get_object(tree["restaurant_info"])))
+        return data
+
+    def list_versions(self, limit=20):
+        """The most recent version records, newest first."""
+        return [
+            {key: record[key] for key in ("version", "timestamp", "source", "message")}
+            for record in reversed(self.versions[-limit:])
+        ]
+
+    def _item_map(self, section):
+        """Map item names (prefixed by wine subsection, if any) to items for a section object."""
+        items = {}
+        for item in section.get("items", []):
+            if isinstance(item, dict) and "items" in item:
+                for subitem in item["items"]:
+                    items[f"{item.get('name', '')} / {subitem.get('name', '')}"] = subitem
+            elif isinstance(item, dict):
+                items[item.get("name", "")] = item
+        return items
+
+    def _diff_items(self, section_name, old_items, new_items):
+        changes = []
+        for name, item in new_items.items():
+            if name not in old_items:
+                changes.append({"type": "item_added", "section": section_name, "name": name, "item": item})
+            elif item != old_items[name]:
+                fields = {
+                    key: {"old": old_items[name].get(key), "new": item.get(key)}
+                    for key in sorted(set(item) | set(old_items[name]))
+                    if item.get(key) != old_items[name].get(key)
+                }
+                changes.append({"type": "item_changed", "section": section_name, "name": name, "fields": fields})
+        for name, item in old_items.items():
+            if name not in new_items:
+                changes.append({"type": "item_removed", "section": section_name, "name": name, "item": item})
+        return changes
+
+    def diff(self, from_version, to_version):
+        """
+        List the changes between two versions. Only sections whose hashes differ are compared.
+        """
+        old_tree = self.get_record(from_version)["tree"]
+        new_tree = self.get_record(to_version)["tree"]
+        changes = []
+
+        if old_tree["sections"] != new_tree["sections"]:
+            old_sections = {self._get_object(h)["name"]: h for h in old_tree["sections"]}
+            new_sections = {self._get_object(h)["name"]: h for h in new_tree["sections"]}
+            for name, object_hash in new_sections.items():
+                if name not in old_sections:
+                    changes.append({"type": "section_added", "section": name})
+                    changes.extend(self._diff_items(name, {}, self._item_map(self._get_object(object_hash))))
+                elif object_hash != old_sections[name]:
+                    changes.extend(self._diff_items(
+                        name,
+                        self._item_map(self._get_object(old_sections[name])),
+                        self._item_map(self._get_object(object_hash))
+                    ))
+            for name, object_hash in old_sections.items():
+                if name not in new_sections:
+                    changes.append({"type": "section_removed", "section": name})
+
+        for part in ("specials", "restaurant_info", "meta"):
+            if old_tree[part] != new_tree[part]:
+                changes.append({
+                    "type": f"{part}_changed",
+                    "old": self._get_object(old_tree[part]),
+                    "new": self._get_object(new_tree[part])
+                })
+        return changes
+
+    @staticmethod
+    def format_diff(changes):
+        """Format a list of changes as readable lines."""
+        if not changes:
+            return "No differences."
+        lines = []
+        for change in changes:
+            if change["type"] == "item_changed":
+                fields = ", ".join(f"{key}: {value['old']} -> {value['new']}" for key, value in change["fields"].items())
+                lines.append(f"~ {change['section']}: {change['name']} ({fields})")
+            elif change["type"] == "item_added":
+                lines.append(f"+ {change['section']}: {change['name']}")
+            elif change["type"] == "item_removed":
+                lines.append(f"- {change['section']}: {change['name']}")
+            elif change["type"] == "section_added":
+                lines.append(f"+ Section {change['section']}")
+            elif change["type"] == "section_removed":
+                lines.append(f"- Section {change['section']}")
+            else:
+                lines.append(f"~ {change['type'].replace('_changed', '').replace('_', ' ')} changed")
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_versions(records):
+        """Format version records as readable lines."""
+        if not records:
+            return "No versions recorded yet."
+        return "\n".join(
+            f"v{record['version']}  {record['timestamp']}  [{record['source']}] {record['message']}"
+            for record in records
+        )
@@ -0,0 +1,148 @@
+import re
+import logging
+import unicodedata
+from collections import namedtuple
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+# GSM 03.38 default alphabet (one septet each) and its extension table (escape + septet)
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = set("^{}\\[]~|€\f")
+
+# Characters models like to produce that have a close GSM-7 equivalent
+GSM7_SUBSTITUTES = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "`": "'", "´": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"', "«": '"', "»": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-", "−": "-",
+    "•": "-", "·": "-",
+    "…": "...",
+    "\u00a0": " ", "\u2009": " ", "\u200a": " ", "\u202f": " ", "\t": " ",
+    "\u200b": "", "\u200c": "", "\u200d": "", "\ufeff": "",
+    "ç": "Ç", "×": "x", "©": "(c)", "®": "(R)", "™": "TM",
+}
+
+SmsMeasure = namedtuple("SmsMeasure", ["encoding", "units", "segments"])
+
+class SmsComposer:
+    """
+    Fits replies into a fixed number of SMS segments.
+
+    A GSM-7 message holds 160 septets, or 153 per segment once it is split (the rest is the
+    concatenation header); extension characters such as € and [ take two septets and are
+    never split across segments. One character outside GSM-7 (an emoji, or the "À" of
+    "À La Carte") switches the whole message to UCS-2: 70 UTF-16 units, or 67 per segment.
+    measure() counts segments exactly as carriers do.
+
+    compose() first replaces characters that have a GSM-7 equivalent (curly quotes, dashes,
+    accented capitals), keeping the original when something without one (an emoji) would
+    force UCS-2 anyway. A text that still needs more than max_segments segments is cut back
+    to its last sentence that fits rather than at a fixed character count. budget_prompt()
+    is the instruction that steers generation toward target_segments in the first place.
+    """
+
+    SENTENCE_END = re.compile(r'[.!?](?=\s)|\n')
+
+    def __init__(self, max_segments=None, target_segments=None):
+        self.max_segments = max_segments or Config.SMS_MAX_SEGMENTS
+        self.target_segments = min(target_segments or Config.SMS_TARGET_SEGMENTS, self.max_segments)
+
+    @staticmethod
+    def is_gsm7(text):
+        return all(char in GSM7_BASIC or char in GSM7_EXTENDED for char in text)
+
+    @staticmethod
+    def measure(text):
+        """The encoding of text, its length in septets or UTF-16 units, and its number of segments."""
+        if SmsComposer.is_gsm7(text):
+            encoding, single, multi = "GSM-7", 160, 153
+            sizes = [2 if char in GSM7_EXTENDED else 1 for char in text]
+        else:
+            encoding, single, multi = "UCS-2", 70, 67
+            sizes = [2 if ord(char) > 0xFFFF else 1 for char in text]
+        units = sum(sizes)
+        if units <= single:
+            return SmsMeasure(encoding, units, 1)
+        segments, used = 1, 0
+        for size in sizes:
+            if used + size > multi:
+                segments += 1
+                used = 0
+            used += size
+        return SmsMeasure(encoding, units, segments)
+
+    @staticmethod
+    def to_gsm7(text):
+        """Replace characters that have a GSM-7 equivalent. Characters without one are left as they are."""
+        result = []
+        for char in text:
+            if char in GSM7_BASIC or char in GSM7_EXTENDED:
+                result.append(char)
+            elif char in GSM7_SUBSTITUTES:
+                result.append(GSM7_SUBSTITUTES[char])
+            else:
+                # Accented letters outside GSM-7 lose their accent (À -> A, ê -> e)
+                base = "".join(part for part in unicodedata.normalize("NFKD", char) if not unicodedata.combining(part))
+                result.append(base if base and SmsComposer.is_gsm7(base) else char)
+        return "".join(result)
+
+    def normalize(self, text):
+        """Trim the text, collapse blank lines and spaces, and move it to GSM-7 if that makes it fit the alphabet."""
+        text = re.sub(r'\n\s*\n+', '\n', text.strip())
+        text = re.sub(r'[ \t]+', ' ', text)
+        substituted = self.to_gsm7(text)
+        return substituted if self.is_gsm7(substituted) else text
+
+    def fits(self, text):
+        return self.measure(text).segments <= self.max_segments
+
+    def compose(self, text, suffix=""):
+        """
+        The reply as it should be sent: normalized and cut back at a sentence boundary to at
+        most max_segments segments. suffix (e.g. menu links) is appended and always kept.
+        """
+        text = self.normalize(text)
+        suffix = self.normalize(suffix) if suffix else ""
+
+        def join(body):
+            return f"{body}\n{suffix}" if body and suffix else body or suffix
+
+        composed = join(text)
+        if self.fits(composed):
+            return composed
+
+        # Nothing longer than this can fit, so longer candidates aren't measured
+        longest = 160 * self.max_segments
+        for match in reversed(list(self.SENTENCE_END.finditer(text, 0, longest))):
+            candidate = join(text[:match.end()].strip())
+            if self.fits(candidate):
+                self._log_cut(text, candidate)
+                return candidate
+
+        # Not even the first sentence fits: cut it at a word
+        words = text[:longest].split(" ")
+        while len(words) > 1:
+            words.pop()
+            candidate = join(" ".join(words).rstrip(",;:") + "...")
+            if self.fits(candidate):
+                self._log_cut(text, candidate)
+                return candidate
+        return suffix if self.fits(suffix) else suffix[:153 * self.max_segments]
+
+    def _log_cut(self, text, composed):
+        measure = self.measure(composed)
+        logger.info(
+            f"SMS reply cut from {len(text)} to {len(composed)} characters "
+            f"({measure.segments} {measure.encoding} segments)"
+        )
+
+    def budget_prompt(self):
+        """Instruction for the model that keeps replies within target_segments GSM-7 segments."""
+        characters = 160 if self.target_segments == 1 else 153 * self.target_segments
+        return (
+            f"Keep the whole reply under {characters} characters. Use plain text only: "
+            f"no emoji, no bullet points and no special symbols or accented capitals."
+        )
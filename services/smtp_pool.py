@@ -0,0 +1,180 @@
+import ssl
+import time
+import queue
+import atexit
+import socket
+import smtplib
+import logging
+import threading
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class SmtpDeliveryUnknown(smtplib.SMTPException):
+    """The connection failed after the message was handed over (DATA), so it may have been delivered."""
+
+class _Session(smtplib.SMTP):
+    """An SMTP session that records whether the DATA command of the current message has been sent."""
+
+    data_sent = False
+
+    def mail(self, *args, **kwargs):
+        self.data_sent = False
+        return super().mail(*args, **kwargs)
+
+    def data(self, msg):
+        self.data_sent = True
+        return super().data(msg)
+
+class SmtpPool:
+    """
+    Pool of authenticated SMTP sessions that stay open between emails.
+
+    A session is logged in once (STARTTLS + AUTH) and reused for later messages. Before an
+    idle session is reused it is probed with NOOP. Sessions idle longer than idle_timeout
+    are closed, because most providers drop them after a few minutes anyway. If the server
+    has closed a session, or a send times out, before the message's DATA command was sent,
+    the session is replaced and the message is sent again once. After DATA the server may
+    already have accepted it, so the failure is raised as SmtpDeliveryUnknown instead of
+    risking a second copy. At most size sessions are open at a time, which also caps how
+    often new connections are opened during bursts.
+    """
+
+    RETRYABLE_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.timeout, ConnectionError, ssl.SSLError)
+
+    def __init__(self, host=None, port=None, username=None, password=None, size=None,
+                 idle_timeout=None, noop_interval=None, timeout=30):
+        self.host = host or Config.SMTP_SERVER
+        self.port = port or Config.SMTP_PORT
+        self.username = username or Config.EMAIL_ADDRESS
+        self.password = password or Config.EMAIL_PASSWORD
+        self.size = size or Config.SMTP_POOL_SIZE
+        self.idle_timeout = idle_timeout or Config.SMTP_IDLE_TIMEOUT
+        self.noop_interval = noop_interval if noop_interval is not None else Config.SMTP_NOOP_INTERVAL
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def _connect(self):
+        server = _Session(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if server.has_extn("starttls"):
+                server.starttls()
+                server.ehlo()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        logger.info(f"Opened SMTP session to {self.host}:{self.port}")
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _is_alive(self, server, idle_for):
+        """Probe a session that has been idle for a while; recently used sessions are trusted."""
+        if idle_for < self.noop_interval:
+            return True
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self):
+        """An idle session that is still usable, or a new one."""
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            idle_for = time.monotonic() - last_used
+            if idle_for < self.idle_timeout and self._is_alive(server, idle_for):
+                return server
+            self._close(server)
+
+    def _checkin(self, server):
+        if self._closed:
+            self._close(server)
+        else:
+            self._idle.put((server, time.monotonic()))
+
+    def _send_with_retry(self, server, msg):
+        """
+        Send on server, replacing the session once if the server dropped it before DATA.
+        Returns the session in use.
+        """
+        try:
+            server.send_message(msg)
+        except self.RETRYABLE_ERRORS as e:
+            if server.data_sent:
+                raise SmtpDeliveryUnknown(f"SMTP session lost after DATA ({str(e) or type(e).__name__}); the message may have been delivered") from e
+            logger.warning(f"SMTP session lost ({str(e) or type(e).__name__}), reconnecting")
+            self._close(server)
+            server = self._connect()
+            server.send_message(msg)
+        return server
+
+    def send(self, msg):
+        """Send one message on a pooled session. Errors other than a session lost before DATA are raised."""
+        result = self.send_many([msg])[0]
+        if result is not True:
+            raise result
+
+    def send_many(self, messages):
+        """
+        Send queued messages back to back on one session, so a batch costs one login at most.
+        Returns a list with True or the exception for each message, in order.
+        """
+        results = []
+        server = None
+        with self._slots:
+            for msg in messages:
+                try:
+                    if server is None:
+                        server = self._checkout()
+                    server = self._send_with_retry(server, msg)
+                    results.append(True)
+                except smtplib.SMTPRecipientsRefused as e:
+                    # Only this message failed; the session is still fine
+                    results.append(e)
+                except Exception as e:
+                    results.append(e)
+                    # The session state is unknown after other errors; the next message gets a new one
+                    if server is not None:
+                        self._close(server)
+                        server = None
+            if server is not None:
+                self._checkin(server)
+        return results
+
+    def close(self):
+        """Close every idle session."""
+        self._closed = True
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(server)
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+def get_smtp_pool():
+    """The process-wide SMTP pool for the configured account."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = SmtpPool()
+            atexit.register(_shared_pool.close)
+        return _shared_pool
@@ -6,6 +6,12 @@ from services.openai_service import OpenAIService
 from config.restaurant_config import RestaurantConfig
 from services.restaurant_knowledge_base import RestaurantKnowledgeBase
 from services.menu_html_generator import MenuHtmlGenerator
+from services.bulk_menu_import import BulkMenuImporter
+from services.menu_index import MenuItemIndex
+from services.restaurant_history import RestaurantDataHistory
+from services.update_log import get_update_log
+from services.training_intent_parser import TrainingIntentParser
+from services.pdf_builder import get_pdf_builder
 
 class TrainingChat:
     """
@@ -19,8 +25,12 @@ class TrainingChat:
         self.restaurant_config = RestaurantConfig()
         self.knowledge_base = RestaurantKnowledgeBase()
         self.restaurant_data_path = "restaurant_data.json"
-        self.updates_log_path = "restaurant_updates.log"
+        self.update_log = get_update_log()
         self.menu_html_generator = MenuHtmlGenerator(self.restaurant_data_path)
+        self.bulk_importer = BulkMenuImporter(self)
+        self.item_index = MenuItemIndex()
+        self.history = RestaurantDataHistory()
+        self.intent_parser = TrainingIntentParser(self)
         self.load_restaurant_data()
         
     def load_restaurant_data(self):
@@ -36,6 +46,9 @@ class TrainingChat:
                 if "specials" not in self.restaurant_data:
                     self.restaurant_data["specials"] = []
                     
+                if "menu_sections" not in self.restaurant_data:
+                    self.restaurant_data["menu_sections"] = []
+                    
                 if "restaurant_info" not in self.restaurant_data:
                     self.restaurant_data["restaurant_info"] = {
                         "name": self.restaurant_data.get("name", "Zevenwacht Restaurant"),
@@ -62,9 +75,20 @@ class TrainingChat:
                 "training_history": []
             }
             self.save_restaurant_data()
+        
+        self.item_index.rebuild(self.restaurant_data["menu_sections"])
+        
+        # Record the data as loaded, so changes made outside training (nightly scrape, hand edits) get a version too
+        self.history.snapshot(self.restaurant_data, "Loaded restaurant data", source="startup")
     
-    def save_restaurant_data(self):
-        """Save the updated restaurant data to the JSON file."""
+    def restore_restaurant_data(self, restaurant_data):
+        """Replace the in-memory restaurant data (e.g. after a rollback) and rebuild the item index."""
+        restaurant_data.setdefault("menu_sections", [])
+        self.restaurant_data = restaurant_data
+        self.item_index.rebuild(restaurant_data["menu_sections"])
+    
+    def save_restaurant_data(self, change_description="Restaurant data updated"):
+        """Save the updated restaurant data to the JSON file and record a new version."""
         # Update the last_updated timestamp
         self.restaurant_data["last_updated"] = datetime.now().isoformat()
         
@@ -72,16 +96,18 @@ class TrainingChat:
         with open(self.restaurant_data_path, 'w') as file:
             json.dump(self.restaurant_data, file, indent=4)
         
+        # Record a version for diff/rollback (no-op if the menu data didn't change)
+        self.history.snapshot(self.restaurant_data, change_description)
+        
         # Log the update
-        self.log_update("Restaurant data updated")
+        self.log_update("Restaurant data updated", event="data_saved", change=change_description)
     
-    def log_update(self, message):
-        """Log updates to the restaurant information."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\n"
-        
-        with open(self.updates_log_path, 'a') as file:
-            file.write(log_entry)
+    def log_update(self, message, event="note", **fields):
+        """
+        Log updates to the restaurant information in the structured update log.
+        fields are stored with the event (item, section, old_price, new_price, ...) and make it queryable.
+        """
+        self.update_log.log(event, message, source="training", **fields)
     
     def has_pending_confirmation(self):
         """Check if there's a pending action that requires confirmation."""
@@ -100,6 +126,9 @@ class TrainingChat:
     
     def process_confirmation(self, user_message):
         """Process a confirmation message from the user."""
+        # Get the pending action first (it's attached to the last assistant message)
+        pending_action = self.get_pending_action()
+        
         # Add message to training history
         self.restaurant_data["training_history"].append({
             "role": "user",
@@ -107,9 +136,6 @@ class TrainingChat:
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         })
         
-        # Get the pending action first
-        pending_action = self.get_pending_action()
-        
         if not pending_action:
             # No pending action found
             response = "I'm sorry, there was no pending action to confirm."
@@ -135,19 +161,10 @@ class TrainingChat:
             return response
         
         # User confirmed, process the pending action
-        
-        # Process the update based on the intent
-        if pending_action["intent"] == "menu_item":
-            self.update_menu_item(pending_action)
-        elif pending_action["intent"] == "price":
-            self.update_price(pending_action)
-        elif pending_action["intent"] == "special":
-            self.update_special(pending_action)
-        elif pending_action["intent"] == "restaurant_info":
-            self.update_restaurant_info(pending_action)
+        self.apply_update(pending_action)
         
         # Save the updated data
-        self.save_restaurant_data()
+        self.save_restaurant_data(pending_action.get("confirmation_message", "Restaurant data updated"))
         
         # Add response to training history
         self.restaurant_data["training_history"].append({
@@ -167,6 +184,15 @@ class TrainingChat:
         if self.has_pending_confirmation():
             return self.process_confirmation(user_message)
         
+        # Multi-line bulk updates skip the per-message intent analysis
+        if self.is_bulk_message(user_message):
+            return self.bulk_import(user_message.strip().partition("\n")[2], content_format="message")
+        
+        # Version history commands: "history", "diff 3 5", "rollback 3"
+        history_response = self.handle_history_command(user_message)
+        if history_response is not None:
+            return history_response
+        
         # Add message to training history
         self.restaurant_data["training_history"].append({
             "role": "user",
@@ -174,28 +200,32 @@ class TrainingChat:
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         })
         
-        # Analyze the message to determine the training intent
-        system_prompt = """
-        You are Joline's training assistant. Your job is to help restaurant owners update Joline's knowledge.
-        Analyze the user's message and determine what information they want to update.
-        Respond with a JSON object containing:
-        1. "intent": The type of update (menu_item, price, special, restaurant_info, other)
-        2. "action": The specific action (add, update, remove)
-        3. "details": Extracted details about the update
-        4. "confirmation_message": A message confirming the update that will be shown to the user
-        5. "confirmation_required": A boolean indicating whether confirmation is required before making the change
-        6. "confirmation_prompt": A message asking for confirmation before making the change
-        """
+        # Formulaic instructions are parsed locally; the LLM is only asked when the local parser can't resolve the message
+        analysis_data = self.intent_parser.parse(user_message)
         
-        analysis = self.openai_service.chat_completion(
-            system_prompt=system_prompt,
-            user_message=user_message,
-            response_format={"type": "json_object"}
-        )
+        if analysis_data is None:
+            # Analyze the message to determine the training intent
+            system_prompt = """
+            You are Joline's training assistant. Your job is to help restaurant owners update Joline's knowledge.
+            Analyze the user's message and determine what information they want to update.
+            Respond with a JSON object containing:
+            1. "intent": The type of update (menu_item, price, special, restaurant_info, other)
+            2. "action": The specific action (add, update, remove)
+            3. "details": Extracted details about the update
+            4. "confirmation_message": A message confirming the update that will be shown to the user
+            5. "confirmation_required": A boolean indicating whether confirmation is required before making the change
+            6. "confirmation_prompt": A message asking for confirmation before making the change
+            """
+            
+            analysis = self.openai_service.chat_completion(
+                system_prompt=system_prompt,
+                user_message=user_message,
+                response_format={"type": "json_object"}
+            )
         
         try:
-            analysis_data = json.loads(analysis)
-            
+            if analysis_data is None:
+                analysis_data = json.loads(analysis)
             # Check if confirmation is required
             if analysis_data.get("confirmation_required", True):
                 # Add confirmation prompt to training history
@@ -210,17 +240,10 @@ class TrainingChat:
                 return analysis_data.get("confirmation_prompt", f"Are you sure you want to {analysis_data['action']} this {analysis_data['intent']}? Please confirm.")
             
             # Process the update based on the intent
-            if analysis_data["intent"] == "menu_item":
-                self.update_menu_item(analysis_data)
-            elif analysis_data["intent"] == "price":
-                self.update_price(analysis_data)
-            elif analysis_data["intent"] == "special":
-                self.update_special(analysis_data)
-            elif analysis_data["intent"] == "restaurant_info":
-                self.update_restaurant_info(analysis_data)
+            self.apply_update(analysis_data)
             
             # Save the updated data
-            self.save_restaurant_data()
+            self.save_restaurant_data(analysis_data.get("confirmation_message", user_message))
             
             # Add response to training history
             self.restaurant_data["training_history"].append({
@@ -243,113 +266,99 @@ class TrainingChat:
             
             return error_message
     
+    def is_bulk_message(self, user_message):
+        """Check if a training message is a multi-line bulk update ("bulk update" followed by one change per line)."""
+        first_line, _, rest = user_message.strip().partition("\n")
+        return first_line.strip().lower().rstrip(":") in ("bulk update", "bulk import", "import") and bool(rest.strip())
+    
+    def bulk_import(self, content, content_format=None, export=True):
+        """
+        Apply a batch of menu changes from CSV, JSON or a multi-line message in one transaction.
+        Returns a text report with the result of every row.
+        """
+        summary = self.bulk_import_summary(content, content_format, export)
+        return BulkMenuImporter.format_report(summary)
+    
+    def bulk_import_summary(self, content, content_format=None, export=True):
+        """Same as bulk_import but returns the structured summary with per-row results."""
+        self.restaurant_data["training_history"].append({
+            "role": "user",
+            "content": f"[bulk import] {content[:500]}",
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        })
+        
+        summary = self.bulk_importer.import_content(content, content_format, export=export)
+        
+        self.restaurant_data["training_history"].append({
+            "role": "assistant",
+            "content": BulkMenuImporter.format_report(summary),
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        })
+        return summary
+    
+    def apply_update(self, analysis_data):
+        """Apply an analysed update to the in-memory restaurant data (without saving)."""
+        if analysis_data["intent"] == "menu_item":
+            self.update_menu_item(analysis_data)
+        elif analysis_data["intent"] == "price":
+            self.update_price(analysis_data)
+        elif analysis_data["intent"] == "special":
+            self.update_special(analysis_data)
+        elif analysis_data["intent"] == "restaurant_info":
+            self.update_restaurant_info(analysis_data)
+    
     def update_menu_item(self, analysis_data):
         """Update a menu item based on the analysis data."""
         details = analysis_data["details"]
         menu_type = details.get("menu_type", "MAINS").upper()
+        item_name = details.get("name", "")
         
-        # Ensure menu_sections exists
-        if "menu_sections" not in self.restaurant_data:
-            self.restaurant_data["menu_sections"] = []
-        
-        # Find the appropriate menu section
-        menu_section = None
-        for section in self.restaurant_data["menu_sections"]:
-            if section["name"].upper() == menu_type:
-                menu_section = section
-                break
-        
-        # If menu section doesn't exist, create it
-        if menu_section is None:
-            menu_section = {
-                "name": menu_type,
-                "items": []
-            }
-            self.restaurant_data["menu_sections"].append(menu_section)
+        if not item_name.strip():
+            self.log_update(f"Ignored menu item {analysis_data['action']} without an item name for {menu_type} menu", event="ignored", section=menu_type)
+            return
         
         if analysis_data["action"] == "add":
-            # Add new menu item
-            item_name = details.get("name", "")
+            # Find the appropriate menu section, creating it if it doesn't exist
+            menu_section = self.item_index.get_section(menu_type)
+            if menu_section is None:
+                menu_section = self.item_index.add_section(menu_type)
             
             # Check if the item already exists to avoid duplicates
-            item_exists = False
-            for item in menu_section["items"]:
-                if item.get("name", "").lower() == item_name.lower():
-                    item_exists = True
-                    break
-            
-            if not item_exists:
+            if not self.item_index.find(item_name, menu_section["name"]):
                 new_item = {
                     "name": item_name,
                     "description": details.get("description", ""),
                     "price": details.get("price", 0)
                 }
-                menu_section["items"].append(new_item)
-                self.log_update(f"Added new menu item: {new_item['name']} to {menu_type} menu")
+                self.item_index.add_item(menu_section, new_item)
+                self.log_update(f"Added new menu item: {new_item['name']} to {menu_type} menu", event="item_added", item=new_item["name"], section=menu_type, new_price=new_item["price"])
             else:
-                self.log_update(f"Menu item '{item_name}' already exists in {menu_type} menu")
+                self.log_update(f"Menu item '{item_name}' already exists in {menu_type} menu", event="ignored", item=item_name, section=menu_type)
             
         elif analysis_data["action"] == "update":
-            # Update existing menu item
-            item_name = details.get("name", "")
-            found = False
-            
-            # First try to find the item in the specified menu section
-            for item in menu_section["items"]:
-                if item["name"].lower() == item_name.lower():
-                    if "new_name" in details:
-                        item["name"] = details["new_name"]
-                    if "description" in details:
-                        item["description"] = details["description"]
-                    if "price" in details:
-                        item["price"] = details["price"]
-                    self.log_update(f"Updated menu item: {item_name} in {menu_type} menu")
-                    found = True
-                    break
-            
-            # If not found in the specified section, search all sections
-            if not found:
-                for section in self.restaurant_data["menu_sections"]:
-                    for item in section["items"]:
-                        if item["name"].lower() == item_name.lower():
-                            if "new_name" in details:
-                                item["name"] = details["new_name"]
-                            if "description" in details:
-                                item["description"] = details["description"]
-                            if "price" in details:
-                                item["price"] = details["price"]
-                            self.log_update(f"Updated menu item: {item_name} in {section['name']} menu")
-                            found = True
-                            break
-                    if found:
-                        break
+            # Prefer the specified menu section, otherwise the first match anywhere on the menu
+            locations = self.item_index.find(item_name, menu_type) or self.item_index.find(item_name)
+            if locations:
+                location = locations[0]
+                item = location.item
+                if "description" in details:
+                    item["description"] = details["description"]
+                if "price" in details:
+                    self._update_item_price(item, details["price"], details.get("price_type", ""), item_name, location.section_name)
+                if "new_name" in details:
+                    self.item_index.rename_item(location, details["new_name"])
+                self.log_update(f"Updated menu item: {item_name} in {location.section_name} menu", event="item_updated", item=item_name, section=location.section_name, new_name=details.get("new_name"))
                         
         elif analysis_data["action"] == "remove":
-            # Remove menu item
-            item_name = details.get("name", "")
-            found = False
-            
-            # First try to remove from the specified menu section
-            original_count = len(menu_section["items"])
-            menu_section["items"] = [
-                item for item in menu_section["items"]
-                if item["name"].lower() != item_name.lower()
-            ]
-            if len(menu_section["items"]) < original_count:
-                self.log_update(f"Removed menu item: {item_name} from {menu_type} menu")
-                found = True
-            
-            # If not found in the specified section, search all sections
-            if not found:
-                for section in self.restaurant_data["menu_sections"]:
-                    original_count = len(section["items"])
-                    section["items"] = [
-                        item for item in section["items"]
-                        if item["name"].lower() != item_name.lower()
-                    ]
-                    if len(section["items"]) < original_count:
-                        self.log_update(f"Removed menu item: {item_name} from {section['name']} menu")
-                        break
+            # Remove every copy of the item from the specified section, or else from the first section holding it
+            locations = self.item_index.find(item_name, menu_type) or self.item_index.find(item_name)
+            if locations:
+                section = locations[0].section
+                # Remove from the back so earlier positions stay valid
+                for location in sorted(locations, key=lambda location: location.position, reverse=True):
+                    if location.section is section:
+                        self.item_index.remove_item(location)
+                self.log_update(f"Removed menu item: {item_name} from {section['name']} menu", event="item_removed", item=item_name, section=section["name"])
     
     def update_price(self, analysis_data):
         """Update a price for a menu item."""
@@ -359,72 +368,36 @@ class TrainingChat:
         new_price = details.get("price", 0)
         price_type = details.get("price_type", "")  # For wine items: "glass" or "bottle"
         
-        # Ensure menu_sections exists
-        if "menu_sections" not in self.restaurant_data:
-            self.restaurant_data["menu_sections"] = []
-            return
-        
-        found = False
-        
-        # If menu_type is specified, try to find the item in that section first
-        if menu_type:
-            for section in self.restaurant_data["menu_sections"]:
-                if section["name"].upper() == menu_type:
-                    # Check regular items
-                    for item in section["items"]:
-                        if item["name"].lower() == item_name.lower():
-                            item["price"] = new_price
-                            self.log_update(f"Updated price for {item_name} to {new_price} in {section['name']} menu")
-                            found = True
-                            return
-                    
-                    # Check for nested items (like in wine sections)
-                    for item in section["items"]:
-                        if isinstance(item, dict) and "items" in item:
-                            for subitem in item["items"]:
-                                if subitem["name"].lower() == item_name.lower():
-                                    self._update_item_price(subitem, new_price, price_type, item_name, section["name"])
-                                    found = True
-                                    return
-        
-        # If not found or menu_type not specified, search all sections
-        if not found:
-            # First check regular items
-            for section in self.restaurant_data["menu_sections"]:
-                for item in section["items"]:
-                    if isinstance(item, dict) and "name" in item and item["name"].lower() == item_name.lower():
-                        item["price"] = new_price
-                        self.log_update(f"Updated price for {item_name} to {new_price} in {section['name']} menu")
-                        return
-            
-            # Then check nested items
-            for section in self.restaurant_data["menu_sections"]:
-                for item in section["items"]:
-                    if isinstance(item, dict) and "items" in item:
-                        for subitem in item["items"]:
-                            if subitem["name"].lower() == item_name.lower():
-                                self._update_item_price(subitem, new_price, price_type, item_name, section["name"])
-                                return
+        # Look in the specified section first, then anywhere on the menu (including nested wine items)
+        locations = (menu_type and self.item_index.find(item_name, menu_type)) or self.item_index.find(item_name)
+        if locations:
+            location = locations[0]
+            self._update_item_price(location.item, new_price, price_type, item_name, location.section_name)
     
     def _update_item_price(self, item, new_price, price_type, item_name, section_name):
         """Helper method to update an item's price based on price type."""
+        fields = {"event": "price_changed", "item": item_name, "section": section_name}
         if "price_glass" in item and "price_bottle" in item:
             # For wine items with glass and bottle prices
             if price_type.lower() == "glass":
+                old_price = item["price_glass"]
                 item["price_glass"] = new_price
-                self.log_update(f"Updated glass price for {item_name} to {new_price} in {section_name} menu")
+                self.log_update(f"Updated glass price for {item_name} to {new_price} in {section_name} menu", price_type="glass", old_price=old_price, new_price=new_price, **fields)
             elif price_type.lower() == "bottle":
+                old_price = item["price_bottle"]
                 item["price_bottle"] = new_price
-                self.log_update(f"Updated bottle price for {item_name} to {new_price} in {section_name} menu")
+                self.log_update(f"Updated bottle price for {item_name} to {new_price} in {section_name} menu", price_type="bottle", old_price=old_price, new_price=new_price, **fields)
             else:
                 # Default to updating both if not specified
+                old_price = item["price_glass"]
                 item["price_glass"] = new_price
                 item["price_bottle"] = new_price * 3  # Typical bottle/glass ratio
-                self.log_update(f"Updated prices for {item_name} to {new_price} (glass) and {new_price * 3} (bottle) in {section_name} menu")
+                self.log_update(f"Updated prices for {item_name} to {new_price} (glass) and {new_price * 3} (bottle) in {section_name} menu", price_type="glass", old_price=old_price, new_price=new_price, **fields)
         else:
             # Regular item with single price
+            old_price = item.get("price")
             item["price"] = new_price
-            self.log_update(f"Updated price for {item_name} to {new_price} in {section_name} menu")
+            self.log_update(f"Updated price for {item_name} to {new_price} in {section_name} menu", old_price=old_price, new_price=new_price, **fields)
     
     def update_special(self, analysis_data):
         """Update specials based on the analysis data."""
@@ -444,7 +417,7 @@ class TrainingChat:
                 "end_date": details.get("end_date", "")
             }
             self.restaurant_data["specials"].append(new_special)
-            self.log_update(f"Added new special: {new_special['name']}")
+            self.log_update(f"Added new special: {new_special['name']}", event="special_added", item=new_special["name"], new_price=new_special["price"])
             
         elif analysis_data["action"] == "update":
             # Update existing special
@@ -461,7 +434,7 @@ class TrainingChat:
                         special["start_date"] = details["start_date"]
                     if "end_date" in details:
                         special["end_date"] = details["end_date"]
-                    self.log_update(f"Updated special: {special_name}")
+                    self.log_update(f"Updated special: {special_name}", event="special_updated", item=special_name, new_price=details.get("price"))
                     break
                     
         elif analysis_data["action"] == "remove":
@@ -471,7 +444,7 @@ class TrainingChat:
                 special for special in self.restaurant_data["specials"] 
                 if special["name"].lower() != special_name.lower()
             ]
-            self.log_update(f"Removed special: {special_name}")
+            self.log_update(f"Removed special: {special_name}", event="special_removed", item=special_name)
     
     def update_restaurant_info(self, analysis_data):
         """Update restaurant information based on the analysis data."""
@@ -485,24 +458,67 @@ class TrainingChat:
         if isinstance(details, dict):
             for key, value in details.items():
                 self.restaurant_data["restaurant_info"][key] = value
-                self.log_update(f"Updated restaurant info: {key} to {value}")
+                self.log_update(f"Updated restaurant info: {key} to {value}", event="info_changed", field=key, value=value)
         else:
             # If details is a string, log it and add it as a note
             self.restaurant_data["restaurant_info"]["note"] = details
-            self.log_update(f"Added note to restaurant info: {details}")
+            self.log_update(f"Added note to restaurant info: {details}", event="info_changed", field="note", value=details)
+    
+    def handle_history_command(self, user_message):
+        """
+        Handle version history commands from the training chat.
+        Returns the response text, or None if the message isn't a history command.
+        """
+        command = user_message.strip().lower()
+        
+        if command in ("history", "versions", "show history"):
+            return RestaurantDataHistory.format_versions(self.history.list_versions())
+        
+        match = re.match(r'^diff\s+v?(\d+)(?:\s+(?:to\s+)?v?(\d+))?$', command)
+        if match:
+            latest = self.history.latest_version()
+            from_version = int(match.group(1))
+            to_version = int(match.group(2)) if match.group(2) else (latest["version"] if latest else 0)
+            try:
+                changes = self.history.diff(from_version, to_version)
+            except KeyError as e:
+                return f"I couldn't compare those versions: {str(e)}"
+            return f"Changes from v{from_version} to v{to_version}:\n{RestaurantDataHistory.format_diff(changes)}"
+        
+        match = re.match(r'^(?:rollback|roll back|revert)(?:\s+to)?\s+v?(\d+)$', command)
+        if match:
+            return self.rollback_to_version(int(match.group(1)))
+        
+        return None
+    
+    def rollback_to_version(self, version):
+        """
+        Restore the menu, specials and restaurant info from a version, then republish
+        (save, knowledge base, HTML menus). The rollback itself is recorded as a new version.
+        """
+        try:
+            data = self.history.get_version(version)
+        except (KeyError, FileNotFoundError) as e:
+            return f"I couldn't roll back: {str(e)}"
+        
+        data["training_history"] = self.restaurant_data.get("training_history", [])
+        self.restore_restaurant_data(data)
+        self.log_update(f"Rolled back restaurant data to version {version}", event="rollback", version=version)
+        self.export_restaurant_data(f"Rollback to version {version}")
+        return f"Restored version {version}. The knowledge base and HTML menus have been republished."
     
     def get_training_history(self):
         """Get the training history."""
         return self.restaurant_data.get("training_history", [])
     
-    def export_restaurant_data(self):
+    def export_restaurant_data(self, change_description="Restaurant data exported"):
         """Export the restaurant data to be used by the chat agent."""
         try:
             # Update the last_updated timestamp
             self.restaurant_data["last_updated"] = datetime.now().isoformat()
             
             # Save the updated data to the JSON file
-            self.save_restaurant_data()
+            self.save_restaurant_data(change_description)
             
             # Update the knowledge base with the latest data
             if "restaurant_info" in self.restaurant_data:
@@ -513,17 +529,32 @@ class TrainingChat:
             try:
                 # Reinitialize the knowledge base with the updated menu data
                 self.knowledge_base._initialize_menu_items()
-                self.log_update("Menu data updated in knowledge base")
+                self.log_update("Menu data updated in knowledge base", event="export")
             except Exception as menu_error:
-                self.log_update(f"Error updating menu data: {str(menu_error)}")
+                self.log_update(f"Error updating menu data: {str(menu_error)}", event="error")
                 
-            # Generate HTML menu files
+            # Regenerate only the HTML menu files whose sections changed
+            changed_menus = []
             try:
-                # Generate all HTML menu files
-                self.menu_html_generator.generate_all_menus()
-                self.log_update("HTML menu files updated")
+                changed_menus = self.menu_html_generator.regenerate_menus(self.restaurant_data) or []
+                if changed_menus:
+                    self.log_update(f"HTML menu files updated: {', '.join(changed_menus)}", event="export", menus=changed_menus)
+                else:
+                    self.log_update("HTML menu files unchanged", event="export")
             except Exception as html_error:
-                self.log_update(f"Error updating HTML menu files: {str(html_error)}")
+                self.log_update(f"Error updating HTML menu files: {str(html_error)}", event="error")
+            
+            # Rebuild the PDFs of the changed menus in the background, so email attachments stay current
+            if changed_menus:
+                try:
+                    pdf_builder = get_pdf_builder()
+                    if pdf_builder.available:
+                        pdf_builder.build(changed_menus)
+                        self.log_update(f"PDF rebuild queued for: {', '.join(changed_menus)}", event="export", menus=changed_menus)
+                    else:
+                        self.log_update("wkhtmltopdf not found, PDF menus not rebuilt", event="error")
+                except Exception as pdf_error:
+                    self.log_update(f"Error queueing PDF rebuild: {str(pdf_error)}", event="error")
             
             # Update specials in the knowledge base
             if "specials" in self.restaurant_data:
@@ -542,15 +573,19 @@ class TrainingChat:
                             }
                         )
                         self.knowledge_base.add_product(product)
-                    self.log_update("Specials updated in knowledge base")
+                    self.log_update("Specials updated in knowledge base", event="export")
                 except Exception as special_error:
-                    self.log_update(f"Error updating specials: {str(special_error)}")
+                    self.log_update(f"Error updating specials: {str(special_error)}", event="error")
             
             # Log the export
-            self.log_update("Restaurant data exported to knowledge base")
+            self.log_update("Restaurant data exported to knowledge base", event="export")
             
-            return "Restaurant data exported successfully to the knowledge base. Joline has been updated with the latest information. HTML menu files (a_la_carte_menu.html, breakfast_menu.html, kiddies_menu.html, drinks_menu.html, wine_list.html) have also been updated."
+            if changed_menus:
+                menus_message = f"HTML menu files ({', '.join(changed_menus)}) have also been updated."
+            else:
+                menus_message = "The HTML menu files were already up to date."
+            return f"Restaurant data exported successfully to the knowledge base. Joline has been updated with the latest information. {menus_message}"
         except Exception as e:
             error_message = f"Failed to export restaurant data: {str(e)}"
-            self.log_update(error_message)
+            self.log_update(error_message, event="error")
             return error_message
\ No newline at end of file
@@ -0,0 +1,243 @@
+import re
+import difflib
+
+class TrainingIntentParser:
+    """
+    Local parser for formulaic training instructions such as
+    "change the price of the ribeye to 265" or "remove the chocolate mudcake".
+
+    It produces the same intent/action/details structure as the LLM analysis in
+    TrainingChat.process_training_message, resolving item names through the training
+    chat's MenuItemIndex. parse() returns None whenever the message doesn't match a
+    rule or the item can't be resolved unambiguously, so the caller can fall back to the LLM.
+    Item names have to be given in full (or spelled nearly so): "remove chips" must not
+    resolve to Fish & Chips.
+    """
+
+    PRICE = r'R?\s*(?P<price>\d+(?:[.,]\d{1,2})?)'
+    PRICE_TYPE = r'(?:\s+(?:per|a|by\s+the|for\s+a)\s+(?P<price_type>glass|bottle))?'
+    POLITE = r'^(?:(?:please|can\s+you|could\s+you|kindly)\s+)*'
+    END = r'\s*[.!]?\s*(?:please|thanks|thank\s+you)?[.!]?$'
+
+    PRICE_RULES = [
+        # "change the price of the ribeye (on the grills menu) to R265 (per glass)"
+        re.compile(POLITE + r'(?:change|update|set|adjust|make|put)\s+the\s+(?:(?P<price_type_pre>glass|bottle)\s+)?price\s+(?:of|for|on)\s+(?P<target>.+?)\s+(?:to|at)\s+' + PRICE + PRICE_TYPE + END, re.IGNORECASE),
+        # "update the ribeye price to 265"
+        re.compile(POLITE + r'(?:change|update|set|adjust|make|put)\s+(?P<target>.+?)(?:\s+(?P<price_type_pre>glass|bottle))?\s+price\s+(?:to|at)\s+' + PRICE + PRICE_TYPE + END, re.IGNORECASE),
+        # "the ribeye is now R265" / "ribeye now costs 265"
+        re.compile(POLITE + r'(?P<target>.+?)\s+(?:is\s+now|now\s+costs|costs|should\s+cost|should\s+be|=)\s+' + PRICE + PRICE_TYPE + END, re.IGNORECASE),
+        # "change the ribeye to R265" (the R is required so this can't be confused with a rename)
+        re.compile(POLITE + r'(?:change|update|set|make|put)\s+(?P<target>.+?)\s+(?:to|at)\s+R\s*(?P<price>\d+(?:[.,]\d{1,2})?)' + PRICE_TYPE + END, re.IGNORECASE),
+    ]
+
+    REMOVE_RULE = re.compile(POLITE + r'(?:remove|delete|take\s+off|drop|scrap)\s+(?P<target>.+?)' + END, re.IGNORECASE)
+    RENAME_RULE = re.compile(POLITE + r'(?:rename|change\s+the\s+name\s+of)\s+(?P<target>.+?)\s+to\s+["\']?(?P<new_name>.+?)["\']?' + END, re.IGNORECASE)
+    ADD_RULE = re.compile(
+        POLITE + r'add\s+(?:a\s+)?(?:new\s+)?(?:menu\s+)?(?:item\s+|dish\s+)?(?:called\s+)?["\']?(?P<name>.+?)["\']?'
+        r'\s+to\s+(?:the\s+)?(?P<menu_type>.+?)(?:\s+(?:menu|section))?\s+(?:for|at)\s+' + PRICE +
+        r'(?:\s*[.,;:-]\s*(?P<description>.+?))?\s*[.!]?$',
+        re.IGNORECASE
+    )
+
+    SECTION_SPLIT = re.compile(r'^(?P<name>.+?)\s+(?:on|in|from|off)\s+(?:the\s+)?(?P<menu_type>.+?)(?:\s+(?:menu|section|list))?$', re.IGNORECASE)
+    STOPWORDS = {"the", "our", "a", "an", "of", "item", "dish", "menu"}
+    # How close a misspelt name must be to the real one (difflib ratio)
+    SIMILARITY = 0.85
+
+    def __init__(self, training_chat):
+        self.training_chat = training_chat
+
+    @property
+    def item_index(self):
+        return self.training_chat.item_index
+
+    def _clean(self, text):
+        text = text.strip().strip("\"'").strip()
+        return re.sub(r'^(?:the|our)\s+', '', text, flags=re.IGNORECASE)
+
+    def _parse_price(self, text):
+        price = float(text.replace(",", "."))
+        return int(price) if price.is_integer() else price
+
+    def _tokens(self, text):
+        return [token for token in re.findall(r'[\w&]+', text.lower()) if token not in self.STOPWORDS]
+
+    def _match_names(self, phrase, names):
+        """
+        Resolve a phrase to one of names: an exact match, else the one name with the same words
+        (in any order, ignoring stopwords), else the one name spelt at least SIMILARITY alike.
+        Part of a name, or a phrase that fits several names, resolves to None.
+        """
+        key = self.item_index.normalize(phrase)
+        if key in names:
+            return key
+        tokens = set(self._tokens(phrase))
+        if not tokens:
+            return None
+        matches = [name for name in names if set(self._tokens(name)) == tokens]
+        if not matches:
+            matches = [name for name in names if difflib.SequenceMatcher(None, key, name).ratio() >= self.SIMILARITY]
+        return matches[0] if len(matches) == 1 else None
+
+    def _section_exists(self, menu_type):
+        if self.item_index.get_section(menu_type):
+            return True
+        wanted = self.item_index.normalize(menu_type)
+        return any(
+            self.item_index.normalize(item.get("name")) == wanted
+            for section in self.item_index.menu_sections
+            for item in section.get("items", [])
+            if isinstance(item, dict) and "items" in item
+        )
+
+    def _resolve_item(self, target):
+        """Resolve "ribeye" or "the ribeye on the grills menu" to (location, menu_type), or None."""
+        candidates = [(self._clean(target), None)]
+        split = self.SECTION_SPLIT.match(target)
+        if split and self._section_exists(split.group("menu_type")):
+            candidates.insert(0, (self._clean(split.group("name")), split.group("menu_type").upper()))
+
+        for phrase, menu_type in candidates:
+            name = self._match_names(phrase, self.item_index.names())
+            if name is None:
+                continue
+            locations = self.item_index.find(name, menu_type) if menu_type else self.item_index.find(name)
+            if not locations:
+                continue
+            if len({(id(location.section), id(location.parent)) for location in locations}) > 1:
+                # The same name is on several menus; leave it to the LLM (or the user) to say which
+                return None
+            return locations[0], menu_type
+        return None
+
+    def _resolve_special(self, target):
+        specials = {
+            self.item_index.normalize(special.get("name")): special
+            for special in self.training_chat.restaurant_data.get("specials", [])
+        }
+        phrase = re.sub(r'\s+special$', '', self._clean(target), flags=re.IGNORECASE)
+        name = self._match_names(target, specials.keys()) or self._match_names(phrase, specials.keys())
+        return specials[name] if name else None
+
+    def _result(self, intent, action, details, confirmation_message, confirmation_prompt):
+        return {
+            "intent": intent,
+            "action": action,
+            "details": details,
+            "confirmation_message": confirmation_message,
+            "confirmation_required": True,
+            "confirmation_prompt": confirmation_prompt,
+            "parser": "local"
+        }
+
+    def parse(self, message):
+        """Parse a training message locally. Returns the analysis dict or None to fall back to the LLM."""
+        # Several lines are several instructions (a bulk import), not one
+        if "\n" in message.strip():
+            return None
+        message = " ".join(message.split())
+        if not message:
+            return None
+
+        for rule in self.PRICE_RULES:
+            match = rule.match(message)
+            if match:
+                result = self._parse_price_change(match)
+                if result:
+                    return result
+
+        match = self.RENAME_RULE.match(message)
+        if match:
+            return self._parse_rename(match)
+
+        match = self.REMOVE_RULE.match(message)
+        if match:
+            return self._parse_remove(match)
+
+        match = self.ADD_RULE.match(message)
+        if match:
+            return self._parse_add(match)
+
+        return None
+
+    def _parse_price_change(self, match):
+        groups = match.groupdict()
+        resolved = self._resolve_item(groups["target"])
+        if not resolved:
+            return None
+        location, menu_type = resolved
+        item = location.item
+        price = self._parse_price(groups["price"])
+        price_type = (groups.get("price_type") or groups.get("price_type_pre") or "").lower()
+
+        details = {"name": item["name"], "menu_type": location.section_name, "price": price}
+        if price_type:
+            details["price_type"] = price_type
+        suffix = f" per {price_type}" if price_type else ""
+        if price_type and f"price_{price_type}" in item:
+            old_price = item[f"price_{price_type}"]
+        else:
+            old_price = item.get("price", item.get("price_glass"))
+
+        return self._result(
+            "price", "update", details,
+            f"The price of {item['name']} has been updated to R{price}{suffix}.",
+            f"Change the price of {item['name']} ({location.section_name}) from R{old_price} to R{price}{suffix}? Please confirm."
+        )
+
+    def _parse_rename(self, match):
+        resolved = self._resolve_item(match.group("target"))
+        if not resolved:
+            return None
+        location, _ = resolved
+        item = location.item
+        new_name = match.group("new_name").strip()
+        return self._result(
+            "menu_item", "update",
+            {"name": item["name"], "menu_type": location.section_name, "new_name": new_name},
+            f"{item['name']} has been renamed to {new_name}.",
+            f"Rename {item['name']} ({location.section_name}) to {new_name}? Please confirm."
+        )
+
+    def _parse_remove(self, match):
+        target = match.group("target")
+        special = self._resolve_special(target)
+        if special:
+            return self._result(
+                "special", "remove", {"name": special["name"]},
+                f"The {special['name']} special has been removed.",
+                f"Remove the {special['name']} special? Please confirm."
+            )
+        resolved = self._resolve_item(target)
+        if not resolved:
+            return None
+        location, _ = resolved
+        item = location.item
+        return self._result(
+            "menu_item", "remove", {"name": item["name"], "menu_type": location.section_name},
+            f"{item['name']} has been removed from the {location.section_name} menu.",
+            f"Remove {item['name']} from the {location.section_name} menu? Please confirm."
+        )
+
+    def _parse_add(self, match):
+        menu_type = match.group("menu_type").strip()
+        section = self.item_index.get_section(menu_type)
+        if section is None:
+            return None
+        name = self._clean(match.group("name"))
+        if not name or self.item_index.find(name, section["name"]):
+            return None
+        price = self._parse_price(match.group("price"))
+        description = (match.group("description") or "").strip()
+        description = re.sub(r"^(?:it'?s|it\s+is|this\s+is)\s+(?:a\s+|an\s+)?", "", description, flags=re.IGNORECASE).rstrip(".")
+        if description:
+            description = description[0].upper() + description[1:]
+
+        details = {"name": name, "menu_type": section["name"], "price": price}
+        if description:
+            details["description"] = description
+        return self._result(
+            "menu_item", "add", details,
+            f"{name} has been added to the {section['name']} menu at R{price}.",
+            f"Add {name} to the {section['name']} menu at R{price}? Please confirm."
+        )
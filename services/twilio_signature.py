@@ -0,0 +1,41 @@
+import logging
+from twilio.request_validator import RequestValidator
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class TwilioSignature:
+    """
+    Checks the X-Twilio-Signature header of incoming webhooks, so only Twilio can make the
+    app queue work (and spend OpenAI and Twilio credit) on behalf of a phone number.
+
+    Twilio signs the full public URL it called. Behind a proxy or tunnel the URL Flask sees
+    differs from that, so when PUBLIC_BASE_URL is set the URL is rebuilt from it. Validation
+    is skipped, with a warning, when TWILIO_VALIDATE_SIGNATURE is off or no auth token is set
+    (local development).
+    """
+
+    def __init__(self, auth_token=None, enabled=None):
+        self.auth_token = auth_token or Config.TWILIO_AUTH_TOKEN
+        self.enabled = Config.TWILIO_VALIDATE_SIGNATURE if enabled is None else enabled
+        self.validator = RequestValidator(self.auth_token) if self.auth_token else None
+        if self.enabled and self.validator is None:
+            logger.warning("TWILIO_AUTH_TOKEN is not set; Twilio webhook signatures are not checked")
+
+    @staticmethod
+    def public_url(url, path):
+        """The URL Twilio called: the request URL, or path on PUBLIC_BASE_URL when that is set."""
+        if Config.PUBLIC_BASE_URL:
+            return Config.PUBLIC_BASE_URL.rstrip('/') + path
+        return url
+
+    def is_valid(self, url, path, params, signature):
+        """
+        True if signature matches the request. url is the full request URL, path the path
+        with its query string, and params the POSTed form fields.
+        """
+        if not self.enabled or self.validator is None:
+            return True
+        if not signature:
+            return False
+        return self.validator.validate(self.public_url(url, path), params, signature)
@@ -0,0 +1,325 @@
+import os
+import re
+import json
+import gzip
+import queue
+import atexit
+import logging
+import threading
+import contextlib
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+class UpdateLog:
+    """
+    Structured JSON-lines log of restaurant data updates.
+
+    Events are queued and written in batches by a background thread. The active file
+    is rotated when it grows past max_bytes or when the day changes, and rotated files
+    are gzip-compressed. A small index maps item names and dates to the files that
+    mention them, so queries like "when did the kingklip price change?" only open the
+    files that can contain an answer.
+
+    The web app and the scraper write to the same log from separate processes, so every
+    append, rotation and index update happens under an exclusive lock on a lock file next
+    to the log, and the index is re-read from disk inside that lock.
+    """
+
+    def __init__(self, log_dir="logs", base_name="restaurant_updates", max_bytes=5 * 1024 * 1024, flush_interval=1.0):
+        self.log_dir = log_dir
+        self.base_name = base_name
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.active_path = os.path.join(log_dir, f"{base_name}.jsonl")
+        self.index_path = os.path.join(log_dir, f"{base_name}.index.json")
+        self.lock_path = os.path.join(log_dir, f"{base_name}.lock")
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._pending = 0
+        self._index = None
+        self._writer = None
+
+    @staticmethod
+    def normalize(name):
+        return re.sub(r'\s+', ' ', str(name or "")).strip().lower()
+
+    def log(self, event, message, **fields):
+        """Queue an event. fields can include item, section, old_price, new_price, price_type, source, etc."""
+        record = {"ts": datetime.now().isoformat(timespec="seconds"), "event": event, "message": message}
+        record.update({key: value for key, value in fields.items() if value is not None})
+        with self._lock:
+            self._pending += 1
+        self._queue.put(record)
+        self._ensure_writer()
+        return record
+
+    def _ensure_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            with self._lock:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._write_loop, name="update-log-writer", daemon=True)
+                    self._writer.start()
+
+    _FLUSH = object()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                # Gather more events for up to flush_interval, unless a flush was requested
+                while batch[-1] is not self._FLUSH and len(batch) < 500:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            batch = [record for record in batch if record is not self._FLUSH]
+            if not batch:
+                continue
+            with self._lock:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    # Not re-logged by UpdateLogHandler, so a failing write can't feed itself
+                    logger.error(f"Failed to write update log batch: {str(e)}")
+                finally:
+                    self._pending -= len(batch)
+                    self._flushed.notify_all()
+
+    def flush(self, timeout=5.0):
+        """Block until every queued event has been written."""
+        self._queue.put(self._FLUSH)
+        with self._lock:
+            self._flushed.wait_for(lambda: self._pending <= 0, timeout=timeout)
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared with the other processes writing this log."""
+        os.makedirs(self.log_dir, exist_ok=True)
+        with open(self.lock_path, "a+b") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load_index(self, reload=False):
+        """The index; with reload, re-read from disk (call under _file_lock)."""
+        if reload or self._index is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as file:
+                    self._index = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._index = {"active_date": None, "items": {}, "dates": {}, "events": {}}
+        return self._index
+
+    def _save_index(self):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self._index, file)
+        os.replace(temp_path, self.index_path)
+
+    def _write_batch(self, batch):
+        with self._file_lock():
+            self._write_batch_locked(batch)
+
+    def _write_batch_locked(self, batch):
+        # Another process may have appended, rotated or indexed since this one last did
+        index = self._load_index(reload=True)
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        active_size = os.path.getsize(self.active_path) if os.path.exists(self.active_path) else 0
+        if active_size and (active_size >= self.max_bytes or (index["active_date"] and index["active_date"] != today)):
+            self._rotate(index)
+        if not index["active_date"] or not os.path.exists(self.active_path):
+            index["active_date"] = today
+
+        active_name = os.path.basename(self.active_path)
+        with open(self.active_path, "a", encoding="utf-8") as file:
+            file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch))
+
+        for record in batch:
+            self._index_record(index, record, active_name)
+        self._save_index()
+
+    def _index_record(self, index, record, file_name):
+        def add(bucket, key):
+            files = index[bucket].setdefault(key, [])
+            if file_name not in files:
+                files.append(file_name)
+
+        add("dates", record["ts"][:10])
+        add("events", record["event"])
+        if record.get("item"):
+            add("items", self.normalize(record["item"]))
+
+    def _rotate(self, index):
+        """Compress the active file into a dated archive and repoint the index at it."""
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        archive_name = f"{self.base_name}-{stamp}.jsonl.gz"
+        archive_path = os.path.join(self.log_dir, archive_name)
+        suffix = 1
+        while os.path.exists(archive_path):
+            archive_name = f"{self.base_name}-{stamp}-{suffix}.jsonl.gz"
+            archive_path = os.path.join(self.log_dir, archive_name)
+            suffix += 1
+        with open(self.active_path, "rb") as source, gzip.open(archive_path, "wb") as target:
+            target.write(source.read())
+        os.remove(self.active_path)
+
+        active_name = os.path.basename(self.active_path)
+        for bucket in ("items", "dates", "events"):
+            for files in index[bucket].values():
+                if active_name in files:
+                    files[files.index(active_name)] = archive_name
+        index["active_date"] = None
+
+    def rotate(self):
+        """Force a rotation of the active file."""
+        self.flush()
+        with self._lock, self._file_lock():
+            index = self._load_index(reload=True)
+            if os.path.exists(self.active_path) and os.path.getsize(self.active_path):
+                self._rotate(index)
+                self._save_index()
+
+    def _read_file(self, file_name):
+        path = os.path.join(self.log_dir, file_name)
+        if not os.path.exists(path):
+            return
+        opener = gzip.open if file_name.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def query(self, item=None, event=None, since=None, until=None, limit=None):
+        """
+        Find events by item name (exact or partial match), event type and date range
+        (ISO dates or datetimes). Only files listed in the index for the filters are read.
+        Returns matching events, newest first.
+        """
+        self.flush()
+        with self._lock, self._file_lock():
+            index = json.loads(json.dumps(self._load_index(reload=True)))
+
+        candidates = None
+        item_key = self.normalize(item) if item else None
+        if item_key:
+            files = set()
+            for name, name_files in index["items"].items():
+                if item_key in name:
+                    files.update(name_files)
+            candidates = files
+        if event:
+            files = set(index["events"].get(event, []))
+            candidates = files if candidates is None else candidates & files
+        if since or until:
+            files = set()
+            for date, date_files in index["dates"].items():
+                if (not since or date >= since[:10]) and (not until or date <= until[:10]):
+                    files.update(date_files)
+            candidates = files if candidates is None else candidates & files
+        if candidates is None:
+            candidates = {name for files in index["dates"].values() for name in files}
+
+        results = []
+        # Under the lock, so another process can't rotate a file away while it is read
+        with self._file_lock():
+            records = [record for file_name in candidates for record in self._read_file(file_name)]
+        for record in records:
+            if item_key and item_key not in self.normalize(record.get("item")):
+                continue
+            if event and record["event"] != event:
+                continue
+            if since and record["ts"] < since:
+                continue
+            if until and record["ts"][:len(until)] > until:
+                continue
+            results.append(record)
+
+        results.sort(key=lambda record: record["ts"], reverse=True)
+        return results[:limit] if limit else results
+
+    LEGACY_PATTERNS = [
+        (re.compile(r'^Updated (?:(?P<price_type>glass|bottle) )?price for (?P<item>.+?) to (?P<new_price>\S+) in (?P<section>.+) menu$'), "price_changed"),
+        (re.compile(r'^Updated prices for (?P<item>.+?) to (?P<new_price>\S+) \(glass\).* in (?P<section>.+) menu$'), "price_changed"),
+        (re.compile(r'^Added new menu item: (?P<item>.*) to (?P<section>.+) menu$'), "item_added"),
+        (re.compile(r'^Removed menu item: (?P<item>.*) from (?P<section>.+) menu$'), "item_removed"),
+        (re.compile(r'^Updated menu item: (?P<item>.+?) in (?P<section>.+) menu$'), "item_updated"),
+        (re.compile(r'^(?:Added new|Updated|Removed) special: (?P<item>.+)$'), "special_changed"),
+        (re.compile(r'^Updated restaurant info: (?P<field>\S+) to (?P<value>.*)$'), "info_changed"),
+    ]
+
+    def import_legacy(self, path):
+        """Import a free-text restaurant_updates.log ("[timestamp] message" lines). Returns the number of events."""
+        count = 0
+        line_pattern = re.compile(r'^\[(\d{4}-\d{2}-\d{2}) (\d{2}:\d{2}:\d{2})\] (.*)$')
+        with open(path, "r", encoding="utf-8", errors="replace") as file:
+            for line in file:
+                match = line_pattern.match(line.rstrip("\n"))
+                if not match:
+                    continue
+                message = match.group(3)
+                record = {"ts": f"{match.group(1)}T{match.group(2)}", "event": "note", "message": message, "source": "legacy"}
+                for pattern, event in self.LEGACY_PATTERNS:
+                    event_match = pattern.match(message)
+                    if event_match:
+                        record["event"] = event
+                        record.update({key: value for key, value in event_match.groupdict().items() if value})
+                        break
+                with self._lock:
+                    self._pending += 1
+                self._queue.put(record)
+                count += 1
+        self._ensure_writer()
+        self.flush()
+        return count
+
+class UpdateLogHandler(logging.Handler):
+    """Logging handler that writes log records into the structured update log."""
+
+    def __init__(self, update_log=None, level=logging.INFO):
+        super().__init__(level)
+        self.update_log = update_log or get_update_log()
+
+    def emit(self, record):
+        # The update log's own errors go to other handlers only; writing them here could loop
+        if record.name == logger.name:
+            return
+        try:
+            self.update_log.log(
+                "log",
+                record.getMessage(),
+                level=record.levelname,
+                logger=record.name
+            )
+        except Exception:
+            self.handleError(record)
+
+_shared_update_log = None
+_shared_lock = threading.Lock()
+
+def get_update_log():
+    """The process-wide update log, so every writer shares one background thread and file."""
+    global _shared_update_log
+    with _shared_lock:
+        if _shared_update_log is None:
+            _shared_update_log = UpdateLog()
+            atexit.register(_shared_update_log.flush)
+        return _shared_update_log
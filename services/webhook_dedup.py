@@ -0,0 +1,153 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+class WebhookDedup:
+    """
+    Remembers the response given to each webhook delivery, keyed by the provider's id for
+    it (Twilio MessageSid, CallSid or RecordingSid, the email's Message-ID), so a delivery
+    that Twilio retries or Gmail forwards twice gets the same response again instead of a
+    second AI call and reply.
+
+    Responses are kept in SQLite for WEBHOOK_DEDUP_RETENTION_DAYS, which every process
+    serving webhooks shares, with a bounded LRU of the most recent WEBHOOK_DEDUP_MEMORY
+    responses in front of it, so most repeats cost a dict lookup. A delivery is claimed
+    before it is handled: a repeat that arrives while the first is still being handled
+    waits for its response, and a claim abandoned by a crash expires after claim_timeout.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS webhook_responses (
+            delivery_key TEXT PRIMARY KEY,
+            status INTEGER,
+            body BLOB,
+            content_type TEXT,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_path=None, memory_size=None, claim_timeout=60.0):
+        self.db_path = db_path or Config.WEBHOOK_DEDUP_DB
+        self.memory_size = memory_size or Config.WEBHOOK_DEDUP_MEMORY
+        self.claim_timeout = claim_timeout
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _remember(self, delivery_key, response):
+        with self._lock:
+            self._memory[delivery_key] = response
+            self._memory.move_to_end(delivery_key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def lookup(self, delivery_key):
+        """The (status, body, content_type) stored for a delivery, or None if it hasn't been answered."""
+        with self._lock:
+            response = self._memory.get(delivery_key)
+            if response is not None:
+                self._memory.move_to_end(delivery_key)
+                return response
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT status, body, content_type FROM webhook_responses WHERE delivery_key = ? AND status IS NOT NULL",
+                (delivery_key,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        response = (row["status"], bytes(row["body"] or b""), row["content_type"])
+        self._remember(delivery_key, response)
+        return response
+
+    def claim(self, delivery_key):
+        """
+        Claim a delivery for handling. Returns True if the caller should handle it, False if
+        it has been answered or is being handled elsewhere.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO webhook_responses (delivery_key, created_at) VALUES (?, ?) "
+                "ON CONFLICT (delivery_key) DO UPDATE SET created_at = excluded.created_at "
+                "WHERE status IS NULL AND created_at < ?",
+                (delivery_key, now, now - self.claim_timeout)
+            )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def wait(self, delivery_key, timeout=10.0, interval=0.1):
+        """Wait for another request's response to a delivery. Returns it, or None on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            response = self.lookup(delivery_key)
+            if response is not None:
+                return response
+            time.sleep(interval)
+        return None
+
+    def store(self, delivery_key, status, body, content_type):
+        """Save the response given to a claimed delivery."""
+        body = body.encode("utf-8") if isinstance(body, str) else body
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO webhook_responses (delivery_key, status, body, content_type, created_at) VALUES (?, ?, ?, ?, ?)",
+                (delivery_key, status, body, content_type, time.time())
+            )
+        finally:
+            conn.close()
+        self._remember(delivery_key, (status, body, content_type))
+
+    def release(self, delivery_key):
+        """Drop the claim on a delivery that failed, so the provider's retry is handled afresh."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM webhook_responses WHERE delivery_key = ? AND status IS NULL", (delivery_key,))
+        finally:
+            conn.close()
+
+    def purge(self, older_than_days=None):
+        """Forget deliveries older than the retention period. Returns the number removed."""
+        days = older_than_days if older_than_days is not None else Config.WEBHOOK_DEDUP_RETENTION_DAYS
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM webhook_responses WHERE created_at < ?", (time.time() - days * 86400,)).rowcount
+        finally:
+            conn.close()
+
+_shared_dedup = None
+_shared_lock = threading.Lock()
+
+def get_webhook_dedup():
+    """The process-wide webhook deduplication store."""
+    global _shared_dedup
+    with _shared_lock:
+        if _shared_dedup is None:
+            _shared_dedup = WebhookDedup()
+            _shared_dedup.purge()
+        return _shared_dedup
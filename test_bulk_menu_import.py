@@ -0,0 +1,106 @@
+from services.menu_index import MenuItemIndex
+from services.bulk_menu_import import BulkMenuImporter
+
+class SampleChat:
+    """Just the part of TrainingChat that validation reads: the menu and its item index."""
+
+    def __init__(self):
+        self.restaurant_data = {"menu_sections": [
+            {"name": "MAINS", "items": [
+                {"name": "Lamb Neck", "price": 245},
+                {"name": "Short Rib", "price": 285}
+            ]},
+            {"name": "WINE SECTIONS", "items": [
+                {"name": "ESTATE WINES", "items": [
+                    {"name": "Merlot", "price_glass": 60, "price_bottle": 175}
+                ]}
+            ]}
+        ]}
+        self.item_index = MenuItemIndex(self.restaurant_data["menu_sections"])
+
+def validate(content, content_format=None):
+    importer = BulkMenuImporter(SampleChat())
+    return importer.validate_rows(importer.parse(content, content_format))[1]
+
+def test_parse_formats():
+    importer = BulkMenuImporter(SampleChat())
+    rows = importer.parse("action,menu_type,name,price\nupdate,MAINS,Short Rib,295\n")
+    assert rows == [{"action": "update", "menu_type": "MAINS", "name": "Short Rib", "price": "295"}]
+    rows = importer.parse('{"items": [{"name": "Short Rib", "price": 295}]}')
+    assert rows == [{"name": "Short Rib", "price": 295}]
+    rows = importer.parse("update Short Rib to R295\nremove Lamb Neck\nadd MAINS / Beef Bobotie = 195")
+    assert [row.get("action") for row in rows] == ["update", "remove", "add"]
+    assert rows[2]["menu_type"] == "MAINS" and rows[2]["price"] == "195"
+
+def test_malformed_json():
+    results = validate('"Short Rib"', "json")
+    assert [result["status"] for result in results] == ["invalid"]
+    assert "Expected a list" in results[0]["message"]
+    results = validate('[{"name": "Short Rib", "price": 295}, 42, "Lamb Neck"]', "json")
+    assert [result["status"] for result in results] == ["valid", "invalid", "invalid"]
+    assert results[1]["message"] == "Row is not an object"
+
+def test_validation():
+    results = validate(
+        "update Short Rib to R295\n"
+        "update Short Rib to R300\n"
+        "remove Chips\n"
+        "add MAINS / Lamb Neck = 245\n"
+        "add Beef Bobotie = 195\n"
+        "update Merlot = 65 glass"
+    )
+    assert [result["status"] for result in results] == ["valid", "invalid", "invalid", "invalid", "invalid", "valid"]
+    assert results[1]["message"] == "Duplicate row in this import"
+    assert "was not found" in results[2]["message"]
+    assert "already exists" in results[3]["message"]
+    assert "menu_type is required" in results[4]["message"]
+    results = validate('[{"name": "Lamb Neck", "price": "-5"}, {"name": "Lamb Neck", "price_type": "glass"}]')
+    assert "negative" in results[0]["message"]
+    assert results[1]["message"].startswith("Nothing to update")
+
+def test_rows_follow_earlier_rows():
+    results = validate(
+        "remove Lamb Neck\n"
+        "update Lamb Neck = 255\n"
+        "add MAINS / Lamb Neck = 265"
+    )
+    assert [result["status"] for result in results] == ["valid", "invalid", "valid"]
+    assert "removed or renamed by an earlier row" in results[1]["message"]
+
+    results = validate(
+        '[{"name": "Short Rib", "new_name": "Braised Short Rib"},'
+        ' {"name": "Short Rib", "price": 295},'
+        ' {"name": "Braised Short Rib", "price": 295},'
+        ' {"action": "add", "menu_type": "MAINS", "name": "Short Rib", "price": 195}]'
+    )
+    assert [result["status"] for result in results] == ["valid", "invalid", "valid", "valid"]
+
+    # Validation works on a copy; the menu itself is untouched
+    chat = SampleChat()
+    importer = BulkMenuImporter(chat)
+    importer.validate_rows(importer.parse("remove Lamb Neck\nadd DESSERT / Malva Pudding = 90"))
+    assert chat.item_index.contains("Lamb Neck")
+    assert chat.item_index.get_section("DESSERT") is None
+
+def test_subsection_add_rejected():
+    results = validate("add ESTATE WINES / Pinotage = 70 glass")
+    assert results[0]["status"] == "invalid"
+    assert "subsection" in results[0]["message"]
+    results = validate("add WINE SECTIONS / Pinotage = 70 glass")
+    assert results[0]["status"] == "valid"
+
+def main():
+    """
+    Test the bulk menu import parser and validator against a small sample menu.
+    Nothing is applied or saved.
+    """
+    print("=== Bulk Menu Import Test ===")
+    test_parse_formats()
+    test_malformed_json()
+    test_validation()
+    test_rows_follow_earlier_rows()
+    test_subsection_add_rejected()
+    print("All bulk menu import checks passed.")
+
+if __name__ == "__main__":
+    main()
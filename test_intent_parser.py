@@ -0,0 +1,96 @@
+from services.menu_index import MenuItemIndex
+from services.training_intent_parser import TrainingIntentParser
+
+class SampleChat:
+    """Just the part of TrainingChat that the parser reads: the restaurant data and its item index."""
+
+    def __init__(self):
+        self.restaurant_data = {
+            "menu_sections": [
+                {"name": "SEAFOOD", "items": [
+                    {"name": "Fish & Chips", "price": 185},
+                    {"name": "Seared Salmon", "price": 265}
+                ]},
+                {"name": "DESSERT", "items": [
+                    {"name": "Chocolate Mudcake", "price": 95},
+                    {"name": "Sago Pudding", "price": 85}
+                ]},
+                {"name": "GRILLS", "items": [
+                    {"name": "Flame Grilled Fillet", "price": 325},
+                    {"name": "Lamb Chops", "price": 295}
+                ]},
+                {"name": "KIDDIES MENU", "items": [
+                    {"name": "Lamb Chops", "price": 165}
+                ]},
+                {"name": "WINE SECTIONS", "items": [
+                    {"name": "ESTATE WINES", "items": [
+                        {"name": "Merlot", "price_glass": 60, "price_bottle": 175}
+                    ]}
+                ]}
+            ],
+            "specials": [{"name": "Sunday Roast", "price": 225}]
+        }
+        self.item_index = MenuItemIndex(self.restaurant_data["menu_sections"])
+
+def parse(message):
+    return TrainingIntentParser(SampleChat()).parse(message)
+
+def test_price_changes():
+    result = parse("Please change the price of the seared salmon to R275")
+    assert result["intent"] == "price" and result["action"] == "update"
+    assert result["details"] == {"name": "Seared Salmon", "menu_type": "SEAFOOD", "price": 275}
+    assert "from R265 to R275" in result["confirmation_prompt"]
+    assert parse("Sago Pudding is now R89.50")["details"]["price"] == 89.5
+    result = parse("update the merlot price to 65 per glass")
+    assert result["details"] == {"name": "Merlot", "menu_type": "WINE SECTIONS", "price": 65, "price_type": "glass"}
+
+def test_full_names_only():
+    assert parse("remove chips") is None
+    assert parse("remove fish") is None
+    assert parse("remove the mudcake") is None
+    assert parse("remove fish & chips")["details"]["name"] == "Fish & Chips"
+    assert parse("remove chips & fish")["details"]["name"] == "Fish & Chips"
+    # A small misspelling still resolves
+    assert parse("remove the choclate mudcake")["details"]["name"] == "Chocolate Mudcake"
+
+def test_ambiguous_names():
+    # Lamb Chops is on the grills and the kiddies menu
+    assert parse("lamb chops now costs 305") is None
+    result = parse("lamb chops on the grills menu now costs 305")
+    assert result["details"] == {"name": "Lamb Chops", "menu_type": "GRILLS", "price": 305}
+
+def test_rename_add_and_specials():
+    result = parse("rename the flame grilled fillet to 'Beef Fillet'")
+    assert result["details"] == {"name": "Flame Grilled Fillet", "menu_type": "GRILLS", "new_name": "Beef Fillet"}
+    result = parse("add Malva Pudding to the dessert menu for R90 - it's a warm apricot sponge")
+    assert result["action"] == "add"
+    assert result["details"] == {"name": "Malva Pudding", "menu_type": "DESSERT", "price": 90, "description": "Warm apricot sponge"}
+    # Already on the menu, or an unknown section: left to the LLM
+    assert parse("add Sago Pudding to the dessert menu for R90") is None
+    assert parse("add Malva Pudding to the pudding menu for R90") is None
+    result = parse("remove the sunday roast special")
+    assert result["intent"] == "special" and result["details"] == {"name": "Sunday Roast"}
+
+def test_fallback_to_llm():
+    assert parse("We are closed on Christmas day") is None
+    assert parse("change the price of the wagyu to R500") is None
+    assert parse("remove Fish & Chips\nremove Sago Pudding") is None
+    # Joined into one line this would parse as a removal
+    assert parse("remove Fish & Chips\nplease") is None
+    assert parse("  remove Fish & Chips please\n")["action"] == "remove"
+
+def main():
+    """
+    Test the local training intent parser against a small sample menu.
+    Messages it can't resolve unambiguously must return None so they go to the LLM.
+    """
+    print("=== Training Intent Parser Test ===")
+    test_price_changes()
+    test_full_names_only()
+    test_ambiguous_names()
+    test_rename_add_and_specials()
+    test_fallback_to_llm()
+    print("All training intent parser checks passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+from services.mail_text import decode_bytes, html_to_text
+
+def test_decode_bytes():
+    # 7-bit charsets are valid UTF-8 too, so the declared charset has to win
+    assert decode_bytes("こんにちは".encode("iso-2022-jp"), "iso-2022-jp") == "こんにちは"
+    assert decode_bytes("Crème brûlée".encode("utf-7"), "UTF-7") == "Crème brûlée"
+    assert decode_bytes("Crème brûlée".encode("utf-8"), "utf-8") == "Crème brûlée"
+    assert decode_bytes("Grüße".encode("iso-8859-15"), '"ISO-8859-15"') == "Grüße"
+    # Outlook labels Windows-1252 text as ISO-8859-1
+    assert decode_bytes("“R95” – €".encode("cp1252"), "iso-8859-1") == "“R95” – €"
+    # No charset, or an unknown one: detected
+    assert decode_bytes("Crème brûlée".encode("utf-8")) == "Crème brûlée"
+    assert decode_bytes("Crème brûlée".encode("cp1252"), "x-unknown") == "Crème brûlée"
+    # Bytes that aren't valid in the declared charset fall back instead of failing
+    assert decode_bytes("Crème".encode("utf-8") + b"\x81", "utf-8") == "CrÃ¨me\x81"
+
+def test_html_to_text():
+    html = (
+        "<html><head><style>p {}</style></head><body><p>Table for <b>six</b>, please.</p>"
+        "<ul><li>Vegetarian</li><li>Birthday</li></ul><blockquote>Earlier message</blockquote></body></html>"
+    )
+    assert html_to_text(html) == "Table for six, please.\n\n- Vegetarian\n- Birthday"
+    assert html_to_text("<p>" + "word " * 100 + "</p>", max_chars=20) == "word word word word"
+
+def main():
+    """
+    Test charset decoding and HTML-to-text conversion of email bodies.
+    """
+    print("=== Mail Text Test ===")
+    test_decode_bytes()
+    test_html_to_text()
+    print("All mail text checks passed.")
+
+if __name__ == "__main__":
+    main()
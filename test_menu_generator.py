@@ -12,12 +12,12 @@ def main():
     result = generator.generate_all_menus()
     
     if result:
-        print("Successfully generated the following HTML menu files:")
-        print("- attachments/a_la_carte_menu.html")
-        print("- attachments/breakfast_menu.html")
-        print("- attachments/kiddies_menu.html")
-        print("- attachments/drinks_menu.html")
-        print("- attachments/wine_list.html")
+        if generator.changed_menus:
+            print("Successfully generated the following HTML menu files:")
+            for menu_file in generator.changed_menus:
+                print(f"- attachments/{menu_file}")
+        else:
+            print("All HTML menu files are already up to date.")
     else:
         print("Failed to generate HTML menu files.")
 
@@ -0,0 +1,87 @@
+from services.menu_index import MenuItemIndex
+
+def sample_menu():
+    return [
+        {"name": "MAINS", "items": [
+            {"name": "Lamb Neck", "price": 245},
+            {"name": "Lasagne", "price": 165},
+            {"name": "Short Rib", "price": 285}
+        ]},
+        {"name": "WINE SECTIONS", "items": [
+            {"name": "ESTATE WINES", "items": [
+                {"name": "Sauvignon Blanc", "price_glass": 55, "price_bottle": 160},
+                {"name": "Merlot", "price_glass": 60, "price_bottle": 175}
+            ]}
+        ]},
+        {"name": "KIDDIES MENU", "items": [
+            {"name": "Lasagne", "price": 95}
+        ]}
+    ]
+
+def test_find():
+    index = MenuItemIndex(sample_menu())
+    locations = index.find("  short   RIB ")
+    assert len(locations) == 1
+    assert locations[0].item["price"] == 285
+    assert locations[0].section_name == "MAINS"
+    assert index.find("Lasagne", "kiddies menu")[0].item["price"] == 95
+    assert len(index.find("Lasagne")) == 2
+    assert not index.contains("Lasagne", "DESSERT")
+    assert not index.contains("Rib")
+
+def test_nested_items():
+    index = MenuItemIndex(sample_menu())
+    location = index.find("Merlot")[0]
+    assert location.section_name == "WINE SECTIONS"
+    assert location.parent_name == "ESTATE WINES"
+    assert index.contains("Merlot", "ESTATE WINES")
+    assert index.contains("Merlot", "WINE SECTIONS")
+    # A subsection is not an item or a section of its own
+    assert not index.contains("ESTATE WINES")
+    assert index.get_section("ESTATE WINES") is None
+    assert index.get_subsection("estate wines")["items"][0]["name"] == "Sauvignon Blanc"
+    assert index.get_subsection("MAINS") is None
+
+def test_remove_item():
+    menu = sample_menu()
+    index = MenuItemIndex(menu)
+    removed = index.remove_item(index.find("Lamb Neck")[0])
+    assert removed["name"] == "Lamb Neck"
+    assert not index.contains("Lamb Neck")
+    # Items after the removed one move up and still resolve to the right entry
+    assert index.find("Short Rib")[0].position == 1
+    assert index.find("Short Rib")[0].item["name"] == "Short Rib"
+    assert index.find("Lasagne", "MAINS")[0].item["price"] == 165
+    # Other containers are untouched
+    assert index.find("Lasagne", "KIDDIES MENU")[0].position == 0
+    assert [item["name"] for item in menu[0]["items"]] == ["Lasagne", "Short Rib"]
+
+def test_add_and_rename_item():
+    menu = sample_menu()
+    index = MenuItemIndex(menu)
+    section = index.get_section("mains")
+    index.add_item(section, {"name": "Beef Bobotie", "price": 195})
+    assert index.find("beef bobotie")[0].position == 3
+
+    index.rename_item(index.find("Merlot")[0], "Estate Merlot")
+    assert not index.contains("Merlot")
+    assert index.find("Estate Merlot")[0].item["price_bottle"] == 175
+    assert menu[1]["items"][0]["items"][1]["name"] == "Estate Merlot"
+
+    index.add_section("DESSERT")
+    assert index.get_section("Dessert") is menu[-1]
+
+def main():
+    """
+    Test the menu item index used by the training chat.
+    Checks lookups, nested wine items, and that the index stays in step with the menu data.
+    """
+    print("=== Menu Item Index Test ===")
+    test_find()
+    test_nested_items()
+    test_remove_item()
+    test_add_and_rename_item()
+    print("All menu item index checks passed.")
+
+if __name__ == "__main__":
+    main()
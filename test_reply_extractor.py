@@ -0,0 +1,48 @@
+import json
+from services.reply_extractor import ReplyExtractor
+
+CORPUS_FILE = "reply_corpus.json"
+
+def load_corpus():
+    with open(CORPUS_FILE, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def check_corpus(known_thread):
+    extractor = ReplyExtractor()
+    failures = []
+    for case in load_corpus():
+        extracted = extractor.extract(case["text"], known_thread=known_thread)
+        if extracted != case["expected"]:
+            failures.append(case["name"])
+            print(f"- {case['name']} ({case['client']}): got {extracted[:80]!r}")
+    assert not failures, f"Wrong extraction for: {', '.join(failures)}"
+
+def test_corpus():
+    check_corpus(known_thread=False)
+
+def test_known_thread():
+    # Replies in a thread already in the conversation store must come out the same
+    check_corpus(known_thread=True)
+
+def test_find_boundary():
+    extractor = ReplyExtractor()
+    text = "Table for two please.\n\n-----Original Message-----\nFrom: Joline\nOn Mon wrote:"
+    position, rule = extractor.find_boundary(text)
+    assert rule == "original_message"
+    assert text[:position].strip() == "Table for two please."
+    assert extractor.find_boundary("No quoted history here.\nJust two lines.") is None
+
+def main():
+    """
+    Test reply extraction against the email samples in reply_corpus.json.
+    Each sample's extracted reply must match its expected text exactly.
+    """
+    print("=== Reply Extractor Test ===")
+    print(f"Checking {len(load_corpus())} samples from {CORPUS_FILE}...")
+    test_corpus()
+    test_known_thread()
+    test_find_boundary()
+    print("All reply extractor checks passed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+from services.sms_composer import SmsComposer
+
+def test_gsm7_segments():
+    measure = SmsComposer.measure
+    assert measure("a" * 160) == ("GSM-7", 160, 1)
+    assert measure("a" * 161) == ("GSM-7", 161, 2)
+    assert measure("a" * 306).segments == 2
+    assert measure("a" * 307).segments == 3
+    assert measure("").segments == 1
+
+def test_extension_characters():
+    measure = SmsComposer.measure
+    # € takes two septets
+    assert measure("€" * 80) == ("GSM-7", 160, 1)
+    assert measure("€" * 81) == ("GSM-7", 162, 2)
+    assert measure("a" * 159 + "[") == ("GSM-7", 161, 2)
+    # An escape sequence is never split, so this needs a third segment although 306 septets fit in two
+    assert measure("a" * 152 + "€" + "a" * 152) == ("GSM-7", 306, 3)
+
+def test_ucs2_segments():
+    measure = SmsComposer.measure
+    assert measure("À" * 70) == ("UCS-2", 70, 1)
+    assert measure("À" * 71) == ("UCS-2", 71, 2)
+    assert measure("À" * 134).segments == 2
+    assert measure("À" * 135).segments == 3
+    # One emoji switches the whole message to UCS-2, and counts as two UTF-16 units
+    assert measure("a" * 69 + "😀") == ("UCS-2", 71, 2)
+    assert measure("😀" * 35) == ("UCS-2", 70, 1)
+
+def test_to_gsm7():
+    assert SmsComposer.to_gsm7("‘Chef’s special’ – R95…") == "'Chef's special' - R95..."
+    assert SmsComposer.to_gsm7("À La Carte Menu") == "A La Carte Menu"
+    assert SmsComposer.to_gsm7("Thanks 😀") == "Thanks 😀"
+    composer = SmsComposer(max_segments=2, target_segments=1)
+    assert composer.normalize("  À La Carte  menu\n\n\nSee you!  ") == "A La Carte menu\nSee you!"
+    # An emoji forces UCS-2 anyway, so the original characters are kept
+    assert composer.normalize("À La Carte 😀") == "À La Carte 😀"
+
+def test_compose():
+    composer = SmsComposer(max_segments=1, target_segments=1)
+    assert composer.compose("We are open until 22:00.") == "We are open until 22:00."
+
+    text = "We have a table for six at 19:00 on Saturday. " * 5
+    composed = composer.compose(text, suffix="Menus: example.com/m")
+    assert composer.fits(composed)
+    assert composed.endswith("Saturday.\nMenus: example.com/m")
+
+    composed = composer.compose("word " * 60)
+    assert composer.fits(composed)
+    assert composed.endswith("word...")
+
+    composer = SmsComposer(max_segments=3, target_segments=2)
+    assert composer.compose("x" * 400) == "x" * 400
+    assert "306 characters" in composer.budget_prompt()
+    assert "160 characters" in SmsComposer(max_segments=1, target_segments=1).budget_prompt()
+
+def main():
+    """
+    Test SMS segment counting and reply composition.
+    Segment counts follow GSM 03.38: 160/153 septets for GSM-7 and 70/67 units for UCS-2.
+    """
+    print("=== SMS Composer Test ===")
+    test_gsm7_segments()
+    test_extension_characters()
+    test_ucs2_segments()
+    test_to_gsm7()
+    test_compose()
+    print("All SMS composer checks passed.")
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,15 @@ import schedule
 import time
 from services.ai_menu_scraper import AIMenuScraper
 from services.restaurant_knowledge_base import RestaurantKnowledgeBase
+from services.update_log import UpdateLogHandler
 import logging
 
-# Configure logging
+# Configure logging (file output goes to the structured update log in logs/)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('restaurant_updates.log'),
+        UpdateLogHandler(),
         logging.StreamHandler()
     ]
 )